@@ -0,0 +1,235 @@
+import numpy as np
+
+from trade_store import TradeStore
+
+# Outputs of a run that compute_risk_report needs; all of them survive caching
+REPORT_FIELDS = ("trades", "historical_prices", "final_balances", "net_worth_history")
+
+# Rows of net-worth and VaR scenario matrices handled at once, to bound memory for very many traders
+BLOCK_SIZE = 10000
+
+
+def position_matrix(traders, stocks):
+    """
+    Reads every trader's cash and holdings into arrays.
+    :param traders: Dictionary of Trader objects, keyed by trader ID.
+    :param stocks: List of stocks; its order is the column order.
+    :return: Tuple of (trader IDs, cash[traders], positions[traders, stocks]).
+    """
+    stock_index = {stock: i for i, stock in enumerate(stocks)}
+    trader_ids = np.array(list(traders), dtype=np.int64)
+    cash = np.fromiter((trader.cash for trader in traders.values()), dtype=float, count=len(traders))
+    positions = np.zeros((len(traders), len(stocks)), dtype=np.int64)
+    for row, trader in enumerate(traders.values()):
+        for stock, quantity in trader.portfolio.items():
+            positions[row, stock_index[stock]] = quantity
+    return trader_ids, cash, positions
+
+
+def balance_matrix(final_balances, stocks):
+    """
+    Same as position_matrix, for the final balances of a run's serialisable outputs.
+    :param final_balances: Dictionary of trader_id -> {'cash': ..., 'portfolio': {stock: quantity}}.
+    """
+    stock_index = {stock: i for i, stock in enumerate(stocks)}
+    trader_ids = np.array(list(final_balances), dtype=np.int64)
+    cash = np.fromiter((balance["cash"] for balance in final_balances.values()), dtype=float,
+                       count=len(final_balances))
+    positions = np.zeros((len(final_balances), len(stocks)), dtype=np.int64)
+    for row, balance in enumerate(final_balances.values()):
+        for stock, quantity in balance["portfolio"].items():
+            positions[row, stock_index[stock]] = quantity
+    return trader_ids, cash, positions
+
+
+def trade_events(trade_store, trader_ids, stocks):
+    """
+    Turns the trade log into one event per side of each fill, in execution order.
+    :return: Tuple of (row, column, signed quantity, price) arrays; buys are positive.
+    """
+    sorter = np.argsort(trader_ids)
+    stock_index = {stock: i for i, stock in enumerate(stocks)}
+    codes = np.array([stock_index[symbol] for symbol in trade_store.symbols], dtype=np.int64)
+    stock = codes[trade_store.column("stock")] if len(codes) else np.zeros(0, dtype=np.int64)
+    quantity = trade_store.column("quantity")
+    price = trade_store.column("price")
+    buyers = sorter[np.searchsorted(trader_ids, trade_store.column("buyer"), sorter=sorter)]
+    sellers = sorter[np.searchsorted(trader_ids, trade_store.column("seller"), sorter=sorter)]
+    # Interleave so each buy is followed by its sell, keeping execution order within each trader
+    rows = np.column_stack((buyers, sellers)).ravel()
+    columns = np.repeat(stock, 2)
+    signed = np.column_stack((quantity, -quantity)).ravel()
+    return rows, columns, signed, np.repeat(price, 2)
+
+
+def cost_basis_ledger(trade_store, trader_ids, stocks, final_positions, initial_prices):
+    """
+    Replays the trade log through an average-cost ledger for every (trader, stock) at once.
+    Shares held at the start are booked at the starting price. A buy adds its cost; a sell
+    realizes the difference between its price and the average cost and removes that cost.
+    Events are grouped by (trader, stock); the k-th event of every group is processed in one
+    vectorized step, so the loop runs as many times as the busiest group has trades.
+    :param final_positions: Positions at the end of the run; the starting ones are derived from them.
+    :param initial_prices: Array of starting prices, in `stocks` order.
+    :return: Tuple of (realized PnL, remaining cost basis), each [traders, stocks].
+    """
+    num_stocks = len(stocks)
+    rows, columns, signed, price = trade_events(trade_store, trader_ids, stocks)
+    keys = rows * num_stocks + columns
+
+    initial_positions = final_positions.ravel().astype(np.int64)
+    np.subtract.at(initial_positions, keys, signed)
+    position = initial_positions.astype(float)
+    cost = position * np.tile(initial_prices, len(trader_ids))
+    realized = np.zeros_like(cost)
+
+    # Rank of each event within its group, in execution order, then events ordered by rank
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(keys)]).astype(np.int64)
+    ranks = np.arange(len(keys)) - np.repeat(group_starts, group_sizes)
+    by_rank = order[np.argsort(ranks, kind="stable")]
+    rank_ends = np.cumsum(np.bincount(ranks))
+
+    start = 0
+    for end in rank_ends.tolist():
+        events = by_rank[start:end]
+        start = end
+        key, quantity, fill_price = keys[events], signed[events], price[events]
+        held = position[key]
+        average = np.divide(cost[key], held, out=np.zeros(len(key)), where=held > 0)
+        sold = np.maximum(-quantity, 0)
+        realized[key] += sold * (fill_price - average)
+        cost[key] += np.where(quantity > 0, quantity * fill_price, -sold * average)
+        position[key] = held + quantity
+        # Guard against rounding leaving cost on a closed position
+        cost[key] = np.where(position[key] > 0, cost[key], 0.0)
+
+    shape = (len(trader_ids), num_stocks)
+    return realized.reshape(shape), cost.reshape(shape)
+
+
+def max_drawdown(net_worth_history):
+    """
+    Returns each trader's largest fall from a previous net-worth peak, as a fraction of that peak.
+    :param net_worth_history: Dictionary of trader_id -> list of net worth per step.
+    :return: Array of drawdowns in trader order.
+    """
+    histories = list(net_worth_history.values())
+    drawdowns = np.zeros(len(histories))
+    for start in range(0, len(histories), BLOCK_SIZE):
+        worth = np.array(histories[start:start + BLOCK_SIZE], dtype=float)
+        peaks = np.maximum.accumulate(worth, axis=1)
+        falls = np.divide(peaks - worth, peaks, out=np.zeros_like(worth), where=peaks > 0)
+        drawdowns[start:start + BLOCK_SIZE] = falls.max(axis=1)
+    return drawdowns
+
+
+def historical_var(positions, historical_prices, stocks, confidence=0.95):
+    """
+    Historical one-step value at risk of every trader's current holdings.
+    Each past step's price returns are applied to today's exposure, and the VaR is the loss
+    exceeded in only (1 - confidence) of those scenarios. Cash carries no risk.
+    :param historical_prices: Dictionary of stock -> list of prices per step.
+    :return: Array of VaR amounts (positive is a loss) in trader order.
+    """
+    prices = np.array([historical_prices[stock] for stock in stocks], dtype=float)
+    if prices.shape[1] < 2:
+        return np.zeros(len(positions))
+    returns = prices[:, 1:] / prices[:, :-1] - 1
+    exposure = positions * prices[:, -1]
+    var = np.zeros(len(positions))
+    for start in range(0, len(positions), BLOCK_SIZE):
+        scenarios = exposure[start:start + BLOCK_SIZE] @ returns
+        var[start:start + BLOCK_SIZE] = -np.percentile(scenarios, (1 - confidence) * 100, axis=1)
+    return np.maximum(var, 0.0)
+
+
+def concentration(positions, prices):
+    """
+    Measures how concentrated holdings are, per trader and per stock.
+    :param prices: Array of current prices, in stock order.
+    :return: Dictionary with each trader's Herfindahl index and largest single-stock weight
+             (both 0 without holdings) and index of that stock, and each stock's total exposure
+             and the share of it held by its largest holder.
+    """
+    exposure = positions * prices
+    totals = exposure.sum(axis=1, keepdims=True)
+    weights = np.divide(exposure, totals, out=np.zeros_like(exposure), where=totals > 0)
+    stock_exposure = exposure.sum(axis=0)
+    return {
+        "hhi": (weights ** 2).sum(axis=1),
+        "largest_weight": weights.max(axis=1, initial=0.0),
+        "largest_stock": weights.argmax(axis=1) if weights.shape[1] else np.zeros(len(weights), dtype=int),
+        "stock_exposure": stock_exposure,
+        "top_holder_share": np.divide(exposure.max(axis=0, initial=0.0), stock_exposure,
+                                      out=np.zeros_like(stock_exposure), where=stock_exposure > 0),
+    }
+
+
+def compute_risk_report(results, confidence=0.95):
+    """
+    Computes PnL, drawdown, VaR and concentration for every trader of a finished run.
+    Only the serialisable outputs are needed, so cached runs (see result_cache.py) can be reported
+    too; the live trade store is used when the results still hold the simulation state.
+    :param results: Dictionary returned by main.run_simulation, or its cached outputs.
+    :param confidence: VaR confidence level.
+    :return: Dictionary of arrays in trader order ('trader_ids', 'realized_pnl', 'unrealized_pnl',
+             'total_pnl', 'max_drawdown', 'var', 'hhi', 'largest_weight', 'largest_stock') plus
+             'stocks', 'stock_exposure' and 'top_holder_share' in stock order.
+    """
+    missing = [key for key in REPORT_FIELDS if key not in results]
+    if missing:
+        raise ValueError(f"Cannot compute a risk report without the run's {', '.join(missing)}")
+    historical_prices = results["historical_prices"]
+    stocks = list(historical_prices)
+    # The last recorded prices are the ones the run ended on
+    prices = np.array([historical_prices[stock][-1] for stock in stocks], dtype=float)
+    initial_prices = np.array([historical_prices[stock][0] for stock in stocks], dtype=float)
+
+    if "state" in results:
+        trade_store = results["state"]["trade_store"]
+    else:
+        # Only execution order matters to the ledger, so the whole log can go in as one step
+        trade_store = TradeStore()
+        trade_store.append(0, results["trades"])
+
+    trader_ids, _, positions = balance_matrix(results["final_balances"], stocks)
+    realized, cost = cost_basis_ledger(trade_store, trader_ids, stocks, positions, initial_prices)
+    unrealized = positions * prices - cost
+
+    report = {
+        "trader_ids": trader_ids,
+        "stocks": stocks,
+        "realized_pnl": realized.sum(axis=1),
+        "unrealized_pnl": unrealized.sum(axis=1),
+        "max_drawdown": max_drawdown(results["net_worth_history"]),
+        "var": historical_var(positions, historical_prices, stocks, confidence),
+        "confidence": confidence,
+    }
+    report["total_pnl"] = report["realized_pnl"] + report["unrealized_pnl"]
+    report.update(concentration(positions, prices))
+    return report
+
+
+def display_risk_report(report, top=10):
+    """
+    Displays the traders with the highest VaR and each stock's exposure in a readable format.
+    """
+    stocks = report["stocks"]
+    riskiest = np.argsort(-report["var"], kind="stable")[:top]
+    print(f"Riskiest Traders (VaR {report['confidence']:.0%}, {len(report['trader_ids'])} traders):")
+    print(f"{'Trader ID':<10}{'Realized':<14}{'Unrealized':<14}{'VaR':<12}{'Drawdown':<10}{'HHI':<7}Largest")
+    print("-" * 78)
+    for i in riskiest:
+        largest = f"{stocks[report['largest_stock'][i]]} {report['largest_weight'][i]:.0%}" \
+            if report["largest_weight"][i] > 0 else "-"
+        print(f"{report['trader_ids'][i]:<10}${report['realized_pnl'][i]:<13.2f}${report['unrealized_pnl'][i]:<13.2f}"
+              f"${report['var'][i]:<11.2f}{report['max_drawdown'][i]:<10.1%}{report['hhi'][i]:<7.2f}{largest}")
+
+    print("\nStock Exposure:")
+    print(f"{'Stock':<10}{'Exposure':<16}{'Top Holder Share':<16}")
+    print("-" * 42)
+    for stock, exposure, share in zip(stocks, report["stock_exposure"], report["top_holder_share"]):
+        print(f"{stock:<10}${exposure:<15.2f}{share:<16.1%}")
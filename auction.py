@@ -0,0 +1,235 @@
+import numpy as np
+
+from order import sort_order_book, group_orders_by_stock
+from matching_engine import make_fill, kill_order, remove_inactive_orders
+
+MATCHING_MODES = ("continuous", "auction")
+ALLOCATION_METHODS = ("pro_rata", "time")
+
+
+def uncross_orders(order_book, risk_engine=None, on_fill=None, depth_book=None, reference_prices=None,
+                   allocation="pro_rata"):
+    """
+    Runs a call auction: every stock trades once, at a single clearing price.
+    The clearing price maximizes the executable volume; ties go to the smallest imbalance
+    and then to the price closest to the reference price. Takes the same arguments and
+    returns the same fills as match_orders, so the two can be swapped per step.
+    :param allocation: 'pro_rata' shares the marginal price level in proportion to size,
+                       'time' fills it in arrival order. Better-priced levels always fill first.
+    :return: List of executed trades.
+    """
+    if allocation not in ALLOCATION_METHODS:
+        raise ValueError(f"Unknown allocation method: {allocation}")
+
+    executed_trades = []
+
+    sort_order_book(order_book, "buy")
+    sort_order_book(order_book, "sell")
+    sells_by_stock = group_orders_by_stock(order_book["sell"])
+
+    for stock, buys in group_orders_by_stock(order_book["buy"]).items():
+        sells = sells_by_stock.get(stock)
+        if not sells:
+            continue
+        reference_price = reference_prices.get(stock) if reference_prices else None
+        executed_trades.extend(uncross_stock(buys, sells, reference_price, allocation,
+                                             risk_engine, on_fill, depth_book))
+
+    remove_inactive_orders(order_book, risk_engine)
+    return executed_trades
+
+
+def uncross_stock(buys, sells, reference_price, allocation, risk_engine=None, on_fill=None, depth_book=None):
+    """
+    Uncrosses one stock's buy and sell orders, both given in priority order.
+    A fill-or-kill order that would only be partly filled is killed and the auction is
+    recomputed without it.
+    """
+    # Only orders that cross the best opposite price can trade at any clearing price
+    buys = crossing_orders(buys, best_price(sells, "sell"), "buy")
+    if not buys:
+        return []
+    sells = crossing_orders(sells, best_price(buys, "buy"), "sell")
+    while True:
+        buy_prices, buy_quantities, buy_market, buy_fok = order_arrays(buys)
+        sell_prices, sell_quantities, sell_market, sell_fok = order_arrays(sells)
+        price, volume = find_uncross_price(buy_prices, buy_quantities, sell_prices, sell_quantities,
+                                           reference_price)
+        if volume == 0:
+            return []
+
+        buy_allocations = allocate_volume(buy_quantities, buy_prices, buy_market, buy_prices >= price,
+                                          volume, allocation)
+        sell_allocations = allocate_volume(sell_quantities, sell_prices, sell_market, sell_prices <= price,
+                                           volume, allocation)
+
+        partial_fok = [orders[i] for orders, quantities, is_fok, allocations in
+                       ((buys, buy_quantities, buy_fok, buy_allocations),
+                        (sells, sell_quantities, sell_fok, sell_allocations))
+                       for i in np.flatnonzero(is_fok & (allocations > 0) & (allocations < quantities)).tolist()]
+        if not partial_fok:
+            break
+        for order in partial_fok:
+            kill_order(order, risk_engine)
+        buys = [o for o in buys if o.status == "open"]
+        sells = [o for o in sells if o.status == "open"]
+
+    buy_fills = allocated_orders(buys, buy_allocations)
+    sell_fills = allocated_orders(sells, sell_allocations)
+
+    # Pair the allocations off in priority order; each side sums to the auction volume
+    trades = []
+    b = s = 0
+    buy_left, sell_left = buy_fills[0][1], sell_fills[0][1]
+    while b < len(buy_fills) and s < len(sell_fills):
+        quantity = min(buy_left, sell_left)
+        trade = make_fill(buy_fills[b][0], sell_fills[s][0], quantity, float(price))
+        trades.append(trade)
+        if on_fill is not None:
+            on_fill(trade)
+
+        buy_left -= quantity
+        sell_left -= quantity
+        if buy_left == 0:
+            b += 1
+            buy_left = buy_fills[b][1] if b < len(buy_fills) else 0
+        if sell_left == 0:
+            s += 1
+            sell_left = sell_fills[s][1] if s < len(sell_fills) else 0
+
+    for order, quantity in buy_fills + sell_fills:
+        fill_order(order, quantity, risk_engine, depth_book)
+    return trades
+
+
+def best_price(orders, order_type):
+    """
+    Returns the most aggressive price on one side, given in priority order (market orders first).
+    """
+    prices = []
+    for order in orders:
+        prices.append(order.price)
+        if order.order_kind != "market":
+            break
+    return max(prices) if order_type == "buy" else min(prices)
+
+
+def crossing_orders(orders, opposite_price, order_type):
+    """
+    Returns the leading orders whose price reaches the best opposite price.
+    The scan stops at the first limit order that does not, so resting depth is never visited.
+    """
+    for i, order in enumerate(orders):
+        if order.order_kind == "market":
+            continue
+        if order.price < opposite_price if order_type == "buy" else order.price > opposite_price:
+            return orders[:i]
+    return list(orders)
+
+
+def order_arrays(orders):
+    """
+    Returns (prices, remaining quantities, is-market flags, is-FOK flags) for a list of orders.
+    The orders are read in a single pass into one table and split into columns.
+    """
+    table = np.array([(o.price, o.quantity + o.hidden_quantity, o.order_kind == "market", o.time_in_force == "FOK")
+                      for o in orders], dtype=float).reshape(-1, 4)
+    return table[:, 0], table[:, 1].astype(np.int64), table[:, 2] != 0, table[:, 3] != 0
+
+
+def allocated_orders(orders, allocations):
+    """
+    Returns (order, quantity) pairs for the orders that were allocated a fill, in priority order.
+    """
+    index = np.flatnonzero(allocations)
+    return list(zip([orders[i] for i in index.tolist()], allocations[index].tolist()))
+
+
+def find_uncross_price(buy_prices, buy_quantities, sell_prices, sell_quantities, reference_price=None):
+    """
+    Builds the cumulative demand and supply curves over every distinct order price
+    and picks the price that executes the most volume.
+    Market orders take part at their protection price.
+    :return: Tuple of (price, volume); volume is 0 if the book does not cross.
+    """
+    prices = np.unique(np.concatenate((buy_prices, sell_prices)))
+    buy_at = np.bincount(np.searchsorted(prices, buy_prices), weights=buy_quantities, minlength=len(prices))
+    sell_at = np.bincount(np.searchsorted(prices, sell_prices), weights=sell_quantities, minlength=len(prices))
+
+    demand = np.cumsum(buy_at[::-1])[::-1]  # buy quantity willing to pay at least each price
+    supply = np.cumsum(sell_at)             # sell quantity willing to accept at most each price
+    executable = np.minimum(demand, supply)
+
+    volume = int(executable.max())
+    if volume == 0:
+        return None, 0
+
+    candidates = np.flatnonzero(executable == volume)
+    imbalance = np.abs(demand[candidates] - supply[candidates])
+    candidates = candidates[imbalance == imbalance.min()]
+    if reference_price is None:
+        best = candidates[len(candidates) // 2]
+    else:
+        best = candidates[np.argmin(np.abs(prices[candidates] - reference_price))]
+    return prices[best], volume
+
+
+def allocate_volume(quantities, prices, is_market, eligible, volume, allocation="pro_rata"):
+    """
+    Splits the auction volume over one side's orders, given in priority order.
+    Market orders, then better-priced levels, fill in full; only the marginal level is rationed.
+    :return: Array of allocated quantities, zero for orders that do not trade.
+    """
+    allocations = np.zeros(len(quantities), dtype=np.int64)
+    index = np.flatnonzero(eligible)
+    quantities = quantities[index]
+    cumulative = np.cumsum(quantities)
+
+    if allocation == "time":
+        allocations[index] = np.clip(volume - (cumulative - quantities), 0, quantities)
+        return allocations
+
+    # Consecutive orders with the same kind and price form one level
+    prices, is_market = prices[index], is_market[index]
+    new_level = np.r_[True, (prices[1:] != prices[:-1]) | (is_market[1:] != is_market[:-1])]
+    levels = np.cumsum(new_level) - 1
+    level_cumulative = np.cumsum(np.bincount(levels, weights=quantities)).astype(np.int64)
+
+    marginal = np.searchsorted(level_cumulative, volume)
+    filled_before = level_cumulative[marginal - 1] if marginal > 0 else 0
+    shares = np.where(levels < marginal, quantities, 0)
+
+    at_margin = np.flatnonzero(levels == marginal)
+    level_total = quantities[at_margin].sum()
+    remaining = volume - filled_before
+    pro_rata = quantities[at_margin] * remaining // level_total
+    # Rounding leftovers go one share each to the earliest orders at the level
+    leftover = remaining - pro_rata.sum()
+    pro_rata[:leftover] += 1
+    shares[at_margin] = pro_rata
+
+    allocations[index] = shares
+    return allocations
+
+
+def fill_order(order, quantity, risk_engine=None, depth_book=None):
+    """
+    Applies an auction fill to an order, taking it from the visible slice first.
+    An iceberg whose visible slice runs out is refilled from its hidden reserve.
+    """
+    if risk_engine is not None:
+        risk_engine.release(order, quantity)
+
+    visible = min(quantity, order.quantity)
+    if depth_book is not None:
+        depth_book.remove_quantity(order, visible)
+    order.quantity -= visible
+    order.hidden_quantity -= quantity - visible
+
+    if order.quantity == 0:
+        if order.hidden_quantity == 0:
+            order.status = "filled"
+        else:
+            order.replenish()
+            if depth_book is not None:
+                depth_book.add_order(order)
@@ -0,0 +1,116 @@
+import random
+import time
+
+from trader import Trader
+from order import create_order, add_order_to_book, new_order_book
+from matching_engine import match_orders
+from auction import uncross_orders, MATCHING_MODES
+from clearing import ClearingHouse, SETTLEMENT_MODES
+from risk import RiskEngine
+
+
+def build_benchmark_market(num_traders, stocks, seed=0):
+    """
+    Builds a market where every trader holds cash and shares in every stock,
+    so both sides of the book see plenty of flow.
+    """
+    rng = random.Random(seed)
+    traders = {}
+    for trader_id in range(1, num_traders + 1):
+        t = Trader(trader_id, cash=rng.randint(20000, 30000))
+        for stock in stocks:
+            t.portfolio[stock] = rng.randint(50, 100)
+        traders[trader_id] = t
+    stock_prices = {stock: rng.uniform(50, 70) for stock in stocks}
+    return traders, stock_prices
+
+
+def place_benchmark_orders(traders, stock_prices, order_book, risk_engine, rng, next_id):
+    """
+    Places one random order per trader close to the current price.
+    Returns the next unused order number.
+    """
+    stocks = list(stock_prices)
+    for trader in traders.values():
+        order_type = "buy" if rng.random() < 0.5 else "sell"
+        stock = rng.choice(stocks)
+        price = max(stock_prices[stock] + rng.uniform(-2, 2), 1.0)
+        order_id = next_id
+        next_id += 1
+        try:
+            order = create_order(trader, order_id, order_type, stock, rng.randint(1, 5), price, risk_engine)
+        except ValueError:
+            continue
+        add_order_to_book(order, order_book)
+        risk_engine.reserve(order)
+    return next_id
+
+
+def benchmark_settlement_mode(mode, num_traders=2000, num_steps=20, stocks=("AAPL", "GOOG", "MSFT", "TSLA"),
+                              seed=0, matching_mode="continuous"):
+    """
+    Times matching plus settlement for one settlement mode.
+    Order placement is excluded from the timing.
+    :param matching_mode: 'continuous' (match_orders) or 'auction' (uncross_orders).
+    :return: Dictionary with the modes, number of fills, elapsed seconds and fills per second.
+    """
+    match = uncross_orders if matching_mode == "auction" else match_orders
+    rng = random.Random(seed)
+    traders, stock_prices = build_benchmark_market(num_traders, stocks, seed)
+    order_book = new_order_book()
+    risk_engine = RiskEngine()
+    clearing_house = ClearingHouse(traders, mode=mode)
+
+    next_id = 0
+    fills = 0
+    elapsed = 0.0
+    for _ in range(num_steps):
+        next_id = place_benchmark_orders(traders, stock_prices, order_book, risk_engine, rng, next_id)
+
+        start = time.perf_counter()
+        trades = match(order_book, risk_engine, on_fill=clearing_house.on_fill)
+        clearing_house.end_of_step()
+        elapsed += time.perf_counter() - start
+        fills += len(trades)
+
+    return {
+        "mode": mode,
+        "matching_mode": matching_mode,
+        "fills": fills,
+        "seconds": elapsed,
+        "fills_per_second": fills / elapsed if elapsed > 0 else 0,
+    }
+
+
+def benchmark_settlement_modes(**kwargs):
+    """
+    Runs benchmark_settlement_mode for every settlement mode with identical order flow.
+    """
+    return [benchmark_settlement_mode(mode, **kwargs) for mode in SETTLEMENT_MODES]
+
+
+def benchmark_matching_modes(**kwargs):
+    """
+    Runs benchmark_settlement_mode with deferred settlement for every matching mode.
+    Both modes read every crossing order, so expect the auction to run somewhat slower than continuous matching.
+    """
+    return [benchmark_settlement_mode("deferred", matching_mode=matching_mode, **kwargs)
+            for matching_mode in MATCHING_MODES]
+
+
+def display_benchmark_results(results, title="Settlement Benchmark"):
+    """
+    Displays benchmark results in a readable format.
+    """
+    print(f"{title}:")
+    print(f"{'Mode':<12}{'Matching':<12}{'Fills':<10}{'Seconds':<12}{'Fills/sec':<12}")
+    print("-" * 58)
+    for result in results:
+        print(f"{result['mode']:<12}{result['matching_mode']:<12}{result['fills']:<10}{result['seconds']:<12.4f}"
+              f"{result['fills_per_second']:<12.0f}")
+
+
+if __name__ == "__main__":
+    display_benchmark_results(benchmark_settlement_modes())
+    print()
+    display_benchmark_results(benchmark_matching_modes(), "Matching Benchmark")
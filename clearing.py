@@ -1,17 +1,21 @@
+from fees import FeeSchedule, RollingVolume, FeeLedger, compute_fill_fees, compute_single_fill_fees
+
+SETTLEMENT_MODES = ("immediate", "deferred")
+
+
 def process_clearing_and_settlement(buyer, seller, stock, quantity, price):
     """
     Processes the clearing and settlement of a trade.
+    Orders are risk-checked before they reach the book, so a shortfall here is an error.
     """
     # Calculate total trade value
     total_value = quantity * price
 
     # Check buyer's cash and seller's stock availability
     if buyer.cash < total_value:
-        print(f"Buyer {buyer.trader_id} does not have enough cash for the trade.")
-        return
+        raise ValueError(f"Buyer {buyer.trader_id} does not have enough cash for the trade.")
     if seller.portfolio.get(stock, 0) < quantity:
-        print(f"Seller {seller.trader_id} does not have enough shares of {stock}.")
-        return
+        raise ValueError(f"Seller {seller.trader_id} does not have enough shares of {stock}.")
 
     # Adjust buyer's cash and portfolio
     buyer.cash -= total_value
@@ -25,42 +29,238 @@ def process_clearing_and_settlement(buyer, seller, stock, quantity, price):
         seller.portfolio[stock] -= quantity
 
 
-def process_transaction_fees(trader, transaction_value, fee_percentage=0.1):
+def charge_fee(trader, fee):
     """
-    Deducts a transaction fee from a trader's account based on the trade value.
+    Deducts a fee from a trader's account. Returns the fee.
     """
-    fee = transaction_value * (fee_percentage / 100)
     if trader.cash < fee:
-        print(f"Trader {trader.trader_id} does not have enough cash for the transaction fee.")
-        return
+        raise ValueError(f"Trader {trader.trader_id} does not have enough cash for the transaction fee.")
     trader.cash -= fee
     return fee
 
 
-def batch_clearing_and_settlement(trades, traders):
+def process_transaction_fees(trader, transaction_value, fee_percentage=0.1):
     """
-    Processes clearing and settlement for a batch of trades.
-    Returns total fees collected.
+    Deducts a flat transaction fee from a trader's account based on the trade value.
+    Returns the fee.
     """
-    total_fees_collected = 0
+    return charge_fee(trader, transaction_value * (fee_percentage / 100))
+
+
+def flat_trade_fees(trades, fee_percentage=0.1):
+    """
+    Returns (buyer_fees, seller_fees) lists charging the same flat percentage to both sides.
+    """
+    fees = [trade["quantity"] * trade["price"] * (fee_percentage / 100) for trade in trades]
+    return fees, fees
+
+
+def aggregate_fees(trades, buyer_fees, seller_fees, fee_ledger=None):
+    """
+    Sums per-fill fees into a dictionary of trader_id -> fee,
+    recording each fee in the ledger by trader and stock if one is given.
+    """
+    fees = {}
+    for trade, buyer_fee, seller_fee in zip(trades, buyer_fees, seller_fees):
+        fees[trade["buyer"]] = fees.get(trade["buyer"], 0) + buyer_fee
+        fees[trade["seller"]] = fees.get(trade["seller"], 0) + seller_fee
+        if fee_ledger is not None:
+            fee_ledger.record(trade["buyer"], trade["stock"], buyer_fee)
+            fee_ledger.record(trade["seller"], trade["stock"], seller_fee)
+    return fees
+
+
+def settle_trade(trade, traders, fees=None):
+    """
+    Settles a single fill: moves cash and shares once and deducts fees from both sides.
+    :param fees: Optional (buyer_fee, seller_fee); defaults to the flat 0.1% per side.
+    Returns the fees collected for this fill.
+    """
+    buyer = traders[trade["buyer"]]
+    seller = traders[trade["seller"]]
+    stock = trade["stock"]
+    quantity = trade["quantity"]
+    price = trade["price"]
+
+    # Process clearing and settlement
+    process_clearing_and_settlement(buyer, seller, stock, quantity, price)
+
+    # Deduct transaction fees for both buyer and seller
+    if fees is None:
+        return process_transaction_fees(buyer, quantity * price) + process_transaction_fees(seller, quantity * price)
+    return charge_fee(buyer, fees[0]) + charge_fee(seller, fees[1])
+
+
+def net_trades(trades):
+    """
+    Collapses a batch of trades into net deltas per (trader, stock).
+    :return: Tuple of (net_positions, gross_notional) where net_positions maps
+             (trader_id, stock) -> [cash_delta, share_delta] and gross_notional maps
+             trader_id -> total traded value on both sides (the base for fees).
+    """
+    net_positions = {}
+    gross_notional = {}
 
     for trade in trades:
-        buyer = traders[trade["buyer"]]
-        seller = traders[trade["seller"]]
         stock = trade["stock"]
         quantity = trade["quantity"]
-        price = trade["price"]
+        value = quantity * trade["price"]
+
+        buyer_delta = net_positions.setdefault((trade["buyer"], stock), [0, 0])
+        buyer_delta[0] -= value
+        buyer_delta[1] += quantity
+
+        seller_delta = net_positions.setdefault((trade["seller"], stock), [0, 0])
+        seller_delta[0] += value
+        seller_delta[1] -= quantity
 
-        # Process clearing and settlement
-        process_clearing_and_settlement(buyer, seller, stock, quantity, price)
+        gross_notional[trade["buyer"]] = gross_notional.get(trade["buyer"], 0) + value
+        gross_notional[trade["seller"]] = gross_notional.get(trade["seller"], 0) + value
 
-        # Calculate and deduct transaction fees for both buyer and seller
-        total_fees_collected += process_transaction_fees(buyer, quantity * price)
-        total_fees_collected += process_transaction_fees(seller, quantity * price)
+    return net_positions, gross_notional
+
+
+def validate_net_positions(net_positions, fees, traders):
+    """
+    Checks that every trader can cover their net cash outflow plus fees,
+    and never ends up with a negative share position. Raises ValueError otherwise.
+    """
+    net_cash = dict.fromkeys(fees, 0)
+    for (trader_id, stock), (cash_delta, share_delta) in net_positions.items():
+        net_cash[trader_id] = net_cash.get(trader_id, 0) + cash_delta
+        if traders[trader_id].portfolio.get(stock, 0) + share_delta < 0:
+            raise ValueError(f"Trader {trader_id} does not have enough shares of {stock}.")
+
+    for trader_id, cash_delta in net_cash.items():
+        if traders[trader_id].cash + cash_delta - fees.get(trader_id, 0) < 0:
+            raise ValueError(f"Trader {trader_id} does not have enough cash to settle.")
+
+
+def apply_net_positions(net_positions, traders):
+    """
+    Applies validated net deltas: one balance write per (trader, stock).
+    """
+    for (trader_id, stock), (cash_delta, share_delta) in net_positions.items():
+        trader = traders[trader_id]
+        trader.cash += cash_delta
+        if share_delta == 0:
+            continue
+        remaining = trader.portfolio.get(stock, 0) + share_delta
+        if remaining == 0:
+            del trader.portfolio[stock]  # Remove stock if fully sold
+        else:
+            trader.portfolio[stock] = remaining
+
+
+def batch_clearing_and_settlement(trades, traders, fee_percentage=0.1, trade_fees=None, fee_ledger=None):
+    """
+    Processes clearing and settlement for a batch of trades.
+    Trades are first netted per (trader, stock), validated once, then applied,
+    so balance writes scale with active positions rather than trades.
+    Fees are still charged on gross notional.
+    :param trade_fees: Optional (buyer_fees, seller_fees) aligned with `trades`, e.g. from
+                       fees.compute_fill_fees; defaults to `fee_percentage` on both sides.
+    :param fee_ledger: Optional FeeLedger to record the collected fees in.
+    Returns total fees collected.
+    """
+    net_positions, _ = net_trades(trades)
+    if trade_fees is None:
+        trade_fees = flat_trade_fees(trades, fee_percentage)
+    fees = aggregate_fees(trades, *trade_fees, fee_ledger=fee_ledger)
+
+    # Validate everything before touching any balance, so a batch settles all or nothing
+    validate_net_positions(net_positions, fees, traders)
+    apply_net_positions(net_positions, traders)
+
+    total_fees_collected = 0
+    for trader_id, fee in fees.items():
+        traders[trader_id].cash -= fee
+        total_fees_collected += fee
 
     return total_fees_collected
 
 
+class ClearingHouse:
+    """
+    The single settlement path for fills emitted by the matching engine.
+    In 'immediate' mode each fill is settled gross as it arrives; in 'deferred' mode
+    fills are buffered and netted together at the end of the step.
+    Fees follow the fee schedule, with volume tiers based on the volume of previous steps.
+    """
+
+    def __init__(self, traders, mode="deferred", fee_schedule=None, volume_window=20):
+        """
+        Initializes a ClearingHouse object.
+        :param traders: Dictionary of Trader objects, keyed by trader ID.
+        :param mode: One of SETTLEMENT_MODES.
+        :param fee_schedule: FeeSchedule to charge (default: flat 0.1% per side).
+        :param volume_window: Number of steps counted towards a trader's volume tier.
+        """
+        if mode not in SETTLEMENT_MODES:
+            raise ValueError(f"Unknown settlement mode: {mode}")
+        self.traders = traders
+        self.mode = mode
+        self.fee_schedule = fee_schedule if fee_schedule else FeeSchedule()
+        self.rolling_volume = RollingVolume(volume_window)
+        self.fee_ledger = FeeLedger()
+        self.pending_trades = []
+        self.failed_batches = []  # deferred batches that could not settle, kept for reporting
+        self.step_volume = {}  # trader_id -> notional traded this step
+        self.total_fees_collected = 0
+
+    def __repr__(self):
+        return (f"ClearingHouse | Mode: {self.mode} | Pending: {len(self.pending_trades)} | "
+                f"Fees: ${self.total_fees_collected:.2f}")
+
+    def on_fill(self, trade):
+        """
+        Receives a fill from the matching engine.
+        """
+        value = trade["quantity"] * trade["price"]
+        for trader_id in (trade["buyer"], trade["seller"]):
+            self.step_volume[trader_id] = self.step_volume.get(trader_id, 0) + value
+
+        if self.mode == "immediate":
+            fees = compute_single_fill_fees(trade, self.fee_schedule, self.rolling_volume)
+            self.total_fees_collected += settle_trade(trade, self.traders, fees)
+            aggregate_fees([trade], [fees[0]], [fees[1]], self.fee_ledger)
+        else:
+            self.pending_trades.append(trade)
+
+    def end_of_step(self):
+        """
+        Settles any buffered fills and rolls the volume window forward.
+        The batch is taken off the pending list before settling, so a batch that cannot settle
+        is moved to failed_batches (and the ValueError re-raised) instead of being retried,
+        and fills of later steps still settle.
+        Returns the fees collected by this call.
+        """
+        trades, self.pending_trades = self.pending_trades, []
+        fees = 0
+        try:
+            if trades:
+                buyer_fees, seller_fees = compute_fill_fees(trades, self.fee_schedule, self.rolling_volume)
+                trade_fees = (buyer_fees.tolist(), seller_fees.tolist())
+                fees = batch_clearing_and_settlement(trades, self.traders, trade_fees=trade_fees,
+                                                     fee_ledger=self.fee_ledger)
+                self.total_fees_collected += fees
+        except ValueError:
+            self.failed_batches.append(trades)
+            # Fills that did not settle do not count towards anyone's volume tier
+            for trade in trades:
+                value = trade["quantity"] * trade["price"]
+                for trader_id in (trade["buyer"], trade["seller"]):
+                    self.step_volume[trader_id] -= value
+            raise
+        finally:
+            for trader_id, value in self.step_volume.items():
+                if value > 1e-9:
+                    self.rolling_volume.add(trader_id, value)
+            self.rolling_volume.advance()
+            self.step_volume = {}
+        return fees
+
+
 def display_trader_balances(traders):
     """
     Displays the cash balance and portfolio of all traders.
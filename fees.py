@@ -0,0 +1,198 @@
+from bisect import bisect_right
+from collections import deque
+
+import numpy as np
+
+
+class FeeSchedule:
+    """
+    Maker/taker fee schedule with volume tiers and per-symbol overrides.
+    All rates are percentages of notional, like `fee_percentage` in clearing.
+    Precedence: a symbol override replaces the tiered rate for that symbol.
+    """
+
+    def __init__(self, maker_rate=0.1, taker_rate=0.1, volume_tiers=None, symbol_overrides=None):
+        """
+        Initializes a FeeSchedule object.
+        :param maker_rate: Base rate for the side whose order was resting.
+        :param taker_rate: Base rate for the side whose order arrived last.
+        :param volume_tiers: List of (min_rolling_volume, maker_rate, taker_rate); a trader whose
+                             rolling notional volume reaches a threshold pays that tier's rates.
+        :param symbol_overrides: Dictionary of stock -> (maker_rate, taker_rate).
+        """
+        tiers = sorted(volume_tiers or [])
+        self.maker_rate = maker_rate
+        self.taker_rate = taker_rate
+        self.volume_tiers = tiers
+        self.symbol_overrides = dict(symbol_overrides or {})
+
+        # Lookup tables: index 0 is the base rate, index i the i-th tier
+        self._thresholds = np.array([tier[0] for tier in tiers], dtype=float)
+        self._maker_by_tier = np.array([maker_rate] + [tier[1] for tier in tiers], dtype=float)
+        self._taker_by_tier = np.array([taker_rate] + [tier[2] for tier in tiers], dtype=float)
+
+        # Index 0 means "no override" (NaN), so unknown symbols fall through
+        self._symbol_index = {stock: i + 1 for i, stock in enumerate(self.symbol_overrides)}
+        self._maker_by_symbol = np.array(
+            [np.nan] + [rates[0] for rates in self.symbol_overrides.values()], dtype=float)
+        self._taker_by_symbol = np.array(
+            [np.nan] + [rates[1] for rates in self.symbol_overrides.values()], dtype=float)
+
+    def __repr__(self):
+        return (f"FeeSchedule | Maker: {self.maker_rate}% | Taker: {self.taker_rate}% | "
+                f"Tiers: {len(self.volume_tiers)} | Overrides: {len(self.symbol_overrides)}")
+
+    def max_rate(self):
+        """
+        Returns the highest rate any fill can be charged, e.g. to size a risk fee buffer.
+        """
+        rates = [self._maker_by_tier, self._taker_by_tier,
+                 self._maker_by_symbol[1:], self._taker_by_symbol[1:]]
+        return float(max(r.max() for r in rates if r.size))
+
+    def rate(self, volume, stock, is_maker):
+        """
+        Looks up the fee rate for a single fill, for per-fill settlement.
+        """
+        if stock in self.symbol_overrides:
+            return self.symbol_overrides[stock][0 if is_maker else 1]
+        tier = bisect_right(self._thresholds, volume)
+        return self._maker_by_tier[tier] if is_maker else self._taker_by_tier[tier]
+
+    def rates(self, volumes, stocks, is_maker):
+        """
+        Looks up the fee rate for many fills at once.
+        :param volumes: Array of each paying trader's rolling notional volume.
+        :param stocks: Sequence of stock symbols, one per fill.
+        :param is_maker: Boolean array, True where the paying side was the maker.
+        :return: Array of rates in percent.
+        """
+        tier = np.searchsorted(self._thresholds, volumes, side="right")
+        rates = np.where(is_maker, self._maker_by_tier[tier], self._taker_by_tier[tier])
+
+        if self._symbol_index:
+            symbol = np.fromiter((self._symbol_index.get(s, 0) for s in stocks), dtype=np.intp,
+                                 count=len(stocks))
+            override = np.where(is_maker, self._maker_by_symbol[symbol], self._taker_by_symbol[symbol])
+            rates = np.where(np.isnan(override), rates, override)
+        return rates
+
+
+class RollingVolume:
+    """
+    Notional volume per trader over the last `window` steps.
+    Each trader keeps a running total plus a short queue of per-step amounts,
+    so a lookup only expires stale steps and never rescans the history.
+    """
+
+    def __init__(self, window=20):
+        self.window = window
+        self.step = 0
+        self._totals = {}   # trader_id -> rolling total
+        self._buckets = {}  # trader_id -> deque of [step, notional]
+
+    def add(self, trader_id, notional):
+        """
+        Adds notional volume for the trader in the current step.
+        """
+        buckets = self._buckets.setdefault(trader_id, deque())
+        if buckets and buckets[-1][0] == self.step:
+            buckets[-1][1] += notional
+        else:
+            buckets.append([self.step, notional])
+        self._totals[trader_id] = self._totals.get(trader_id, 0) + notional
+
+    def get(self, trader_id):
+        """
+        Returns the trader's rolling volume, dropping steps that left the window.
+        """
+        buckets = self._buckets.get(trader_id)
+        if not buckets:
+            return 0
+        oldest = self.step - self.window
+        while buckets and buckets[0][0] <= oldest:
+            self._totals[trader_id] -= buckets.popleft()[1]
+        if not buckets:
+            del self._buckets[trader_id]
+            del self._totals[trader_id]
+            return 0
+        return self._totals[trader_id]
+
+    def advance(self):
+        """
+        Moves the window forward by one step.
+        """
+        self.step += 1
+
+
+class FeeLedger:
+    """
+    Fees collected, per trader and per stock.
+    """
+
+    def __init__(self):
+        self.fees = {}  # (trader_id, stock) -> fees collected
+
+    def record(self, trader_id, stock, fee):
+        key = (trader_id, stock)
+        self.fees[key] = self.fees.get(key, 0) + fee
+
+    def total(self):
+        return sum(self.fees.values())
+
+    def by_trader(self):
+        totals = {}
+        for (trader_id, _), fee in self.fees.items():
+            totals[trader_id] = totals.get(trader_id, 0) + fee
+        return totals
+
+
+def compute_fill_fees(trades, fee_schedule, rolling_volume):
+    """
+    Computes buyer and seller fees for a batch of fills in one vectorized pass.
+    Tiers are looked up from the rolling volume at the start of the step.
+    :return: Tuple of (buyer_fees, seller_fees) arrays, aligned with `trades`.
+    """
+    n = len(trades)
+    if n == 0:
+        return np.zeros(0), np.zeros(0)
+
+    notional = np.fromiter((t["quantity"] * t["price"] for t in trades), dtype=float, count=n)
+    buyer_is_maker = np.fromiter((t.get("maker") == "buy" for t in trades), dtype=bool, count=n)
+    stocks = [t["stock"] for t in trades]
+
+    # One volume lookup per distinct trader, not per fill
+    volume_of = {}
+    for t in trades:
+        for trader_id in (t["buyer"], t["seller"]):
+            if trader_id not in volume_of:
+                volume_of[trader_id] = rolling_volume.get(trader_id)
+    buyer_volumes = np.fromiter((volume_of[t["buyer"]] for t in trades), dtype=float, count=n)
+    seller_volumes = np.fromiter((volume_of[t["seller"]] for t in trades), dtype=float, count=n)
+
+    buyer_rates = fee_schedule.rates(buyer_volumes, stocks, buyer_is_maker)
+    seller_rates = fee_schedule.rates(seller_volumes, stocks, ~buyer_is_maker)
+    return notional * buyer_rates / 100, notional * seller_rates / 100
+
+
+def compute_single_fill_fees(trade, fee_schedule, rolling_volume):
+    """
+    Computes (buyer_fee, seller_fee) for one fill without the array overhead of compute_fill_fees.
+    """
+    value = trade["quantity"] * trade["price"]
+    buyer_is_maker = trade.get("maker") == "buy"
+    buyer_rate = fee_schedule.rate(rolling_volume.get(trade["buyer"]), trade["stock"], buyer_is_maker)
+    seller_rate = fee_schedule.rate(rolling_volume.get(trade["seller"]), trade["stock"], not buyer_is_maker)
+    return float(value * buyer_rate / 100), float(value * seller_rate / 100)
+
+
+def display_fee_ledger(fee_ledger):
+    """
+    Displays fees collected per trader and stock.
+    """
+    print("Fee Ledger:")
+    print(f"{'Trader ID':<10}{'Stock':<10}{'Fees':<12}")
+    print("-" * 32)
+    for (trader_id, stock), fee in sorted(fee_ledger.fees.items()):
+        print(f"{trader_id:<10}{stock:<10}${fee:<11.2f}")
+    print(f"\nTotal Fees Collected: ${fee_ledger.total():.2f}")
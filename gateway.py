@@ -0,0 +1,604 @@
+import asyncio
+import itertools
+import logging
+import os
+import random
+import time
+
+from trader import Trader
+from order import create_order, submit_order, cancel_order, expire_orders, new_order_book, StopBook
+from matching_engine import match_orders, activate_stop_orders
+from clearing import ClearingHouse
+from risk import RiskEngine
+from market_data import DepthBook
+
+logger = logging.getLogger(__name__)
+
+# Line protocol, one space-separated ASCII message per line.
+# Client -> gateway:
+#   LOGIN <trader_id>
+#   NEW <client_ref> <buy|sell> <stock> <quantity> <price> [KIND=market] [TIF=IOC|FOK|GTD]
+#       [EXPIRE=<ticks>] [STOP=<stop_price>] [SHOW=<display_quantity>]
+#   CXL <order_id>
+#   PING <token>
+#   SUB                                 (subscribe to level-2 deltas)
+# Gateway -> client:
+#   ACK <client_ref> <order_id>        REJ <client_ref|order_id> <reason>   (reason 'settlement': a fill failed to settle)
+#   CXLD <order_id>                    PONG <token>
+#   EXP <order_id>                      (GTD order expired)
+#   FILL <order_id> <stock> <side> <quantity> <price>
+#   BOOK <stock> <best_bid|-> <best_ask|->
+#   L2 <add|modify|remove> <stock> <buy|sell> <price> <level_quantity>
+
+
+class ClientSession:
+    """
+    One connected client, with its own bounded inbound and outbound queues.
+    """
+
+    def __init__(self, session_id, writer, max_inbound, max_outbound):
+        """
+        Initializes a ClientSession object.
+        :param max_inbound: Messages buffered before the gateway stops reading from this client.
+        :param max_outbound: Messages buffered before this client is dropped as too slow.
+        """
+        self.session_id = session_id
+        self.writer = writer
+        self.trader_id = None
+        self.l2_subscribed = False
+        self.inbound = asyncio.Queue(max_inbound)
+        self.outbound = asyncio.Queue(max_outbound)
+        self.order_ids = set()  # this client's live orders
+        self.closed = False
+
+    def __repr__(self):
+        return (f"Session: {self.session_id} | Trader: {self.trader_id} | "
+                f"Inbound: {self.inbound.qsize()} | Outbound: {self.outbound.qsize()}")
+
+    def send(self, line):
+        """
+        Queues a message without blocking. Returns False if the client's queue is full.
+        """
+        if self.closed:
+            return True
+        try:
+            self.outbound.put_nowait(line.encode() + b"\n")
+        except asyncio.QueueFull:
+            return False
+        return True
+
+
+class MarketGateway:
+    """
+    Asyncio gateway that lets many external clients submit orders and cancels concurrently.
+    Messages are batched into the matching engine once per tick, and fills,
+    top-of-book updates and (for subscribers) coalesced level-2 deltas are streamed back.
+    Each client has its own queues: a flooding client only blocks its own socket reads,
+    and a client that stops reading is disconnected rather than stalling the others.
+    """
+
+    def __init__(self, traders, order_book, risk_engine, clearing_house, depth_book=None, tick_interval=0.01,
+                 max_inbound=1000, max_outbound=10000, max_batch_per_client=500, stocks=None):
+        """
+        Initializes a MarketGateway object.
+        Raises ValueError if the risk engine's fee buffer is below the highest fee rate, since the
+        pre-trade check would then pass buys whose fees cannot be paid at settlement.
+        :param tick_interval: Seconds between matching cycles.
+        :param stocks: Symbols that may be traded (default: every stock a trader holds at startup).
+        :param max_batch_per_client: Messages taken from each client per tick, so one client
+                                     cannot fill a whole tick on its own.
+        """
+        if risk_engine.fee_buffer < clearing_house.fee_schedule.max_rate():
+            raise ValueError(f"Risk fee buffer {risk_engine.fee_buffer}% is below the highest fee rate "
+                             f"{clearing_house.fee_schedule.max_rate()}%")
+        self.traders = traders
+        self.order_book = order_book
+        self.risk_engine = risk_engine
+        self.clearing_house = clearing_house
+        self.depth_book = depth_book if depth_book else DepthBook()
+        self.tick_interval = tick_interval
+        self.max_inbound = max_inbound
+        self.max_outbound = max_outbound
+        self.max_batch_per_client = max_batch_per_client
+        if stocks is None:
+            stocks = {stock for trader in traders.values() for stock in trader.portfolio}
+        self.stocks = set(stocks)
+
+        self.stop_book = StopBook()
+        self.expiry_index = {}  # tick -> GTD orders expiring then
+        self.last_prices = {}   # stock -> last trade price, used to trigger stops
+
+        self.sessions = {}
+        self.live_orders = {}  # order_id -> (order, session)
+        self.server = None
+        self.orders_received = 0
+        self.fills = 0
+        self.ticks = 0
+        self.failed_ticks = 0
+        self.failed_fills = 0
+        self.slow_clients_dropped = 0
+
+        self._session_ids = itertools.count(1)
+        self._order_ids = itertools.count(1)
+        self._tick_task = None
+        self._unix_path = None
+        self._immediate_orders = []  # IOC/FOK/market orders entering this tick's matching
+        self._connection_tasks = set()
+
+    def __repr__(self):
+        return (f"MarketGateway | Sessions: {len(self.sessions)} | Orders: {self.orders_received} | "
+                f"Fills: {self.fills} | Ticks: {self.ticks}")
+
+    async def start_tcp(self, host="127.0.0.1", port=0):
+        """
+        Starts listening on TCP. Returns the (host, port) actually bound.
+        """
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        self._tick_task = asyncio.create_task(self.run_ticks())
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def start_unix(self, path):
+        """
+        Starts listening on a Unix socket. Returns the socket path.
+        """
+        self.server = await asyncio.start_unix_server(self.handle_connection, path)
+        self._unix_path = path
+        self._tick_task = asyncio.create_task(self.run_ticks())
+        return path
+
+    async def stop(self):
+        """
+        Stops ticking, closes the listener and disconnects every client.
+        """
+        if self._tick_task is not None:
+            self._tick_task.cancel()
+            try:
+                await self._tick_task
+            except asyncio.CancelledError:
+                pass
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for session in list(self.sessions.values()):
+            self.close_session(session)
+        # Let connection handlers see their sockets close before the loop goes away
+        await asyncio.gather(*self._connection_tasks, return_exceptions=True)
+        if self._unix_path is not None and os.path.exists(self._unix_path):
+            os.unlink(self._unix_path)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Reads one client's messages into its inbound queue until it disconnects.
+        """
+        session = ClientSession(next(self._session_ids), writer, self.max_inbound, self.max_outbound)
+        self.sessions[session.session_id] = session
+        task = asyncio.current_task()
+        self._connection_tasks.add(task)
+        writer_task = asyncio.create_task(self.write_loop(session))
+        try:
+            while not session.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Blocks only this client's reads when its queue is full (TCP backpressure)
+                await session.inbound.put(line)
+        except ConnectionError:
+            pass
+        finally:
+            self.close_session(session)
+            writer_task.cancel()
+            self._connection_tasks.discard(task)
+
+    async def write_loop(self, session):
+        """
+        Drains a client's outbound queue, coalescing whatever is queued into one write.
+        """
+        try:
+            while True:
+                chunks = [await session.outbound.get()]
+                while not session.outbound.empty():
+                    chunks.append(session.outbound.get_nowait())
+                session.writer.write(b"".join(chunks))
+                await session.writer.drain()
+        except ConnectionError:
+            self.close_session(session)
+
+    def close_session(self, session):
+        """
+        Disconnects a client and cancels its live orders, releasing what they reserved.
+        """
+        if session.closed:
+            return
+        session.closed = True
+        self.sessions.pop(session.session_id, None)
+        for order_id in list(session.order_ids):
+            cancel_order(order_id, self.order_book, self.risk_engine, self.depth_book, self.stop_book)
+            self.forget_order(order_id)
+        session.writer.close()
+
+    def forget_order(self, order_id):
+        """
+        Stops tracking an order that has left the book. Returns its (order, session) entry, or None.
+        """
+        entry = self.live_orders.pop(order_id, None)
+        if entry is not None:
+            entry[1].order_ids.discard(order_id)
+        return entry
+
+    def send(self, session, line):
+        """
+        Sends a message to a client, dropping the client if it has fallen too far behind.
+        """
+        if not session.send(line):
+            self.slow_clients_dropped += 1
+            self.close_session(session)
+
+    async def run_ticks(self):
+        """
+        Runs a matching cycle every tick_interval. A failing tick is logged and counted, and
+        the next tick runs as usual, so one bad cycle never stops matching for every client.
+        """
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                self.process_tick()
+            except Exception:
+                self.failed_ticks += 1
+                logger.exception("Gateway tick %d failed", self.ticks)
+
+    def process_tick(self):
+        """
+        Runs one matching cycle: expires GTD orders, applies each client's queued messages,
+        matches, settles, then streams fills, cancels and top-of-book updates.
+        """
+        self.ticks += 1
+        for order in expire_orders(self.order_book, self.expiry_index, self.ticks, self.risk_engine,
+                                   self.depth_book, self.stop_book):
+            self.publish_order_done(order, "EXP")
+
+        for session in list(self.sessions.values()):
+            for _ in range(min(session.inbound.qsize(), self.max_batch_per_client)):
+                self.handle_message(session, session.inbound.get_nowait())
+
+        trades = match_orders(self.order_book, self.risk_engine, on_fill=self.clearing_house.on_fill,
+                              depth_book=self.depth_book, reference_prices=self.last_prices)
+        try:
+            self.clearing_house.end_of_step()
+        except ValueError:
+            # The clearing house set the batch aside; tell both sides and keep the tick going
+            logger.exception("Gateway tick %d: %d fills failed to settle", self.ticks, len(trades))
+            self.failed_fills += len(trades)
+            for trade in trades:
+                self.publish_failed_fill(trade["buy_order_id"])
+                self.publish_failed_fill(trade["sell_order_id"])
+            trades = []
+
+        for trade in trades:
+            self.publish_fill(trade["buy_order_id"], "buy", trade)
+            self.publish_fill(trade["sell_order_id"], "sell", trade)
+            self.last_prices[trade["stock"]] = trade["price"]
+        self.fills += len(trades)
+
+        # Orders that cannot rest do not survive the tick; report what was left of them as cancelled
+        for order in self._immediate_orders:
+            if order.status == "cancelled":
+                self.publish_order_done(order, "CXLD")
+
+        # Stops reached by this tick's trades join the book for the next tick
+        triggered = activate_stop_orders(self.stop_book, self.order_book,
+                                         {trade["stock"]: trade["price"] for trade in trades}, self.depth_book)
+        self._immediate_orders = [order for order in triggered if not order.rests_in_book()]
+
+        deltas = self.depth_book.drain_deltas()
+        if deltas:
+            self.publish_book(deltas)
+
+    def handle_message(self, session, line):
+        """
+        Parses and applies a single client message.
+        """
+        parts = line.decode(errors="replace").split()
+        if not parts:
+            return
+        command = parts[0]
+
+        if command == "PING":
+            self.send(session, f"PONG {' '.join(parts[1:])}")
+        elif command == "LOGIN":
+            self.handle_login(session, parts)
+        elif session.trader_id is None:
+            self.send(session, "REJ - not_logged_in")
+        elif command == "NEW":
+            self.handle_new_order(session, parts)
+        elif command == "CXL":
+            self.handle_cancel(session, parts)
+        elif command == "SUB":
+            session.l2_subscribed = True
+            self.send(session, "ACK SUB L2")
+        else:
+            self.send(session, "REJ - unknown_command")
+
+    def handle_login(self, session, parts):
+        try:
+            trader_id = int(parts[1])
+        except (IndexError, ValueError):
+            self.send(session, "REJ - bad_login")
+            return
+        if trader_id not in self.traders:
+            self.send(session, "REJ - unknown_trader")
+            return
+        session.trader_id = trader_id
+        self.send(session, f"ACK LOGIN {trader_id}")
+
+    def handle_new_order(self, session, parts):
+        self.orders_received += 1
+        try:
+            _, client_ref, order_type, stock, quantity, price = parts[:6]
+            quantity = int(quantity)
+            price = float(price)
+            order_options = self.parse_order_options(parts[6:])
+        except (ValueError, KeyError):
+            self.send(session, f"REJ {parts[1] if len(parts) > 1 else '-'} bad_order")
+            return
+        if stock not in self.stocks:
+            # Would otherwise reserve cash for an order that can never trade
+            self.send(session, f"REJ {client_ref} bad_order")
+            return
+
+        order_id = next(self._order_ids)
+        try:
+            order = create_order(self.traders[session.trader_id], order_id, order_type, stock,
+                                 quantity, price, self.risk_engine, **order_options)
+        except ValueError:
+            self.send(session, f"REJ {client_ref} risk")
+            return
+
+        submit_order(order, self.order_book, self.stop_book, self.depth_book, self.expiry_index)
+        self.risk_engine.reserve(order)
+        if order.stop_price is None and not order.rests_in_book():
+            self._immediate_orders.append(order)
+        self.live_orders[order_id] = (order, session)
+        session.order_ids.add(order_id)
+        self.send(session, f"ACK {client_ref} {order_id}")
+
+    def parse_order_options(self, fields):
+        """
+        Turns optional KEY=VALUE fields of a NEW message into create_order keyword arguments.
+        """
+        options = {}
+        for field in fields:
+            key, value = field.split("=", 1)
+            if key == "KIND":
+                options["order_kind"] = value.lower()
+            elif key == "TIF":
+                options["time_in_force"] = value.upper()
+            elif key == "EXPIRE":
+                options["expire_step"] = self.ticks + int(value)
+            elif key == "STOP":
+                options["stop_price"] = float(value)
+            elif key == "SHOW":
+                options["display_quantity"] = int(value)
+            else:
+                raise KeyError(key)
+        return options
+
+    def handle_cancel(self, session, parts):
+        try:
+            order_id = int(parts[1])
+        except (IndexError, ValueError):
+            self.send(session, "REJ - bad_cancel")
+            return
+
+        entry = self.live_orders.get(order_id)
+        if entry is None or entry[0].trader_id != session.trader_id:
+            self.send(session, f"REJ {order_id} unknown_order")
+            return
+        if cancel_order(order_id, self.order_book, self.risk_engine, self.depth_book, self.stop_book):
+            self.forget_order(order_id)
+            self.send(session, f"CXLD {order_id}")
+
+    def publish_fill(self, order_id, side, trade):
+        entry = self.live_orders.get(order_id)
+        if entry is None:
+            return
+        order, session = entry
+        if order.status == "filled":
+            self.forget_order(order_id)
+        self.send(session, f"FILL {order_id} {trade['stock']} {side} {trade['quantity']} {trade['price']:.4f}")
+
+    def publish_failed_fill(self, order_id):
+        """
+        Tells the owner a fill of their order did not settle.
+        """
+        entry = self.live_orders.get(order_id)
+        if entry is None:
+            return
+        order, session = entry
+        if order.status != "open":
+            self.forget_order(order_id)
+        self.send(session, f"REJ {order_id} settlement")
+
+    def publish_order_done(self, order, message):
+        """
+        Tells the owner an order left the book without filling (CXLD or EXP).
+        """
+        entry = self.forget_order(order.order_id)
+        if entry is not None:
+            self.send(entry[1], f"{message} {order.order_id}")
+
+    def publish_book(self, deltas):
+        """
+        Broadcasts top-of-book for every stock that changed, plus level-2 deltas to subscribers.
+        """
+        book_lines = []
+        for stock in {delta[1] for delta in deltas}:
+            bid, ask = self.depth_book.best_bid(stock), self.depth_book.best_ask(stock)
+            book_lines.append(f"BOOK {stock} {'-' if bid is None else f'{bid:.4f}'} "
+                              f"{'-' if ask is None else f'{ask:.4f}'}")
+        l2_lines = [f"L2 {action} {stock} {side} {price:.4f} {quantity}"
+                    for action, stock, side, price, quantity in deltas]
+
+        for session in list(self.sessions.values()):
+            for line in book_lines:
+                self.send(session, line)
+            if session.l2_subscribed:
+                for line in l2_lines:
+                    self.send(session, line)
+
+
+class GatewayClient:
+    """
+    Minimal asyncio client for the gateway's line protocol, over TCP or a Unix socket.
+    """
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+
+    async def connect_tcp(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    async def connect_unix(self, path):
+        self.reader, self.writer = await asyncio.open_unix_connection(path)
+
+    def send(self, line):
+        self.writer.write(line.encode() + b"\n")
+
+    def login(self, trader_id):
+        self.send(f"LOGIN {trader_id}")
+
+    def send_order(self, client_ref, order_type, stock, quantity, price, **options):
+        """
+        Sends a new order. Options are sent as KEY=VALUE fields, e.g. TIF="IOC" or SHOW=2.
+        """
+        fields = "".join(f" {key}={value}" for key, value in options.items())
+        self.send(f"NEW {client_ref} {order_type} {stock} {quantity} {price:.4f}{fields}")
+
+    def cancel(self, order_id):
+        self.send(f"CXL {order_id}")
+
+    def ping(self, token):
+        self.send(f"PING {token}")
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def read_message(self):
+        """
+        Returns the next message as a list of fields, or None once the gateway disconnects.
+        """
+        line = await self.reader.readline()
+        return line.decode().split() if line else None
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def run_load_client(connect, trader_id, num_orders, stock_prices, seed):
+    """
+    Sends `num_orders` random orders as fast as possible while reading responses.
+    Finishes with a PING, whose PONG guarantees every earlier fill has been delivered.
+    :param connect: Coroutine function that connects a GatewayClient.
+    :return: Dictionary of message counts.
+    """
+    rng = random.Random(seed)
+    client = GatewayClient()
+    await connect(client)
+    client.login(trader_id)
+    counts = {"ACK": 0, "REJ": 0, "FILL": 0, "CXLD": 0, "BOOK": 0}
+    stocks = list(stock_prices)
+
+    async def send_orders():
+        for i in range(num_orders):
+            stock = rng.choice(stocks)
+            order_type = rng.choice(("buy", "sell"))
+            price = max(stock_prices[stock] + rng.uniform(-2, 2), 1.0)
+            options = {"TIF": "IOC"} if rng.random() < 0.1 else {}
+            client.send_order(i, order_type, stock, rng.randint(1, 5), price, **options)
+            if i % 100 == 0:
+                await client.drain()
+        await client.drain()
+
+    async def read_responses():
+        answered = 0
+        while True:
+            message = await client.read_message()
+            if message is None:
+                return
+            kind = message[0]
+            if kind == "PONG":
+                return
+            if message[1:2] == ["LOGIN"]:
+                continue
+            if kind in counts:
+                counts[kind] += 1
+            if kind in ("ACK", "REJ"):
+                answered += 1
+                if answered == num_orders:
+                    client.ping(trader_id)
+
+    await asyncio.gather(send_orders(), read_responses())
+    await client.close()
+    return counts
+
+
+async def run_load_test(num_clients=20, orders_per_client=500, stocks=("AAPL", "GOOG", "MSFT", "TSLA"),
+                        unix_path=None, tick_interval=0.005, seed=0):
+    """
+    Starts a gateway over a local market, drives it with concurrent loopback clients
+    and measures end-to-end order throughput.
+    :param unix_path: Use a Unix socket at this path instead of loopback TCP.
+    """
+    rng = random.Random(seed)
+    stock_prices = {stock: rng.uniform(50, 70) for stock in stocks}
+    traders = {}
+    for trader_id in range(1, num_clients + 1):
+        traders[trader_id] = Trader(trader_id, cash=10_000_000, portfolio={stock: 100_000 for stock in stocks})
+
+    gateway = MarketGateway(traders, new_order_book(), RiskEngine(), ClearingHouse(traders),
+                            tick_interval=tick_interval, stocks=stocks)
+    if unix_path:
+        await gateway.start_unix(unix_path)
+
+        async def connect(client):
+            await client.connect_unix(unix_path)
+    else:
+        host, port = await gateway.start_tcp()
+
+        async def connect(client):
+            await client.connect_tcp(host, port)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_load_client(connect, trader_id, orders_per_client, stock_prices, seed + trader_id)
+        for trader_id in traders
+    ))
+    elapsed = time.perf_counter() - start
+    await gateway.stop()
+
+    total_orders = num_clients * orders_per_client
+    summary = {kind: sum(r[kind] for r in results) for kind in ("ACK", "REJ", "FILL", "CXLD", "BOOK")}
+    summary.update({
+        "clients": num_clients,
+        "orders": total_orders,
+        "ticks": gateway.ticks,
+        "seconds": elapsed,
+        "orders_per_second": total_orders / elapsed if elapsed > 0 else 0,
+    })
+    return summary
+
+
+def display_load_test_results(summary):
+    """
+    Displays gateway load test results in a readable format.
+    """
+    print("Gateway Load Test:")
+    print(f"Clients: {summary['clients']} | Orders: {summary['orders']} | Ticks: {summary['ticks']}")
+    print(f"Acks: {summary['ACK']} | Rejects: {summary['REJ']} | Fills: {summary['FILL']} | "
+          f"Cancels: {summary['CXLD']} | Book updates: {summary['BOOK']}")
+    print(f"Elapsed: {summary['seconds']:.2f}s | Throughput: {summary['orders_per_second']:.0f} orders/sec")
+
+
+if __name__ == "__main__":
+    display_load_test_results(asyncio.run(run_load_test()))
@@ -1,60 +1,122 @@
+import argparse
+import copy
+import functools
+import itertools
+import os
 import random
-import matplotlib.pyplot as plt
 
 # Imports from your existing modules (adjust paths as needed):
 from trader import Trader
-from order import create_order, add_order_to_book
-from matching_engine import match_orders
-from clearing import batch_clearing_and_settlement
+from order import create_order, submit_order, expire_orders, new_order_book, StopBook
+from matching_engine import match_orders, activate_stop_orders
+from auction import uncross_orders, MATCHING_MODES
+from clearing import ClearingHouse
+from risk import RiskEngine, display_risk_summary
+from fees import FeeSchedule, display_fee_ledger
+from market_data import DepthBook
 from reporting import generate_trade_report, visualize_trade_activity
+from analytics import compute_risk_report, display_risk_report
 from utils import simulate_random_stock_prices, generate_unique_order_id
+from scenario import make_scenario, load_scenario
+from monitor import LiveMonitor, MONITOR_MODES
+from trade_store import TradeStore
 
 # Our new visualization functions:
 from visualizations import (
     plot_stock_prices_over_time,
     plot_trader_volume_over_time,
     plot_trader_net_worth_over_time,
-    plot_final_portfolio_composition
+    plot_final_portfolio_composition,
+    plot_order_book_depth
 )
 
 
-def initialize_simulation():
+def initialize_market(config):
     """
-    Initializes the simulation state, including stock prices, traders, and order book.
+    Creates the starting stock prices and traders for a scenario.
+    A scenario with a seed always produces the same market.
+    :return: Tuple of (stock_prices, traders).
     """
-    stocks = ["AAPL", "GOOG", "MSFT", "TSLA"]
-    # Slightly narrower base price range so they're affordable
-    stock_prices = simulate_random_stock_prices(stocks, (50, 70))
+    if config["seed"] is not None:
+        random.seed(config["seed"])
+
+    stocks = config["stocks"]
+    stock_prices = simulate_random_stock_prices(stocks, tuple(config["base_price_range"]))
 
-    # Initialize traders with more cash + a small starting portfolio
+    # Initialize traders with cash + a small starting portfolio
     traders = {}
-    for trader_id in range(1, 6):
-        cash_amount = random.randint(20000, 30000)
+    for trader_id in range(1, config["num_traders"] + 1):
+        cash_amount = random.randint(*config["cash_range"])
         t = Trader(trader_id, cash=cash_amount)
 
         # Give each trader some shares in exactly one stock
         random_stock = random.choice(stocks)
-        t.portfolio[random_stock] = random.randint(5, 15)
+        t.portfolio[random_stock] = random.randint(*config["initial_shares_range"])
 
         traders[trader_id] = t
 
-    order_book = {"buy": [], "sell": []}
+    return stock_prices, traders
+
+
+def initialize_simulation(config=None, market=None):
+    """
+    Initializes the simulation state, including stock prices, traders, and order book.
+    :param config: Scenario (see scenario.py); None runs the default scenario.
+    :param market: Optional (stock_prices, traders) to start from instead of creating them.
+                   It is copied, so one starting market can be shared by many runs.
+    """
+    config = config if config is not None else make_scenario()
+    if market is None:
+        stock_prices, traders = initialize_market(config)
+    else:
+        stock_prices, traders = copy.deepcopy(market)
+
+    order_book = new_order_book()
+    # Makers pay less than takers; traders with more rolling volume move to cheaper tiers
+    fee_schedule = FeeSchedule(
+        maker_rate=config["maker_rate"],
+        taker_rate=config["taker_rate"],
+        volume_tiers=[tuple(tier) for tier in config["volume_tiers"]]
+    )
+    # Buy reservations include a buffer for the highest fee the schedule can charge
+    risk_engine = RiskEngine(fee_buffer=fee_schedule.max_rate())
+    clearing_house = ClearingHouse(traders, mode=config["settlement_mode"], fee_schedule=fee_schedule)
+    depth_book = DepthBook()
+    stop_book = StopBook()
+    expiry_index = {}  # expire_step -> GTD orders expiring then
+    trade_store = TradeStore()
 
     return {
         "stock_prices": stock_prices,
         "traders": traders,
-        "order_book": order_book
+        "order_book": order_book,
+        "risk_engine": risk_engine,
+        "clearing_house": clearing_house,
+        "depth_book": depth_book,
+        "stop_book": stop_book,
+        "expiry_index": expiry_index,
+        "trade_store": trade_store,
+        "order_ids": itertools.count(1)  # IDs are never reused, even after an order leaves the book
     }
 
 
-def place_order(trader, order_book, order_type, stock, quantity, price):
+def place_order(trader, order_book, risk_engine, order_type, stock, quantity, price, depth_book=None,
+                stop_book=None, expiry_index=None, order_ids=None, **order_options):
     """
-    Places an order for a trader if valid. Creates a unique ID and adds to the order book.
+    Places an order for a trader if valid. Creates a unique ID and adds to the order book
+    (or to the stop book, for stop orders).
+    Rejected orders are counted by the risk engine; returns the new order or None.
+    :param order_ids: Iterator of order IDs, such as the simulation state's 'order_ids' counter, so an
+                      ID is never reused. Without it a random ID is drawn that is only unique among
+                      the orders still in the book and the stop book.
+    :param order_options: order_kind, time_in_force, stop_price, display_quantity, expire_step.
     """
     try:
-        # Gather existing IDs in order book
-        existing_ids = {o.order_id for o in order_book["buy"] + order_book["sell"]}
-        order_id = generate_unique_order_id(existing_ids)
+        if order_ids is not None:
+            order_id = next(order_ids)
+        else:
+            pending_stops = stop_book.orders.keys() if stop_book is not None else set()
+            order_id = generate_unique_order_id(order_book["orders"].keys() | pending_stops)
 
         new_order = create_order(
             trader=trader,
@@ -62,27 +124,86 @@ def place_order(trader, order_book, order_type, stock, quantity, price):
             order_type=order_type,
             stock=stock,
             quantity=quantity,
-            price=price
+            price=price,
+            risk_engine=risk_engine,
+            **order_options
         )
-        add_order_to_book(new_order, order_book)
+    except ValueError:
+        return None
 
-    except ValueError as e:
-        print(f"Order failed for Trader {trader.trader_id}: {e}")
+    submit_order(new_order, order_book, stop_book, depth_book, expiry_index)
+    risk_engine.reserve(new_order)
+    return new_order
 
 
-def main():
+def choose_order_options(order_type, stock_price, step, market_collar=0.05):
+    """
+    Picks a random order style for a simulated trader.
+    Returns (price adjustment, order options) where a price adjustment of None keeps the limit price.
+    :param market_collar: Market orders may trade at most this far (as a fraction) from the current price.
+    """
+    roll = random.random()
+    if roll < 0.6:
+        return None, {}
+    if roll < 0.7:
+        # Good for the next 3 steps only
+        return None, {"time_in_force": "GTD", "expire_step": step + 3}
+    if roll < 0.8:
+        return None, {"time_in_force": "IOC"}
+    if roll < 0.85:
+        return None, {"time_in_force": "FOK"}
+    direction = 1 if order_type == "buy" else -1
+    if roll < 0.9:
+        # Market order, protected at the collar
+        return stock_price * (1 + direction * market_collar), {"order_kind": "market"}
+    if roll < 0.95:
+        # Stop-market: a buy stop above the price, a sell stop below it
+        stop_price = stock_price * (1 + direction * 0.02)
+        return stop_price * (1 + direction * market_collar), {"order_kind": "market", "stop_price": stop_price}
+    # Iceberg showing one share at a time
+    return None, {"display_quantity": 1}
+
+
+def run_simulation(config=None, market=None, verbose=True, shared_state=None, monitor=None):
+    """
+    Runs one simulation of a scenario and returns its results, without any reports or charts.
+    :param config: Scenario (see scenario.py); None runs the default scenario.
+    :param market: Optional shared starting market, see initialize_simulation.
+    :param verbose: Whether to print prices, top of book and order counts every step.
+    :param shared_state: Optional SharedMarketState that prices, cash and positions are published to every step.
+    :param monitor: Optional LiveMonitor that samples every step.
+    :return: Dictionary with the scenario, trades, price / volume / net-worth histories,
+             final balances, fees collected, rejected orders and the final simulation state.
+    """
+    config = config if config is not None else make_scenario()
+    if config["matching_mode"] not in MATCHING_MODES:
+        raise ValueError(f"Unknown matching mode: {config['matching_mode']}")
+    if config["matching_mode"] == "auction":
+        match = functools.partial(uncross_orders, allocation=config["allocation"])
+    else:
+        match = match_orders
+
     # Initialize simulation
-    simulation_state = initialize_simulation()
+    simulation_state = initialize_simulation(config, market)
     stock_prices = simulation_state["stock_prices"]
     traders = simulation_state["traders"]
     order_book = simulation_state["order_book"]
+    risk_engine = simulation_state["risk_engine"]
+    clearing_house = simulation_state["clearing_house"]
+    depth_book = simulation_state["depth_book"]
+    stop_book = simulation_state["stop_book"]
+    expiry_index = simulation_state["expiry_index"]
+    trade_store = simulation_state["trade_store"]
+    order_ids = simulation_state["order_ids"]
+
+    # The order flow gets its own seed, so it is the same whether or not the market was shared
+    if config["seed"] is not None:
+        random.seed(f"{config['seed']}:orders")
 
     # We'll store historical data for plotting:
     # 1) Stock prices over time
     historical_prices = {s: [] for s in stock_prices}
-    # 2) Trader volume: how many shares each trader trades each step
-    trader_volume_history = {t_id: [] for t_id in traders}
-    # 3) Trader net worth
+    # 2) Trader net worth
     net_worth_history = {t_id: [] for t_id in traders}
 
     trade_history = []
@@ -91,69 +212,82 @@ def main():
     for s in stock_prices:
         historical_prices[s].append(stock_prices[s])
     for t_id, trader in traders.items():
-        trader_volume_history[t_id].append(0)  # no trades at step 0
         # net worth = cash + sum(qty * price)
         worth = trader.cash
         for st, qty in trader.portfolio.items():
             worth += stock_prices[st] * qty
         net_worth_history[t_id].append(worth)
 
+    stocks = list(stock_prices)
+    low_quantity, high_quantity = config["buy_quantity_range"]
+    spread = config["price_spread"]
+    shock = config["price_shock"]
+
     # Run the simulation
-    num_steps = 20
-    for step in range(num_steps):
-        print(f"\n--- Simulation Step {step + 1} ---")
+    for step in range(config["num_steps"]):
+        if verbose:
+            print(f"\n--- Simulation Step {step + 1} ---")
 
-        # Show current stock prices
-        print("Stock Prices:")
-        for st, price in stock_prices.items():
-            print(f"{st}: ${price:.2f}")
+            # Show current stock prices
+            print("Stock Prices:")
+            for st, price in stock_prices.items():
+                print(f"{st}: ${price:.2f}")
+
+        # Drop good-till-date orders whose time is up
+        expired = expire_orders(order_book, expiry_index, step, risk_engine, depth_book, stop_book)
 
         # Randomly place orders for each trader
         for t_id, trader in traders.items():
             # Weighted approach to encourage some sells
-            # If the trader actually owns something, maybe they do a sell 30% of time
-            if trader.portfolio and random.random() < 0.3:
+            # If the trader has unreserved shares, maybe they do a sell some of the time
+            sellable = [st for st in sorted(trader.portfolio) if risk_engine.available_shares(trader, st) > 0]
+            if sellable and random.random() < config["sell_probability"]:
                 order_type = "sell"
-                # pick a random stock they own
-                stock = random.choice(list(trader.portfolio.keys()))
-                max_qty = trader.portfolio[stock]
-                quantity = random.randint(1, max_qty) if max_qty > 0 else 0
+                # pick a random stock they can still sell
+                stock = random.choice(sellable)
+                max_qty = risk_engine.available_shares(trader, stock)
+                quantity = random.randint(1, max_qty)
             else:
                 order_type = "buy"
-                stock = random.choice(list(stock_prices.keys()))
-                quantity = random.randint(1, 5)
+                stock = random.choice(stocks)
+                quantity = random.randint(low_quantity, high_quantity)
 
             # Price close to current market
-            price = stock_prices[stock] + random.uniform(-2, 2)
+            price = stock_prices[stock] + random.uniform(-spread, spread)
             if price <= 1:
                 price = 1.0  # avoid zero or negative
 
-            place_order(trader, order_book, order_type, stock, quantity, price)
+            protection_price, order_options = choose_order_options(order_type, stock_prices[stock], step,
+                                                                   config["market_collar"])
+            if protection_price is not None:
+                price = max(protection_price, 1.0)
+
+            place_order(trader, order_book, risk_engine, order_type, stock, quantity, price, depth_book,
+                        stop_book, expiry_index, order_ids, **order_options)
 
         # Match orders
-        trades = match_orders(order_book, traders)
+        trades = match(order_book, risk_engine, on_fill=clearing_house.on_fill, depth_book=depth_book,
+                       reference_prices=stock_prices)
         trade_history.extend(trades)
+        trade_store.append(step + 1, trades)
 
-        # Count how many shares each trader traded this step
-        # We'll do sum of shares as buyer + seller
-        volumes_this_step = {t_id: 0 for t_id in traders}
-        for tr in trades:
-            volumes_this_step[tr["buyer"]] += tr["quantity"]
-            volumes_this_step[tr["seller"]] += tr["quantity"]
+        # Settle any fills the clearing house deferred to the end of the step
+        clearing_house.end_of_step()
 
-        # Update each trader's volume for this step
-        for t_id in traders:
-            trader_volume_history[t_id].append(volumes_this_step[t_id])
-
-        # Clear and settle
-        batch_clearing_and_settlement(trades, traders)
+        # Show the top of book left resting after matching
+        level_updates = len(depth_book.drain_deltas())
+        if verbose:
+            print(f"Top of Book ({level_updates} level updates):")
+            for st in stock_prices:
+                bid, ask = depth_book.best_bid(st), depth_book.best_ask(st)
+                print(f"{st}: bid {'-' if bid is None else f'${bid:.2f}'} / ask {'-' if ask is None else f'${ask:.2f}'}")
 
         # Update the market prices (and store them in historical data)
         # If you have a function like "simulate_random_events" or "update_market_prices", call it
         # For now let's just do a small random wiggle:
         for st in stock_prices:
-            # random +/- 3% shift
-            shift = random.uniform(-0.03, 0.03)
+            # random +/- price_shock shift
+            shift = random.uniform(-shock, shock)
             stock_prices[st] *= (1 + shift)
             if stock_prices[st] < 1:
                 stock_prices[st] = 1.0
@@ -161,6 +295,12 @@ def main():
         for st in stock_prices:
             historical_prices[st].append(stock_prices[st])
 
+        # Stop orders whose stop price the new prices reached join the book for the next step
+        triggered = activate_stop_orders(stop_book, order_book, stock_prices, depth_book)
+        if verbose:
+            print(f"Expired orders: {len(expired)} | Stops triggered: {len(triggered)} | "
+                  f"Pending stops: {len(stop_book)}")
+
         # Now recalc each trader's net worth
         for t_id, trader in traders.items():
             worth = trader.cash
@@ -168,28 +308,91 @@ def main():
                 worth += stock_prices[st] * qty
             net_worth_history[t_id].append(worth)
 
+        # Let reader processes see the state at the end of this step
+        if shared_state is not None:
+            shared_state.publish(step, stock_prices, traders)
+
+        if monitor is not None:
+            monitor.record(step + 1, trades, order_book, stock_prices, traders, depth_book)
+
+    # How many shares each trader traded each step, as buyer plus as seller (none at step 0)
+    trader_volume_history = trade_store.trader_volume_history(traders, config["num_steps"])
+
+    return {
+        "config": config,
+        "trades": trade_history,
+        "historical_prices": historical_prices,
+        "trader_volume_history": trader_volume_history,
+        "net_worth_history": net_worth_history,
+        "final_balances": {t_id: {"cash": t.cash, "portfolio": dict(t.portfolio)} for t_id, t in traders.items()},
+        "fees_collected": clearing_house.total_fees_collected,
+        "rejected_orders": risk_engine.rejected_orders,
+        "state": simulation_state
+    }
+
+
+def main(config=None, monitor=None, plot_dir=None):
+    """
+    Runs a scenario, then prints the risk and fee summaries, writes the trade report and draws the charts.
+    :param config: Scenario (see scenario.py); None runs the default scenario.
+    :param monitor: Optional LiveMonitor that follows the run; a terminal monitor replaces the per-step prints.
+    :param plot_dir: Optional directory the charts are saved to instead of being shown.
+    """
+    verbose = monitor is None or monitor.mode != "terminal"
+    results = run_simulation(config, verbose=verbose, monitor=monitor)
+    if monitor is not None:
+        monitor.close()
+    simulation_state = results["state"]
+    stock_prices = simulation_state["stock_prices"]
+    traders = simulation_state["traders"]
+    trade_history = results["trades"]
+
+    display_risk_summary(simulation_state["risk_engine"])
+    display_fee_ledger(simulation_state["clearing_house"].fee_ledger)
+    display_risk_report(compute_risk_report(results))
+
     # At the end, generate a trade report CSV (if you like)
     generate_trade_report(trade_history)
 
+    def chart_path(name):
+        return None if plot_dir is None else os.path.join(plot_dir, f"{name}.png")
+
+    if plot_dir is not None:
+        os.makedirs(plot_dir, exist_ok=True)
+
     # (You can still call your existing bar chart "visualize_trade_activity" for total shares)
-    visualize_trade_activity(trade_history)
+    visualize_trade_activity(trade_history, chart_path("trade_activity"))
 
-    # Now let's create our 4 new charts
-    print("\nGenerating 4 overlayed charts...")
+    # Now let's create our 5 new charts
+    print("\nGenerating 5 overlayed charts...")
 
     # 1) Stock Price vs Time
-    plot_stock_prices_over_time(historical_prices)
+    plot_stock_prices_over_time(results["historical_prices"], chart_path("stock_prices"))
 
     # 2) Trader Volume vs Time
-    plot_trader_volume_over_time(trader_volume_history)
+    plot_trader_volume_over_time(results["trader_volume_history"], chart_path("trader_volume"))
 
     # 3) Trader Net Worth vs Time
-    plot_trader_net_worth_over_time(net_worth_history)
+    plot_trader_net_worth_over_time(results["net_worth_history"], chart_path("trader_net_worth"))
 
     # 4) Final Portfolio Composition
-    plot_final_portfolio_composition(traders, stock_prices)
+    plot_final_portfolio_composition(traders, stock_prices, chart_path("portfolio_composition"))
+
+    # 5) Resting order book depth at the end of the run
+    plot_order_book_depth(simulation_state["depth_book"], list(stock_prices), chart_path("order_book_depth"))
 
     print("\nSimulation complete!")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the trading simulation.")
+    parser.add_argument("scenario", nargs="?", help="Scenario file, e.g. scenarios/large_market.json")
+    parser.add_argument("--monitor", choices=MONITOR_MODES, help="Follow the run in the terminal or an HTML file")
+    parser.add_argument("--monitor-interval", type=float, default=1.0, help="Seconds between monitor updates")
+    parser.add_argument("--html-path", default="monitor.html", help="Where the HTML monitor is written")
+    parser.add_argument("--plot-dir", help="Save the charts here instead of showing them")
+    args = parser.parse_args()
+
+    monitor = None
+    if args.monitor is not None:
+        monitor = LiveMonitor(args.monitor, args.monitor_interval, args.html_path)
+    main(load_scenario(args.scenario) if args.scenario else None, monitor, args.plot_dir)
@@ -0,0 +1,192 @@
+import heapq
+
+# Stale heap entries tolerated on top of twice the live levels before a heap is rebuilt
+HEAP_SLACK = 16
+
+
+class DepthBook:
+    """
+    Level-2 view of the order book: aggregated quantity per price level, per stock and side.
+    Every change to a level is recorded as an incremental delta ('add', 'modify' or 'remove').
+    Best bid/ask are cached, and top-N depth snapshots are only rebuilt for stocks
+    whose levels changed since the last snapshot.
+    """
+
+    def __init__(self, depth=5, record_deltas=True):
+        """
+        Initializes a DepthBook object.
+        :param depth: Number of levels per side in a depth snapshot.
+        :param record_deltas: Whether to keep deltas until drain_deltas() is called.
+        """
+        self.depth = depth
+        self.record_deltas = record_deltas
+        self.levels = {"buy": {}, "sell": {}}  # side -> stock -> {price: quantity}
+        self.deltas = []
+
+        self._best = {}         # (stock, side) -> best price
+        self._heaps = {}        # (stock, side) -> heap of prices (negated for bids), cleaned lazily
+        self._snapshots = {}    # stock -> cached snapshot
+        self._dirty = set()     # stocks whose snapshot must be rebuilt
+
+    def __repr__(self):
+        return (f"DepthBook | Stocks: {len(set(self.levels['buy']) | set(self.levels['sell']))} | "
+                f"Pending deltas: {len(self.deltas)}")
+
+    def add_order(self, order):
+        """
+        Adds a resting order's visible quantity to its price level.
+        Orders that never rest (market, IOC, FOK) are not displayed.
+        """
+        if not order.rests_in_book():
+            return
+        self.update_level(order.stock, order.order_type, order.price, order.quantity)
+
+    def remove_quantity(self, order, quantity):
+        """
+        Removes quantity from an order's price level, after a fill or a cancel.
+        """
+        if not order.rests_in_book():
+            return
+        self.update_level(order.stock, order.order_type, order.price, -quantity)
+
+    def update_level(self, stock, side, price, quantity_change):
+        """
+        Applies a quantity change to one price level and records the resulting delta.
+        """
+        if quantity_change == 0:
+            return
+        levels = self.levels[side].setdefault(stock, {})
+        old_quantity = levels.get(price, 0)
+        new_quantity = old_quantity + quantity_change
+        key = (stock, side)
+
+        if new_quantity <= 0:
+            action = "remove"
+            new_quantity = 0
+            del levels[price]
+            if not levels:
+                del self.levels[side][stock]
+            if self._best.get(key) == price:
+                self._refresh_best(stock, side)
+        elif old_quantity == 0:
+            action = "add"
+            levels[price] = new_quantity
+            heap = self._heaps.setdefault(key, [])
+            heapq.heappush(heap, -price if side == "buy" else price)
+            if len(heap) > 2 * len(levels) + HEAP_SLACK:
+                self._compact_heap(stock, side)
+            best = self._best.get(key)
+            if best is None or (price > best if side == "buy" else price < best):
+                self._best[key] = price
+        else:
+            action = "modify"
+            levels[price] = new_quantity
+
+        self._dirty.add(stock)
+        if self.record_deltas:
+            self.deltas.append((action, stock, side, price, new_quantity))
+
+    def _refresh_best(self, stock, side):
+        """
+        Finds the next best price after the best level was removed,
+        discarding heap entries for levels that no longer exist.
+        """
+        key = (stock, side)
+        heap = self._heaps.get(key, [])
+        levels = self.levels[side].get(stock, {})
+        while heap:
+            price = -heap[0] if side == "buy" else heap[0]
+            if price in levels:
+                self._best[key] = price
+                return
+            heapq.heappop(heap)
+        self._best.pop(key, None)
+        self._heaps.pop(key, None)
+
+    def _compact_heap(self, stock, side):
+        """
+        Rebuilds a heap from the live levels only. Levels removed below the best price leave
+        stale entries that are never popped, so without this a level that keeps emptying and
+        refilling would grow the heap forever; rebuilding once stale entries outnumber live
+        levels keeps it bounded at amortized constant cost per add.
+        """
+        levels = self.levels[side][stock]
+        heap = [-price for price in levels] if side == "buy" else list(levels)
+        heapq.heapify(heap)
+        self._heaps[(stock, side)] = heap
+
+    def best_bid(self, stock):
+        """
+        Returns the best bid price for a stock, or None.
+        """
+        return self._best.get((stock, "buy"))
+
+    def best_ask(self, stock):
+        """
+        Returns the best ask price for a stock, or None.
+        """
+        return self._best.get((stock, "sell"))
+
+    def top_of_book(self, stock):
+        """
+        Returns (best bid, best ask, bid quantity, ask quantity) for a stock.
+        """
+        bid, ask = self.best_bid(stock), self.best_ask(stock)
+        bid_quantity = self.levels["buy"][stock][bid] if bid is not None else 0
+        ask_quantity = self.levels["sell"][stock][ask] if ask is not None else 0
+        return bid, ask, bid_quantity, ask_quantity
+
+    def snapshot(self, stock):
+        """
+        Returns the top-N levels for a stock as {'bids': [(price, qty), ...], 'asks': [...]},
+        rebuilding it only if the stock changed since the last call.
+        """
+        if stock in self._dirty or stock not in self._snapshots:
+            bids = self.levels["buy"].get(stock, {})
+            asks = self.levels["sell"].get(stock, {})
+            self._snapshots[stock] = {
+                "bids": [(p, bids[p]) for p in heapq.nlargest(self.depth, bids)],
+                "asks": [(p, asks[p]) for p in heapq.nsmallest(self.depth, asks)],
+            }
+            self._dirty.discard(stock)
+        return self._snapshots[stock]
+
+    def drain_deltas(self):
+        """
+        Returns the deltas recorded since the last call, coalesced to one per price level.
+        A level added and removed in between produces no delta at all.
+        """
+        first_action = {}
+        last_delta = {}
+        for delta in self.deltas:
+            level = delta[1:4]
+            first_action.setdefault(level, delta[0])
+            last_delta[level] = delta
+        self.deltas = []
+
+        coalesced = []
+        for level, (_, stock, side, price, quantity) in last_delta.items():
+            if first_action[level] == "add":
+                if quantity == 0:
+                    continue
+                action = "add"
+            else:
+                action = "remove" if quantity == 0 else "modify"
+            coalesced.append((action, stock, side, price, quantity))
+        return coalesced
+
+
+def display_depth(depth_book, stock):
+    """
+    Displays the top levels of a stock's depth snapshot in a readable format.
+    """
+    snapshot = depth_book.snapshot(stock)
+    print(f"Depth for {stock}:")
+    print(f"{'Bid Qty':<10}{'Bid':<12}{'Ask':<12}{'Ask Qty':<10}")
+    print("-" * 44)
+    for i in range(max(len(snapshot["bids"]), len(snapshot["asks"]))):
+        bid, bid_qty = snapshot["bids"][i] if i < len(snapshot["bids"]) else ("", "")
+        ask, ask_qty = snapshot["asks"][i] if i < len(snapshot["asks"]) else ("", "")
+        bid = f"{bid:.2f}" if bid != "" else ""
+        ask = f"{ask:.2f}" if ask != "" else ""
+        print(f"{bid_qty:<10}{bid:<12}{ask:<12}{ask_qty:<10}")
@@ -1,12 +1,22 @@
-from order import sort_order_book
-from trader import Trader
+from bisect import insort
 
-def match_orders(order_book, traders):
+from order import (sort_order_book, group_orders_by_stock, buy_priority, sell_priority, add_order_to_book,
+                   prune_order_book)
+
+
+def match_orders(order_book, risk_engine=None, on_fill=None, depth_book=None, reference_prices=None):
     """
     Matches buy and sell orders in the order book.
-    Orders are matched based on price priority (best price) and then time priority (FIFO).
+    Orders are matched per stock, based on price priority (best price) and then time priority (FIFO).
+    Market orders take priority and trade up to their protection price. IOC and market orders
+    cancel whatever is left after matching; FOK orders trade in full or not at all; iceberg
+    orders refill their visible slice from their hidden reserve at the back of their price level.
+    The engine only emits fills; cash and shares are moved once, by the clearing layer.
     :param order_book: Dictionary with 'buy' and 'sell' order lists.
-    :param traders: Dictionary of Trader objects, keyed by trader ID.
+    :param risk_engine: Optional RiskEngine whose reservations are released as orders fill.
+    :param on_fill: Optional callback invoked with each fill as it is produced (e.g. ClearingHouse.on_fill).
+    :param depth_book: Optional DepthBook whose price levels are reduced as orders fill.
+    :param reference_prices: Optional dictionary of stock -> price, used when two market orders meet.
     :return: List of executed trades (each trade is a dictionary with details of the match).
     """
     executed_trades = []
@@ -15,81 +25,258 @@ def match_orders(order_book, traders):
     sort_order_book(order_book, "buy")
     sort_order_book(order_book, "sell")
 
-    while order_book["buy"] and order_book["sell"]:
-        buy_order = order_book["buy"][0]
-        sell_order = order_book["sell"][0]
+    # A buy order may only ever match a sell order for the same stock
+    sells_by_stock = group_orders_by_stock(order_book["sell"])
+
+    for stock, buys in group_orders_by_stock(order_book["buy"]).items():
+        sells = sells_by_stock.get(stock)
+        if not sells:
+            continue
+        reference_price = reference_prices.get(stock) if reference_prices else None
+        match_stock(buys, sells, executed_trades, risk_engine, on_fill, depth_book, reference_price, set())
+
+    remove_inactive_orders(order_book, risk_engine)
+    return executed_trades
+
+
+def match_stock(buys, sells, executed_trades, risk_engine=None, on_fill=None, depth_book=None,
+                reference_price=None, fok_checked=None):
+    """
+    Matches one stock's buy and sell orders, both sorted by priority, appending fills to executed_trades.
+    A market order whose protection price does not cross the best limit order on the other
+    side can never trade and is cancelled; matching only stops when the two best limit orders
+    do not cross.
+    :param fok_checked: Set of the FOK orders already checked, by sequence number.
+    """
+    fok_checked = fok_checked if fok_checked is not None else set()
+    b = s = 0
+    while b < len(buys) and s < len(sells):
+        buy_order = buys[b]
+        sell_order = sells[s]
 
         # Check if the orders match (buy price >= sell price)
-        if buy_order.price >= sell_order.price:
-            # Determine the trade quantity
-            trade_quantity = min(buy_order.quantity, sell_order.quantity)
-            trade_price = sell_order.price  # Use the sell order price as the trade price
-
-            # Execute the trade
-            execute_trade(
-                traders[buy_order.trader_id],
-                traders[sell_order.trader_id],
-                buy_order.stock,
-                trade_quantity,
-                trade_price
-            )
-
-            # Record the trade
-            executed_trades.append({
-                "buyer": buy_order.trader_id,
-                "seller": sell_order.trader_id,
-                "stock": buy_order.stock,
-                "quantity": trade_quantity,
-                "price": trade_price
-            })
-
-            # Adjust the order quantities
-            buy_order.quantity -= trade_quantity
-            sell_order.quantity -= trade_quantity
-
-            # Remove fully filled orders
-            if buy_order.quantity == 0:
-                order_book["buy"].pop(0)
-            if sell_order.quantity == 0:
-                order_book["sell"].pop(0)
-        else:
-            # No match possible, exit loop
+        if buy_order.price < sell_order.price:
+            buy_is_market = buy_order.order_kind == "market"
+            sell_is_market = sell_order.order_kind == "market"
+            if not buy_is_market and not sell_is_market:
+                # The best limit prices do not cross, so nothing behind them does
+                break
+            if buy_is_market and sell_is_market:
+                # No market order crosses one on the other side, so each side's market orders
+                # can only trade with the other side's limit orders; after that the limits meet
+                buy_limits, sell_limits = first_limit_index(buys, b), first_limit_index(sells, s)
+                limit_buys, limit_sells = buys[buy_limits:], sells[sell_limits:]
+                match_stock(buys[b:buy_limits], limit_sells, executed_trades, risk_engine, on_fill, depth_book,
+                            reference_price, fok_checked)
+                match_stock(limit_buys, sells[s:sell_limits], executed_trades, risk_engine, on_fill, depth_book,
+                            reference_price, fok_checked)
+                match_stock([order for order in limit_buys if order.status == "open"],
+                            [order for order in limit_sells if order.status == "open"],
+                            executed_trades, risk_engine, on_fill, depth_book, reference_price, fok_checked)
+                return
+            # The other side's head is its best limit order; a market order that misses it misses them all
+            if buy_is_market:
+                kill_order(buy_order, risk_engine)
+                b += 1
+            else:
+                kill_order(sell_order, risk_engine)
+                s += 1
+            continue
+
+        # Fill-or-kill orders are checked once, when they first reach the top of their side
+        if buy_order.time_in_force == "FOK" and buy_order.sequence not in fok_checked:
+            fok_checked.add(buy_order.sequence)
+            if not can_fill_completely(buy_order, sells, s, buys, b, fok_checked):
+                kill_order(buy_order, risk_engine)
+                b += 1
+                continue
+        if sell_order.time_in_force == "FOK" and sell_order.sequence not in fok_checked:
+            fok_checked.add(sell_order.sequence)
+            if not can_fill_completely(sell_order, buys, b, sells, s, fok_checked):
+                kill_order(sell_order, risk_engine)
+                s += 1
+                continue
+
+        # Determine the trade quantity and price
+        trade_quantity = min(buy_order.quantity, sell_order.quantity)
+        trade_price = execution_price(buy_order, sell_order, reference_price)
+
+        # Record the fill
+        trade = make_fill(buy_order, sell_order, trade_quantity, trade_price)
+        executed_trades.append(trade)
+
+        if risk_engine is not None:
+            risk_engine.release(buy_order, trade_quantity)
+            risk_engine.release(sell_order, trade_quantity)
+        if depth_book is not None:
+            depth_book.remove_quantity(buy_order, trade_quantity)
+            depth_book.remove_quantity(sell_order, trade_quantity)
+        if on_fill is not None:
+            on_fill(trade)
+
+        # Adjust the order quantities
+        buy_order.quantity -= trade_quantity
+        sell_order.quantity -= trade_quantity
+
+        # Move past fully filled orders, refilling icebergs behind their price level
+        if buy_order.quantity == 0:
+            b = advance_past_filled(buys, b, buy_priority, depth_book)
+        if sell_order.quantity == 0:
+            s = advance_past_filled(sells, s, sell_priority, depth_book)
+
+
+def first_limit_index(orders, start):
+    """
+    Returns the index of the first limit order at or after `start`; market orders sort first.
+    """
+    index = start
+    while index < len(orders) and orders[index].order_kind == "market":
+        index += 1
+    return index
+
+
+def make_fill(buy_order, sell_order, quantity, price):
+    """
+    Builds the fill record for a trade between two orders.
+    """
+    return {
+        "buyer": buy_order.trader_id,
+        "seller": sell_order.trader_id,
+        "stock": buy_order.stock,
+        "quantity": quantity,
+        "price": price,
+        "buy_order_id": buy_order.order_id,
+        "sell_order_id": sell_order.order_id,
+        # The order that was resting first is the maker, the other side the taker
+        "maker": "buy" if buy_order.arrival < sell_order.arrival else "sell"
+    }
+
+
+def remove_inactive_orders(order_book, risk_engine=None):
+    """
+    Cancels whatever is left of IOC, FOK and market orders after matching,
+    then drops filled and cancelled orders from the book in a single pass.
+    """
+    for side in ("buy", "sell"):
+        for order in order_book[side]:
+            if order.status == "open" and not order.rests_in_book():
+                kill_order(order, risk_engine)
+
+    prune_order_book(order_book)
+
+
+def execution_price(buy_order, sell_order, reference_price=None):
+    """
+    Returns the price two crossing orders trade at.
+    A limit order trades at its own price against a market order; between two limit orders
+    the maker's (earlier) price applies. Two market orders trade at the reference price,
+    kept within both protection prices.
+    """
+    buy_is_market = buy_order.order_kind == "market"
+    sell_is_market = sell_order.order_kind == "market"
+    if buy_is_market and sell_is_market:
+        if reference_price is None:
+            return (buy_order.price + sell_order.price) / 2
+        return min(max(reference_price, sell_order.price), buy_order.price)
+    if buy_is_market:
+        return sell_order.price
+    if sell_is_market:
+        return buy_order.price
+    return buy_order.price if buy_order.arrival < sell_order.arrival else sell_order.price
+
+
+def crosses(order, other):
+    """
+    True if two orders on opposite sides may trade, judging by their limit or protection prices.
+    """
+    return other.price <= order.price if order.order_type == "buy" else other.price >= order.price
+
+
+def can_fill_completely(order, opposite_orders, start, own_orders=None, own_start=0, checked=()):
+    """
+    Checks whether the crossing liquidity on the other side covers the whole order.
+    Only liquidity that will really trade is counted: an opposite FOK order not checked yet may
+    still be killed, so it only counts if it can fill completely from what is left of this order
+    when they meet plus the other non-FOK orders on this side.
+    Stops scanning as soon as enough quantity is found.
+    :param own_orders: This order's side, with this order at own_start.
+    :param checked: FOK orders already checked (and so still live), by sequence number.
+    """
+    needed = order.remaining_quantity()
+    for other in opposite_orders[start:]:
+        if not crosses(order, other):
+            if other.order_kind == "market":
+                # Market orders sort first by their own protection price; limit orders behind may still cross
+                continue
             break
+        if other.time_in_force == "FOK" and other.sequence not in checked:
+            if own_orders is None or not fok_would_fill(other, needed, own_orders, own_start + 1):
+                continue
+        needed -= other.remaining_quantity()
+        if needed <= 0:
+            return True
+    return False
 
-    return executed_trades
+
+def fok_would_fill(order, available, orders, start):
+    """
+    Checks whether a FOK order would fill from `available` shares it meets first plus the
+    crossing non-FOK orders in orders[start:]. Other FOK orders are not counted, since they may be killed.
+    """
+    needed = order.remaining_quantity() - available
+    for other in orders[start:]:
+        if needed <= 0:
+            break
+        if not crosses(order, other):
+            if other.order_kind == "market":
+                continue
+            break
+        if other.time_in_force != "FOK":
+            needed -= other.remaining_quantity()
+    return needed <= 0
 
 
-def execute_trade(buyer, seller, stock, quantity, price):
+def kill_order(order, risk_engine=None):
     """
-    Executes a trade between a buyer and a seller.
-    Adjusts their cash and portfolio based on the trade details.
-    :param buyer: Trader object for the buyer.
-    :param seller: Trader object for the seller.
-    :param stock: Stock ticker symbol.
-    :param quantity: Number of shares traded.
-    :param price: Price per share for the trade.
-    :return: None
+    Cancels an order that may not rest in the book, releasing its remaining reservation.
+    """
+    order.status = "cancelled"
+    if risk_engine is not None:
+        risk_engine.release(order, order.remaining_quantity())
+
+
+def advance_past_filled(orders, index, priority, depth_book=None):
+    """
+    Handles an order whose visible quantity just reached zero, returning the next index to match.
+    An iceberg with hidden quantity left is refilled and moved behind the other orders at its price.
+    """
+    order = orders[index]
+    if order.hidden_quantity == 0:
+        order.status = "filled"
+        return index + 1
+
+    order.replenish()
+    if depth_book is not None:
+        depth_book.add_order(order)
+    del orders[index]
+    insort(orders, order, lo=index, key=priority)
+    return index
+
+
+def activate_stop_orders(stop_book, order_book, prices, depth_book=None):
+    """
+    Moves stop orders whose stop price has been reached into the order book.
+    Only the stops each price move crossed are visited.
+    :param prices: Dictionary of stock -> latest price.
+    :return: List of triggered orders.
     """
-    # Deduct cash from buyer
-    total_cost = quantity * price
-    if buyer.cash < total_cost:
-        print(f"Buyer {buyer.trader_id} does not have enough cash.")
-        return
-    buyer.cash -= total_cost
-
-    # Add stock to buyer's portfolio
-    buyer.portfolio[stock] = buyer.portfolio.get(stock, 0) + quantity
-
-    # Add cash to seller
-    seller.cash += total_cost
-
-    # Remove stock shares from seller's portfolio
-    if stock not in seller.portfolio or seller.portfolio[stock] < quantity:
-        print(f"Seller {seller.trader_id} does not have enough shares of {stock}.")
-        return
-    seller.portfolio[stock] -= quantity
-    if seller.portfolio[stock] == 0:
-        del seller.portfolio[stock]
+    triggered = []
+    for stock, price in prices.items():
+        for order in stop_book.trigger(stock, price):
+            order.trigger()
+            add_order_to_book(order, order_book, depth_book)
+            triggered.append(order)
+    return triggered
 
 
 def display_executed_trades(executed_trades):
@@ -0,0 +1,224 @@
+import html
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import deque
+from itertools import islice
+
+from utils import calculate_net_worth
+
+MONITOR_MODES = ("terminal", "html")
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+class LiveMonitor:
+    """
+    Live view of a running simulation.
+    Each step appends one small sample to a ring buffer: the time, trade count, resting order
+    count, and price and top of book for a fixed set of watched stocks. Net worth is only
+    recomputed for a fixed random sample of traders, so a step costs the same however many
+    traders there are. At most once per `interval` seconds the buffer is rendered, either
+    redrawn in the terminal or written to a self-refreshing HTML file.
+    """
+
+    def __init__(self, mode="terminal", interval=1.0, html_path="monitor.html", history=300,
+                 watch=5, sample_size=50, movers=5, seed=None):
+        """
+        Initializes a LiveMonitor object.
+        :param mode: 'terminal' or 'html'.
+        :param interval: Minimum seconds between two renders.
+        :param html_path: File the HTML view is written to.
+        :param history: Number of steps kept in the ring buffer.
+        :param watch: Number of stocks shown.
+        :param sample_size: Number of traders whose net worth is followed.
+        :param movers: Number of top net-worth movers shown.
+        :param seed: Seed for choosing the trader sample.
+        """
+        if mode not in MONITOR_MODES:
+            raise ValueError(f"Unknown monitor mode: {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.html_path = html_path
+        self.samples = deque(maxlen=history)
+        self.watch = watch
+        self.sample_size = sample_size
+        self.num_movers = movers
+        self.rng = random.Random(seed)
+
+        self.watched_stocks = None
+        self.sampled_traders = None
+        self.start_worth = {}
+        self.movers = []
+        self.renders = 0
+        self.last_render = None
+
+    def __repr__(self):
+        return f"LiveMonitor | Mode: {self.mode} | Samples: {len(self.samples)} | Renders: {self.renders}"
+
+    def record(self, step, trades, order_book, stock_prices, traders, depth_book=None):
+        """
+        Samples the state at the end of a step and renders if the interval has passed.
+        :param trades: Trades executed in this step.
+        """
+        if self.sampled_traders is None:
+            # Chosen once, so later steps never touch the full trader or stock set
+            self.watched_stocks = list(islice(stock_prices, self.watch))
+            self.sampled_traders = self.rng.sample(list(traders), min(self.sample_size, len(traders)))
+            self.start_worth = {t_id: calculate_net_worth(traders[t_id], stock_prices)
+                                for t_id in self.sampled_traders}
+
+        stocks = {}
+        for stock in self.watched_stocks:
+            bid, ask, levels = None, None, (0, 0)
+            if depth_book is not None:
+                bid, ask = depth_book.best_bid(stock), depth_book.best_ask(stock)
+                levels = (len(depth_book.levels["buy"].get(stock, ())), len(depth_book.levels["sell"].get(stock, ())))
+            stocks[stock] = (stock_prices[stock], bid, ask, levels)
+
+        changes = []
+        for t_id in self.sampled_traders:
+            worth = calculate_net_worth(traders[t_id], stock_prices)
+            changes.append((worth - self.start_worth[t_id], t_id, worth))
+        changes.sort(key=lambda change: abs(change[0]), reverse=True)
+        self.movers = changes[:self.num_movers]
+
+        self.samples.append({
+            "time": time.perf_counter(),
+            "step": step,
+            "trades": len(trades),
+            "resting_orders": len(order_book["orders"]),
+            "stocks": stocks,
+        })
+
+        now = self.samples[-1]["time"]
+        if self.last_render is None or now - self.last_render >= self.interval:
+            self.render()
+            self.last_render = now
+
+    def rates(self):
+        """
+        Returns (steps per second, trades per second) over the samples in the ring buffer.
+        """
+        if len(self.samples) < 2:
+            return 0.0, 0.0
+        first, last = self.samples[0], self.samples[-1]
+        elapsed = max(last["time"] - first["time"], 1e-9)
+        trades = sum(sample["trades"] for sample in islice(self.samples, 1, None))
+        return (len(self.samples) - 1) / elapsed, trades / elapsed
+
+    def price_history(self, stock):
+        return [sample["stocks"][stock][0] for sample in self.samples]
+
+    def render(self):
+        """
+        Draws the current view in the configured mode.
+        """
+        if not self.samples:
+            return
+        if self.mode == "terminal":
+            self.render_terminal()
+        else:
+            self.render_html()
+        self.renders += 1
+
+    def close(self):
+        """
+        Renders the final state, whatever the interval.
+        """
+        self.render()
+
+    def render_terminal(self):
+        last = self.samples[-1]
+        steps_per_second, trades_per_second = self.rates()
+        lines = [
+            f"Step {last['step']} | {steps_per_second:.1f} steps/s | {trades_per_second:.1f} trades/s | "
+            f"Trades this step: {last['trades']} | Resting orders: {last['resting_orders']}",
+            "",
+            f"{'Stock':<8}{'Price':<12}{'Bid':<12}{'Ask':<12}{'Levels':<10}History",
+            "-" * 80,
+        ]
+        for stock, (price, bid, ask, (bid_levels, ask_levels)) in last["stocks"].items():
+            lines.append(f"{stock:<8}{format_price(price):<12}{format_price(bid):<12}{format_price(ask):<12}"
+                         f"{f'{bid_levels}/{ask_levels}':<10}{sparkline(self.price_history(stock)[-24:])}")
+        lines += ["", f"Top movers (sample of {len(self.sampled_traders)} traders):"]
+        for change, t_id, worth in self.movers:
+            lines.append(f"  Trader {t_id}: ${worth:,.2f} ({change:+,.2f})")
+        # Clear the screen and redraw from the top left corner
+        sys.stdout.write("\033[H\033[2J" + "\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+    def render_html(self):
+        last = self.samples[-1]
+        steps_per_second, trades_per_second = self.rates()
+        rows = "".join(
+            f"<tr><td>{html.escape(str(stock))}</td><td>{format_price(price)}</td><td>{format_price(bid)}</td>"
+            f"<td>{format_price(ask)}</td><td>{bid_levels}/{ask_levels}</td>"
+            f"<td>{svg_sparkline(self.price_history(stock))}</td></tr>"
+            for stock, (price, bid, ask, (bid_levels, ask_levels)) in last["stocks"].items()
+        )
+        movers = "".join(f"<tr><td>{t_id}</td><td>${worth:,.2f}</td><td>{change:+,.2f}</td></tr>"
+                         for change, t_id, worth in self.movers)
+        trades = svg_sparkline([sample["trades"] for sample in self.samples], width=600)
+        page = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><meta http-equiv="refresh" content="{max(1, round(self.interval))}">
+<title>Simulation monitor - step {last['step']}</title>
+<style>body{{font-family:sans-serif}} td,th{{padding:2px 10px;text-align:left}}</style></head>
+<body>
+<h2>Step {last['step']}</h2>
+<p>{steps_per_second:.1f} steps/s | {trades_per_second:.1f} trades/s | Trades this step: {last['trades']} |
+Resting orders: {last['resting_orders']}</p>
+<h3>Trades per step</h3>{trades}
+<h3>Stocks</h3>
+<table><tr><th>Stock</th><th>Price</th><th>Bid</th><th>Ask</th><th>Levels</th><th>Price history</th></tr>{rows}</table>
+<h3>Top movers (sample of {len(self.sampled_traders)} traders)</h3>
+<table><tr><th>Trader</th><th>Net worth</th><th>Change</th></tr>{movers}</table>
+</body></html>
+"""
+        write_atomic(self.html_path, page)
+
+
+def format_price(price):
+    return "-" if price is None else f"${price:.2f}"
+
+
+def sparkline(values):
+    """
+    Draws values as one line of block characters.
+    """
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low) if high > low else 0
+    return "".join(SPARK_CHARS[int((value - low) * scale)] for value in values)
+
+
+def svg_sparkline(values, width=240, height=40):
+    """
+    Draws values as an inline SVG polyline.
+    """
+    if len(values) < 2:
+        return ""
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    step = width / (len(values) - 1)
+    points = " ".join(f"{i * step:.1f},{height - (value - low) / span * height:.1f}" for i, value in enumerate(values))
+    return (f'<svg width="{width}" height="{height}"><polyline fill="none" stroke="steelblue" '
+            f'stroke-width="1.5" points="{points}"/></svg>')
+
+
+def write_atomic(path, text):
+    """
+    Writes a file through a temporary file and a rename, so a browser never loads half a page.
+    """
+    file = tempfile.NamedTemporaryFile("w", dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-",
+                                       suffix=".html", delete=False, encoding="utf-8")
+    try:
+        with file:
+            file.write(text)
+        os.replace(file.name, path)
+    except BaseException:
+        os.unlink(file.name)
+        raise
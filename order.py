@@ -1,39 +1,129 @@
+import itertools
+from bisect import bisect_left, bisect_right, insort
+
+# Global arrival counter, used for time priority and to tell makers from takers
+_order_sequence = itertools.count()
+
+ORDER_KINDS = ("limit", "market")
+TIME_IN_FORCE = ("GTC", "GTD", "IOC", "FOK")
+
+
 class Order:
     """
     Represents a trade order.
+    Market orders carry a protection price (the worst price they may trade at), which is
+    also what the risk engine reserves against. Iceberg orders show `display_quantity` at a
+    time in `quantity` and keep the rest in `hidden_quantity`.
     """
 
-    def __init__(self, order_id, trader_id, order_type, stock, quantity, price):
+    def __init__(self, order_id, trader_id, order_type, stock, quantity, price, order_kind="limit",
+                 time_in_force="GTC", stop_price=None, display_quantity=None, expire_step=None):
         """
         Initializes an Order object.
+        :param order_kind: 'limit' or 'market'.
+        :param time_in_force: 'GTC', 'GTD' (until expire_step), 'IOC' or 'FOK'.
+        :param stop_price: If set, the order waits in the stop book until the price reaches it.
+        :param display_quantity: If set, the order is an iceberg showing this much at a time.
         """
         self.order_id = order_id
         self.trader_id = trader_id
         self.order_type = order_type  # 'buy' or 'sell'
         self.stock = stock
-        self.quantity = quantity
         self.price = price
+        self.order_kind = order_kind
+        self.time_in_force = time_in_force
+        self.stop_price = stop_price
+        self.display_quantity = display_quantity
+        self.expire_step = expire_step
+        self.status = "open"  # 'open', 'filled', 'cancelled' or 'expired'
+        self.sequence = next(_order_sequence)  # time priority
+        self.arrival = self.sequence  # when the order reached the book; decides maker vs taker
+
+        if display_quantity:
+            self.quantity = min(display_quantity, quantity)
+            self.hidden_quantity = quantity - self.quantity
+        else:
+            self.quantity = quantity
+            self.hidden_quantity = 0
 
     def __repr__(self):
         return (f"OrderID: {self.order_id} | Trader: {self.trader_id} | "
                 f"{self.order_type} {self.quantity} shares of {self.stock} @ ${self.price:.2f}")
 
+    def remaining_quantity(self):
+        """
+        Returns the unfilled quantity, including any hidden iceberg reserve.
+        """
+        return self.quantity + self.hidden_quantity
+
+    def rests_in_book(self):
+        """
+        True for orders that may rest (and be displayed) in the book after matching.
+        """
+        return self.order_kind == "limit" and self.time_in_force in ("GTC", "GTD")
+
+    def replenish(self):
+        """
+        Refills an iceberg's visible slice from its hidden reserve.
+        The refreshed slice loses time priority, but the order keeps its arrival (it is still the maker).
+        """
+        self.quantity = min(self.display_quantity, self.hidden_quantity)
+        self.hidden_quantity -= self.quantity
+        self.sequence = next(_order_sequence)
 
-def create_order(trader, order_id, order_type, stock, quantity, price):
+    def trigger(self):
+        """
+        Activates a stop order: it enters the book with fresh time priority.
+        """
+        self.stop_price = None
+        self.sequence = next(_order_sequence)
+        self.arrival = self.sequence
+
+
+def create_order(trader, order_id, order_type, stock, quantity, price, risk_engine=None, order_kind="limit",
+                 time_in_force="GTC", stop_price=None, display_quantity=None, expire_step=None):
     """
     Creates a new order if valid. Does NOT automatically add it to the order book.
+    Market orders are always immediate-or-cancel.
     """
-    if not validate_order(trader, order_type, stock, quantity, price):
+    if order_kind == "market" and time_in_force not in ("IOC", "FOK"):
+        time_in_force = "IOC"
+    if not validate_order_type(order_kind, time_in_force, stop_price, display_quantity, expire_step):
+        if risk_engine is not None:
+            risk_engine.reject("invalid")
+        raise ValueError("Invalid order: unsupported combination of order type and time in force.")
+    if not validate_order(trader, order_type, stock, quantity, price, risk_engine):
         raise ValueError("Invalid order: insufficient funds or stock.")
 
-    new_order = Order(order_id, trader.trader_id, order_type, stock, quantity, price)
+    new_order = Order(order_id, trader.trader_id, order_type, stock, quantity, price, order_kind,
+                      time_in_force, stop_price, display_quantity, expire_step)
     return new_order
 
 
-def validate_order(trader, order_type, stock, quantity, price):
+def validate_order_type(order_kind, time_in_force, stop_price, display_quantity, expire_step):
+    """
+    Validates the order type and time-in-force combination.
+    """
+    if order_kind not in ORDER_KINDS or time_in_force not in TIME_IN_FORCE:
+        return False
+    if (time_in_force == "GTD") != (expire_step is not None):
+        return False
+    if stop_price is not None and stop_price <= 0:
+        return False
+    if display_quantity is not None:
+        # Icebergs only make sense for orders that rest in the book
+        return display_quantity > 0 and order_kind == "limit" and time_in_force in ("GTC", "GTD")
+    return True
+
+
+def validate_order(trader, order_type, stock, quantity, price, risk_engine=None):
     """
     Validates whether the trader can place the order.
+    If a risk engine is given, cash and shares already committed to resting orders are excluded.
     """
+    if risk_engine is not None:
+        return risk_engine.check_order(trader, order_type, stock, quantity, price)
+
     if quantity <= 0 or price <= 0:
         return False
 
@@ -44,34 +134,111 @@ def validate_order(trader, order_type, stock, quantity, price):
     return False
 
 
-def add_order_to_book(order, order_book):
+def new_order_book():
+    """
+    Returns an empty order book: the 'buy' and 'sell' lists plus an 'orders' index of order_id -> order.
+    """
+    return {"buy": [], "sell": [], "orders": {}}
+
+
+def add_order_to_book(order, order_book, depth_book=None):
     """
-    Adds an order to the appropriate list in the order book.
+    Adds an order to the appropriate list in the order book, and to the depth book if given.
     """
     order_book[order.order_type].append(order)
+    order_book.setdefault("orders", {})[order.order_id] = order
+    if depth_book is not None:
+        depth_book.add_order(order)
 
 
-def cancel_order(order_id, order_book):
+def submit_order(order, order_book, stop_book=None, depth_book=None, expiry_index=None):
     """
-    Cancels an order from the order book.
+    Routes a new order: stop orders wait in the stop book, everything else goes to the order book.
+    GTD orders are also scheduled for bulk expiry.
     """
-    for o_type in ["buy", "sell"]:
-        for order in order_book[o_type]:
-            if order.order_id == order_id:
-                order_book[o_type].remove(order)
-                return True
-    return False
+    if order.stop_price is not None:
+        if stop_book is None:
+            raise ValueError("Stop orders need a stop book.")
+        stop_book.add(order)
+    else:
+        add_order_to_book(order, order_book, depth_book)
+    if expiry_index is not None and order.expire_step is not None:
+        expiry_index.setdefault(order.expire_step, []).append(order)
+
+
+def cancel_order(order_id, order_book, risk_engine=None, depth_book=None, stop_book=None):
+    """
+    Cancels an order from the order book (or stop book), releasing any risk reservation it held
+    and removing its quantity from the depth book.
+    The order is found through the book's index and only marked cancelled; it is dropped
+    from the book lists by the next prune_order_book, so a cancel never scans the book.
+    """
+    if stop_book is not None:
+        order = stop_book.remove(order_id)
+        if order is not None:
+            order.status = "cancelled"
+            if risk_engine is not None:
+                risk_engine.release(order, order.remaining_quantity())
+            return True
+
+    order = order_book.get("orders", {}).pop(order_id, None)
+    if order is None or order.status != "open":
+        return False
+    order.status = "cancelled"
+    if risk_engine is not None:
+        risk_engine.release(order, order.remaining_quantity())
+    if depth_book is not None:
+        depth_book.remove_quantity(order, order.quantity)
+    return True
+
+
+def prune_order_book(order_book):
+    """
+    Drops filled, cancelled and expired orders from the book lists and the index, in a single pass.
+    """
+    index = order_book.setdefault("orders", {})
+    for side in ("buy", "sell"):
+        remaining = []
+        for order in order_book[side]:
+            if order.status == "open":
+                remaining.append(order)
+            else:
+                index.pop(order.order_id, None)
+        order_book[side] = remaining
+
+
+def expire_orders(order_book, expiry_index, step, risk_engine=None, depth_book=None, stop_book=None):
+    """
+    Expires every GTD order whose expire_step has been reached, in bulk.
+    Only the expiring buckets are visited, and the book lists are filtered in one pass.
+    :param expiry_index: Dictionary of expire_step -> list of orders (filled by submit_order).
+    :return: List of expired orders.
+    """
+    expired = []
+    for expire_step in [s for s in expiry_index if s <= step]:
+        for order in expiry_index.pop(expire_step):
+            if order.status != "open":
+                continue
+            # A GTD order is either still waiting in the stop book or resting in the order book
+            in_stop_book = stop_book is not None and stop_book.remove(order.order_id) is not None
+            if not in_stop_book and depth_book is not None:
+                depth_book.remove_quantity(order, order.quantity)
+            order.status = "expired"
+            if risk_engine is not None:
+                risk_engine.release(order, order.remaining_quantity())
+            expired.append(order)
+
+    if expired:
+        prune_order_book(order_book)
+    return expired
 
 
 def get_order_by_id(order_id, order_book):
     """
-    Retrieves an order from the order book using its ID.
+    Retrieves an open order from the order book using its ID.
     """
-    for o_type in ["buy", "sell"]:
-        for order in order_book[o_type]:
-            if order.order_id == order_id:
-                return order
-    return None
+    order = order_book.get("orders", {}).get(order_id)
+    return order if order is not None and order.status == "open" else None
 
 
 def is_buy_order(order):
@@ -82,16 +249,96 @@ def is_sell_order(order):
     return order.order_type == "sell"
 
 
+def group_orders_by_stock(orders):
+    """
+    Groups a list of orders into a dictionary of stock -> list of orders, preserving order.
+    Orders that are no longer open (e.g. cancelled but not pruned yet) are left out.
+    """
+    grouped = {}
+    for order in orders:
+        if order.status == "open":
+            grouped.setdefault(order.stock, []).append(order)
+    return grouped
+
+
+def buy_priority(order):
+    """
+    Sort key for buy orders: market orders first, then highest price, then arrival.
+    """
+    return order.order_kind != "market", -order.price, order.sequence
+
+
+def sell_priority(order):
+    """
+    Sort key for sell orders: market orders first, then lowest price, then arrival.
+    """
+    return order.order_kind != "market", order.price, order.sequence
+
+
 def sort_order_book(order_book, order_type):
     """
     Sorts the order book for a specific order type ('buy' or 'sell').
-    Buy orders: Desc by price.
-    Sell orders: Asc by price.
+    Buy orders: Market first, then desc by price, then by arrival.
+    Sell orders: Market first, then asc by price, then by arrival.
     """
     if order_type == "buy":
-        order_book[order_type].sort(key=lambda o: (-o.price, o.order_id))
+        order_book[order_type].sort(key=buy_priority)
     elif order_type == "sell":
-        order_book[order_type].sort(key=lambda o: (o.price, o.order_id))
+        order_book[order_type].sort(key=sell_priority)
+
+
+class StopBook:
+    """
+    Trigger index for stop orders, kept sorted by stop price per stock and side.
+    A price move only visits the stops it crossed: buy stops trigger when the price
+    rises to their stop price, sell stops when it falls to theirs.
+    """
+
+    def __init__(self):
+        self._buy = {}    # stock -> sorted list of (stop_price, sequence, order_id)
+        self._sell = {}   # stock -> sorted list of (stop_price, sequence, order_id)
+        self.orders = {}  # order_id -> order
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __repr__(self):
+        return f"StopBook | Pending stops: {len(self.orders)}"
+
+    def add(self, order):
+        side = self._buy if order.order_type == "buy" else self._sell
+        insort(side.setdefault(order.stock, []), (order.stop_price, order.sequence, order.order_id))
+        self.orders[order.order_id] = order
+
+    def remove(self, order_id):
+        """
+        Removes a pending stop order. Returns it, or None if it is not in the stop book.
+        """
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+        side = self._buy if order.order_type == "buy" else self._sell
+        entries = side[order.stock]
+        del entries[bisect_left(entries, (order.stop_price, order.sequence, order.order_id))]
+        return order
+
+    def trigger(self, stock, price):
+        """
+        Removes and returns the stop orders for a stock that the given price has reached,
+        in stop-price order.
+        """
+        triggered = []
+        buys = self._buy.get(stock)
+        if buys:
+            cut = bisect_right(buys, (price, float("inf")))
+            triggered.extend(entry[2] for entry in buys[:cut])
+            del buys[:cut]
+        sells = self._sell.get(stock)
+        if sells:
+            cut = bisect_left(sells, (price,))
+            triggered.extend(entry[2] for entry in reversed(sells[cut:]))
+            del sells[cut:]
+        return [self.orders.pop(order_id) for order_id in triggered]
 
 
 def display_order_book(order_book):
@@ -1,5 +1,13 @@
 import csv
 import matplotlib.pyplot as plt
+import numpy as np
+
+from analytics import position_matrix
+from visualizations import show_or_save
+
+
+# Price per share used by generate_performance_metrics when no market prices are given
+DEFAULT_SHARE_PRICE = 100
 
 
 def generate_trade_report(trades, file_name="trade_report.csv"):
@@ -15,27 +23,33 @@ def generate_trade_report(trades, file_name="trade_report.csv"):
     :return: None
     """
     with open(file_name, mode="w", newline="") as file:
-        writer = csv.DictWriter(file, fieldnames=["buyer", "seller", "stock", "quantity", "price"])
+        writer = csv.DictWriter(file, fieldnames=["buyer", "seller", "stock", "quantity", "price"],
+                                extrasaction="ignore")
         writer.writeheader()
         writer.writerows(trades)
     print(f"Trade report saved as {file_name}")
 
 
-def generate_performance_metrics(traders):
+def generate_performance_metrics(traders, stock_prices=None):
     """
     Calculates and displays performance metrics for each trader, such as net worth and portfolio composition.
     :param traders: Dictionary of Trader objects, keyed by trader ID.
+    :param stock_prices: Dictionary of stock -> current price, used to value the holdings.
+                         Without it every share is valued at DEFAULT_SHARE_PRICE.
     :return: A dictionary of performance metrics for each trader.
     """
+    if stock_prices is None:
+        held = {stock for trader in traders.values() for stock in trader.portfolio}
+        stock_prices = {stock: DEFAULT_SHARE_PRICE for stock in held}
+    stocks = list(stock_prices)
+    trader_ids, cash, positions = position_matrix(traders, stocks)
+    portfolio_values = positions @ np.array([stock_prices[stock] for stock in stocks], dtype=float)
     metrics = {}
-    # Example simplistic metrics (replace with a real calculation if desired)
-    for trader_id, trader in traders.items():
-        # Suppose we just fix a hypothetical price of 100 for each stock:
-        portfolio_value = sum([quantity * 100 for _, quantity in trader.portfolio.items()])
+    for trader_id, cash_balance, portfolio_value in zip(trader_ids.tolist(), cash.tolist(), portfolio_values.tolist()):
         metrics[trader_id] = {
-            "cash_balance": trader.cash,
+            "cash_balance": cash_balance,
             "portfolio_value": portfolio_value,
-            "net_worth": trader.cash + portfolio_value,
+            "net_worth": cash_balance + portfolio_value,
         }
 
     print("Trader Performance Metrics:")
@@ -47,10 +61,11 @@ def generate_performance_metrics(traders):
     return metrics
 
 
-def visualize_trade_activity(trades):
+def visualize_trade_activity(trades, save_path=None):
     """
     Visualizes trading activity with bar plots showing the number of shares traded for each stock.
     :param trades: List of executed trades.
+    :param save_path: Optional file to save the chart to instead of showing it.
     :return: None
     """
     trade_counts = {}
@@ -69,7 +84,7 @@ def visualize_trade_activity(trades):
     plt.title("Trading Activity by Stock")
     plt.grid(axis="y", linestyle="--", alpha=0.7)
     plt.tight_layout()
-    plt.show()
+    show_or_save(save_path)
 
 
 def generate_fee_summary(total_fees_collected):
@@ -0,0 +1,170 @@
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+from main import run_simulation
+from scenario import config_hash
+
+CACHE_DIR = "result_cache"
+
+# Modules whose code decides what a run produces; editing any of them invalidates the cache
+SIMULATION_MODULES = ("main.py", "scenario.py", "trader.py", "order.py", "matching_engine.py", "auction.py",
+                      "clearing.py", "fees.py", "risk.py", "market_data.py", "trade_store.py", "utils.py")
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """
+    Returns a hash of the simulation source code, computed once per process.
+    """
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in SIMULATION_MODULES:
+        with open(os.path.join(directory, module), "rb") as file:
+            digest.update(module.encode())
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def cache_key(config):
+    """
+    Returns the cache key for a scenario: its settings (seed included) plus the code version.
+    """
+    return hashlib.sha256(f"{config_hash(config)}:{code_version()}".encode()).hexdigest()
+
+
+def run_outputs(results):
+    """
+    Returns the parts of run_simulation's results worth keeping: everything but the live objects.
+    """
+    return {key: value for key, value in results.items() if key != "state"}
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of simulation outputs.
+    Each entry is one pickle file named after its cache key. Entries are written to a
+    temporary file and renamed into place, so concurrent writers never leave a partial
+    entry. A hit refreshes the entry's modification time, and once the cache grows past
+    `max_bytes` the least recently used entries are removed.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=512 * 1024 * 1024):
+        """
+        Initializes a ResultCache object.
+        :param directory: Where entries are stored; created if missing.
+        :param max_bytes: Size cap for all entries together.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return f"ResultCache | Directory: {self.directory} | Hits: {self.hits} | Misses: {self.misses}"
+
+    def path(self, config):
+        return os.path.join(self.directory, f"{cache_key(config)}.pkl")
+
+    def get(self, config):
+        """
+        Returns the stored outputs for a scenario, or None.
+        A corrupt or unreadable entry counts as a miss and is removed, so the run is redone and stored again.
+        """
+        path = self.path(config)
+        try:
+            with open(path, "rb") as file:
+                outputs = pickle.load(file)
+            os.utime(path)
+        except FileNotFoundError:
+            # Not stored yet, or evicted by another process in the meantime
+            self.misses += 1
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Truncated file, or pickled against classes that no longer exist
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self.misses += 1
+            return None
+        self.hits += 1
+        return outputs
+
+    def put(self, config, outputs):
+        """
+        Stores a scenario's outputs atomically, then evicts old entries if over the size cap.
+        """
+        file = tempfile.NamedTemporaryFile(dir=self.directory, prefix=".tmp-", delete=False)
+        try:
+            with file:
+                pickle.dump(outputs, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(file.name, self.path(config))
+        except BaseException:
+            os.unlink(file.name)
+            raise
+        self.evict()
+
+    def entries(self):
+        """
+        Returns (modification time, size, path) for every stored entry.
+        """
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(".pkl"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_bytes.
+        :return: Number of entries removed.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+
+def run_cached(config, cache, market=None):
+    """
+    Returns a scenario's outputs from the cache, running and storing the simulation on a miss.
+    Unseeded scenarios are random by design and always run.
+    :param market: Optional shared starting market, see main.initialize_simulation.
+    :return: Outputs dictionary (run_simulation's results without the live state), with the
+             run's wall-clock 'seconds'.
+    """
+    seeded = config["seed"] is not None
+    if seeded:
+        outputs = cache.get(config)
+        if outputs is not None:
+            return outputs
+
+    start = time.perf_counter()
+    outputs = run_outputs(run_simulation(config, market=market, verbose=False))
+    outputs["seconds"] = time.perf_counter() - start
+    if seeded:
+        cache.put(config, outputs)
+    return outputs
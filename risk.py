@@ -0,0 +1,110 @@
+class RiskEngine:
+    """
+    Pre-trade risk layer.
+    Keeps the cash and shares each trader has already committed to resting orders,
+    so a new order is checked against what is actually still available.
+    All checks and updates are constant-time dictionary operations.
+    """
+
+    def __init__(self, fee_buffer=0.1):
+        """
+        Initializes a RiskEngine object.
+        :param fee_buffer: Extra percentage of notional reserved on buy orders to cover fees.
+        """
+        self.fee_buffer = fee_buffer
+        self.reserved_cash = {}    # trader_id -> cash committed to resting buy orders
+        self.reserved_shares = {}  # (trader_id, stock) -> shares committed to resting sell orders
+        self.rejected_orders = 0
+        self.rejections_by_reason = {}
+
+    def __repr__(self):
+        return (f"RiskEngine | Reserved cash: {len(self.reserved_cash)} traders | "
+                f"Reserved shares: {len(self.reserved_shares)} positions | "
+                f"Rejected: {self.rejected_orders}")
+
+    def buy_reservation(self, quantity, price):
+        """
+        Returns the cash held back for a buy of the given size, including the fee buffer.
+        """
+        return quantity * price * (1 + self.fee_buffer / 100)
+
+    def available_cash(self, trader):
+        """
+        Returns the trader's cash that is not committed to resting buy orders.
+        """
+        return trader.cash - self.reserved_cash.get(trader.trader_id, 0)
+
+    def available_shares(self, trader, stock):
+        """
+        Returns the trader's shares of a stock that are not committed to resting sell orders.
+        """
+        return trader.portfolio.get(stock, 0) - self.reserved_shares.get((trader.trader_id, stock), 0)
+
+    def check_order(self, trader, order_type, stock, quantity, price):
+        """
+        Validates an order against the trader's available (unreserved) cash or shares.
+        Rejections are counted by reason instead of being printed.
+        :return: True if the order may be placed, else False.
+        """
+        if quantity <= 0 or price <= 0 or order_type not in ("buy", "sell"):
+            return self.reject("invalid")
+
+        if order_type == "buy":
+            if self.available_cash(trader) < self.buy_reservation(quantity, price):
+                return self.reject("insufficient_cash")
+        elif self.available_shares(trader, stock) < quantity:
+            return self.reject("insufficient_shares")
+        return True
+
+    def reject(self, reason):
+        """
+        Records a rejected order. Always returns False so checks can `return self.reject(...)`.
+        """
+        self.rejected_orders += 1
+        self.rejections_by_reason[reason] = self.rejections_by_reason.get(reason, 0) + 1
+        return False
+
+    def reserve(self, order):
+        """
+        Commits the cash or shares backing a newly accepted order, including any hidden iceberg reserve.
+        """
+        quantity = order.remaining_quantity()
+        if order.order_type == "buy":
+            amount = self.buy_reservation(quantity, order.price)
+            self.reserved_cash[order.trader_id] = self.reserved_cash.get(order.trader_id, 0) + amount
+        else:
+            key = (order.trader_id, order.stock)
+            self.reserved_shares[key] = self.reserved_shares.get(key, 0) + quantity
+
+    def release(self, order, quantity):
+        """
+        Releases the reservation for `quantity` units of an order, after a fill or a cancel.
+        """
+        if quantity <= 0:
+            return
+        if order.order_type == "buy":
+            remaining = self.reserved_cash.get(order.trader_id, 0) - self.buy_reservation(quantity, order.price)
+            # Float drift can leave a tiny residue once every order is gone
+            if remaining <= 1e-9:
+                self.reserved_cash.pop(order.trader_id, None)
+            else:
+                self.reserved_cash[order.trader_id] = remaining
+        else:
+            key = (order.trader_id, order.stock)
+            remaining = self.reserved_shares.get(key, 0) - quantity
+            if remaining <= 0:
+                self.reserved_shares.pop(key, None)
+            else:
+                self.reserved_shares[key] = remaining
+
+
+def display_risk_summary(risk_engine):
+    """
+    Displays the number of rejected orders, grouped by reason.
+    """
+    print("Pre-Trade Risk Summary:")
+    print(f"{'Reason':<25}{'Rejected':<10}")
+    print("-" * 35)
+    for reason, count in risk_engine.rejections_by_reason.items():
+        print(f"{reason:<25}{count:<10}")
+    print(f"{'Total':<25}{risk_engine.rejected_orders:<10}")
@@ -0,0 +1,102 @@
+import copy
+import hashlib
+import itertools
+import json
+import os
+
+# Every setting a scenario may override; these are the values main.py always used
+DEFAULT_SCENARIO = {
+    "name": "default",
+    "seed": None,  # None draws a fresh market and order flow on every run
+    "stocks": ["AAPL", "GOOG", "MSFT", "TSLA"],
+    "base_price_range": [50, 70],
+    "num_traders": 5,
+    "cash_range": [20000, 30000],
+    "initial_shares_range": [5, 15],  # shares each trader starts with, in one random stock
+    "num_steps": 20,
+    "price_shock": 0.03,  # prices move by up to +/- this fraction each step
+    "sell_probability": 0.3,
+    "buy_quantity_range": [1, 5],
+    "price_spread": 2,  # limit prices are placed within +/- this much of the current price
+    "market_collar": 0.05,
+    "settlement_mode": "deferred",
+    "matching_mode": "continuous",
+    "allocation": "pro_rata",
+    "maker_rate": 0.08,
+    "taker_rate": 0.12,
+    "volume_tiers": [[5000, 0.06, 0.10], [20000, 0.04, 0.08]],
+}
+
+# Settings that decide the starting market (traders, holdings and prices)
+MARKET_KEYS = ("seed", "stocks", "base_price_range", "num_traders", "cash_range", "initial_shares_range")
+
+
+def make_scenario(overrides=None):
+    """
+    Returns a full scenario: the defaults updated with `overrides`.
+    Raises ValueError for settings that do not exist, so typos are not silently ignored.
+    """
+    overrides = overrides or {}
+    unknown = set(overrides) - set(DEFAULT_SCENARIO)
+    if unknown:
+        raise ValueError(f"Unknown scenario settings: {', '.join(sorted(unknown))}")
+    scenario = copy.deepcopy(DEFAULT_SCENARIO)
+    scenario.update(copy.deepcopy(overrides))
+    return scenario
+
+
+def load_scenario(path):
+    """
+    Loads a scenario JSON file; settings it leaves out keep their default values.
+    """
+    with open(path) as file:
+        return make_scenario(json.load(file))
+
+
+def load_sweep(path):
+    """
+    Loads a sweep JSON file with a 'base' scenario and a 'grid' of values to try:
+        {"name": ..., "base": "default.json" or {...}, "grid": {"setting": [value, ...], ...}}
+    A 'base' given as a file name is resolved relative to the sweep file.
+    """
+    with open(path) as file:
+        sweep = json.load(file)
+    base = sweep.get("base", {})
+    if isinstance(base, str):
+        base = load_scenario(os.path.join(os.path.dirname(path), base))
+    sweep["base"] = make_scenario(base)
+    make_scenario(sweep.get("grid", {}))  # validates the grid's setting names
+    return sweep
+
+
+def expand_grid(base, grid):
+    """
+    Expands a parameter grid into one scenario per combination of values.
+    :param base: Scenario the grid values are applied to.
+    :param grid: Dictionary of setting -> list of values.
+    :return: List of scenarios, in the order itertools.product yields them.
+    """
+    names = list(grid)
+    scenarios = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        overrides = dict(base)
+        overrides.update(zip(names, values))
+        scenarios.append(make_scenario(overrides))
+    return scenarios
+
+
+def config_hash(config, keys=None):
+    """
+    Returns a stable hash of a scenario (or of only `keys` of it).
+    The scenario name is left out, so renaming a scenario does not change its results.
+    """
+    keys = keys if keys is not None else [k for k in config if k != "name"]
+    payload = json.dumps({k: config[k] for k in keys}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def market_hash(config):
+    """
+    Returns a hash of only the settings that decide the starting market.
+    """
+    return config_hash(config, MARKET_KEYS)
@@ -0,0 +1,197 @@
+import time
+from multiprocessing import Process, Queue, shared_memory
+
+import numpy as np
+
+from main import run_simulation, initialize_market
+from scenario import make_scenario
+
+# Header fields, one int64 each, at the start of the block
+SEQUENCE, STEP, NUM_STOCKS, NUM_TRADERS = range(4)
+HEADER_FIELDS = 4
+
+
+class SharedMarketState:
+    """
+    Current stock prices, trader cash and positions, published in one shared memory block
+    so other processes can read them without pickling anything.
+    Layout: int64 header, float64 prices[stocks], float64 cash[traders], int64 positions[traders, stocks].
+    Writes are guarded by a seqlock: the sequence number is odd while a publish is in
+    progress, and a reader accepts what it read only if the sequence was even and did not
+    change in between. There is one writer; any number of readers never block it.
+    """
+
+    def __init__(self, shm, stocks, trader_ids, owner):
+        self.shm = shm
+        self.stocks = list(stocks)
+        self.trader_ids = list(trader_ids)
+        self.owner = owner
+        self.stock_index = {stock: i for i, stock in enumerate(self.stocks)}
+        self.trader_index = {trader_id: i for i, trader_id in enumerate(self.trader_ids)}
+
+        num_stocks, num_traders = len(self.stocks), len(self.trader_ids)
+        offset = HEADER_FIELDS * 8
+        self.header = np.ndarray(HEADER_FIELDS, dtype=np.int64, buffer=shm.buf)
+        self.prices = np.ndarray(num_stocks, dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += num_stocks * 8
+        self.cash = np.ndarray(num_traders, dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += num_traders * 8
+        self.positions = np.ndarray((num_traders, num_stocks), dtype=np.int64, buffer=shm.buf, offset=offset)
+
+    def __repr__(self):
+        return (f"SharedMarketState | Block: {self.shm.name} | Stocks: {len(self.stocks)} | "
+                f"Traders: {len(self.trader_ids)} | Step: {self.header[STEP]}")
+
+    @classmethod
+    def create(cls, stocks, trader_ids, name=None):
+        """
+        Allocates a new block for the given stocks and traders. The creating process is the writer.
+        """
+        num_stocks, num_traders = len(stocks), len(trader_ids)
+        size = HEADER_FIELDS * 8 + num_stocks * 8 + num_traders * 8 + num_traders * num_stocks * 8
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        state = cls(shm, stocks, trader_ids, owner=True)
+        state.header[:] = (0, -1, num_stocks, num_traders)
+        state.positions[:] = 0
+        return state
+
+    @classmethod
+    def attach(cls, layout):
+        """
+        Attaches a reader to an existing block.
+        :param layout: Dictionary returned by the writer's layout().
+        """
+        try:
+            # Only the writer may unlink the block, so readers must not track it (Python 3.13+)
+            shm = shared_memory.SharedMemory(name=layout["name"], track=False)
+        except TypeError:
+            # Older Pythons always track it; readers started by the writer share its tracker,
+            # which the writer's unlink keeps in order
+            shm = shared_memory.SharedMemory(name=layout["name"])
+        return cls(shm, layout["stocks"], layout["trader_ids"], owner=False)
+
+    def layout(self):
+        """
+        Returns what a reader needs to attach: the block name, stock order and trader order.
+        """
+        return {"name": self.shm.name, "stocks": self.stocks, "trader_ids": self.trader_ids}
+
+    def publish(self, step, stock_prices, traders):
+        """
+        Writes the current prices, cash and positions as one consistent update.
+        :param stock_prices: Dictionary of stock -> price.
+        :param traders: Dictionary of Trader objects, keyed by trader ID.
+        """
+        self.header[SEQUENCE] += 1  # odd: update in progress
+        self.prices[:] = [stock_prices[stock] for stock in self.stocks]
+        self.cash[:] = [traders[trader_id].cash for trader_id in self.trader_ids]
+        self.positions[:] = 0
+        for trader_id, row in self.trader_index.items():
+            for stock, quantity in traders[trader_id].portfolio.items():
+                self.positions[row, self.stock_index[stock]] = quantity
+        self.header[STEP] = step
+        self.header[SEQUENCE] += 1  # even: update complete
+
+    def begin_read(self):
+        """
+        Waits for any update in progress to finish and returns the sequence number to validate against.
+        Between begin_read and end_read the arrays can be read in place, without copying.
+        """
+        while True:
+            sequence = int(self.header[SEQUENCE])
+            if sequence % 2 == 0:
+                return sequence
+            time.sleep(0)
+
+    def end_read(self, sequence):
+        """
+        Returns True if nothing was published since begin_read, i.e. what was read is consistent.
+        """
+        return int(self.header[SEQUENCE]) == sequence
+
+    def snapshot(self):
+        """
+        Returns a consistent copy of the state, retrying if a publish overlapped the read.
+        :return: Tuple of (step, prices, cash, positions) arrays.
+        """
+        while True:
+            sequence = self.begin_read()
+            step = int(self.header[STEP])
+            prices, cash, positions = self.prices.copy(), self.cash.copy(), self.positions.copy()
+            if self.end_read(sequence):
+                return step, prices, cash, positions
+
+    def close(self):
+        """
+        Detaches from the block; the writer also frees it.
+        """
+        # Drop the numpy views first, the block cannot be closed while they export its buffer
+        self.header = self.prices = self.cash = self.positions = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def net_worth_reader(layout, num_steps, results):
+    """
+    Example analytics process: computes every trader's net worth from each published step,
+    reading the shared arrays in place, and checks that no share was lost or duplicated.
+    Puts (steps seen, retried reads, share totals stayed constant) on the results queue.
+    """
+    state = SharedMarketState.attach(layout)
+    steps_seen, retries = 0, 0
+    totals = None
+    consistent = True
+    last_step = -1
+    while last_step < num_steps - 1:
+        sequence = state.begin_read()
+        step = int(state.header[STEP])
+        if step == last_step:
+            time.sleep(0.001)
+            continue
+        net_worth = state.cash + state.positions @ state.prices
+        share_totals = state.positions.sum(axis=0)
+        if not state.end_read(sequence):
+            retries += 1
+            continue
+        if totals is None:
+            totals = share_totals
+        consistent = consistent and bool((share_totals == totals).all()) and bool(np.isfinite(net_worth).all())
+        steps_seen += 1
+        last_step = step
+    state.close()
+    results.put((steps_seen, retries, consistent))
+
+
+def run_with_readers(config=None, num_readers=2):
+    """
+    Runs a simulation that publishes its state every step while reader processes follow it.
+    :return: List of (steps seen, retried reads, consistent) tuples, one per reader.
+    """
+    config = config if config is not None else make_scenario({"seed": 1, "num_traders": 500, "num_steps": 50})
+    market = initialize_market(config)
+    state = SharedMarketState.create(list(market[0]), list(market[1]))
+    results = Queue()
+    # Daemons, so readers still waiting for steps never keep the parent alive
+    readers = [Process(target=net_worth_reader, args=(state.layout(), config["num_steps"], results), daemon=True)
+               for _ in range(num_readers)]
+    try:
+        for reader in readers:
+            reader.start()
+        run_simulation(config, market=market, verbose=False, shared_state=state)
+        outcomes = [results.get(timeout=60) for _ in readers]
+    finally:
+        # If the run failed the readers would wait for the remaining steps forever
+        for reader in readers:
+            if reader.is_alive():
+                reader.terminate()
+            if reader.pid is not None:
+                reader.join()
+        state.close()
+    return outcomes
+
+
+if __name__ == "__main__":
+    for i, (steps_seen, retries, consistent) in enumerate(run_with_readers()):
+        print(f"Reader {i + 1}: {steps_seen} steps read | {retries} retried reads | "
+              f"Share totals consistent: {consistent}")
@@ -0,0 +1,261 @@
+import argparse
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from main import initialize_simulation, place_order
+from matching_engine import match_orders
+from order import cancel_order, expire_orders
+from scenario import make_scenario
+from utils import calculate_net_worth
+
+PHASES = ("placement", "cancel", "expiry", "match", "settlement", "net_worth")
+
+# Baseline workload; each sweep varies one dimension and keeps the others here
+BASELINE = {"traders": 500, "symbols": 4, "steps": 5, "depth": 1000}
+
+# Sizes per dimension. 'full' reaches the sizes production runs use; 'quick' keeps CI fast
+SIZES = {
+    "quick": {
+        "traders": [100, 300, 1000, 3000, 10000],
+        "symbols": [4, 40, 400, 1000],
+        "depth": [1000, 3000, 10000, 30000],
+        "steps": [10, 20, 40, 80],
+    },
+    "full": {
+        "traders": [10, 100, 1000, 10000, 100000],
+        "symbols": [4, 40, 400, 1000],
+        "depth": [1000, 10000, 100000],
+        "steps": [10, 40, 160, 640],
+    },
+}
+
+# Highest growth exponent of each phase's per-step cost, per dimension: the expected complexity
+# plus a margin for timer noise and n log n sorting. Per-step cost should not depend on the
+# number of steps at all. A quadratic scan or a leak shows up a whole unit higher.
+EXPECTED_EXPONENTS = {
+    "traders": {"placement": 1.3, "cancel": 1.3, "expiry": 1.3, "match": 1.4, "settlement": 1.3,
+                "net_worth": 1.3, "memory": 1.3},
+    "symbols": {"placement": 0.5, "cancel": 0.5, "expiry": 0.5, "match": 0.6, "settlement": 0.5,
+                "net_worth": 0.5},
+    "depth": {"placement": 0.4, "cancel": 0.4, "expiry": 1.3, "match": 1.3, "settlement": 0.4,
+              "net_worth": 0.4, "memory": 1.3},
+    "steps": {"placement": 0.5, "cancel": 0.5, "expiry": 0.5, "match": 0.5, "settlement": 0.5,
+              "net_worth": 0.5},
+}
+
+
+def build_workload(traders, symbols, depth, seed=0):
+    """
+    Builds a simulation state with `traders` traders, `symbols` stocks and `depth` resting
+    orders placed far enough from the price that they never trade.
+    :return: Tuple of (simulation state, list of resting order IDs that may be cancelled).
+    """
+    config = make_scenario({
+        "seed": seed,
+        "stocks": [f"S{i:04d}" for i in range(symbols)],
+        "num_traders": traders,
+        "cash_range": [50000, 60000],
+        "initial_shares_range": [200, 400],
+    })
+    state = initialize_simulation(config)
+    rng = random.Random(seed)
+    stocks = list(state["stock_prices"])
+    deep_ids = [place_deep_order(state, stocks, rng) for _ in range(depth)]
+    return state, [order_id for order_id in deep_ids if order_id is not None]
+
+
+def place_deep_order(state, stocks, rng):
+    """
+    Places one resting order 40% away from the price, so it deepens the book without trading.
+    Returns its order ID, or None if the trader could not afford it.
+    """
+    traders = state["traders"]
+    trader = traders[rng.randint(1, len(traders))]
+    holdings = [stock for stock in sorted(trader.portfolio) if state["risk_engine"].available_shares(trader, stock) > 0]
+    if holdings and rng.random() < 0.5:
+        order_type, stock, factor = "sell", rng.choice(holdings), 1.4
+    else:
+        order_type, stock, factor = "buy", rng.choice(stocks), 0.6
+    order = place_order(trader, state["order_book"], state["risk_engine"], order_type, stock, 1,
+                        state["stock_prices"][stock] * factor, state["depth_book"], order_ids=state["order_ids"])
+    return order.order_id if order is not None else None
+
+
+def run_step(state, deep_ids, stocks, rng, cancels, step):
+    """
+    Runs one step of the workload and returns the seconds spent in each phase.
+    Every trader places an order near the price, good for 3 steps; `cancels` resting orders
+    are cancelled and replaced. The book depth therefore stays the same from step to step,
+    and any per-step cost that still grows with the step count is a leak.
+    """
+    traders = state["traders"]
+    order_book = state["order_book"]
+    risk_engine = state["risk_engine"]
+    depth_book = state["depth_book"]
+    stock_prices = state["stock_prices"]
+    expiry_index = state["expiry_index"]
+    timings = {}
+
+    start = time.perf_counter()
+    expire_orders(order_book, expiry_index, step, risk_engine, depth_book)
+    timings["expiry"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for trader in traders.values():
+        sellable = [st for st in sorted(trader.portfolio) if risk_engine.available_shares(trader, st) > 0]
+        if sellable and rng.random() < 0.5:
+            order_type, stock = "sell", rng.choice(sellable)
+        else:
+            order_type, stock = "buy", rng.choice(stocks)
+        price = max(stock_prices[stock] + rng.uniform(-2, 2), 1.0)
+        place_order(trader, order_book, risk_engine, order_type, stock, rng.randint(1, 5), price, depth_book,
+                    expiry_index=expiry_index, order_ids=state["order_ids"], time_in_force="GTD",
+                    expire_step=step + 3)
+    timings["placement"] = time.perf_counter() - start
+
+    victims = []
+    for _ in range(min(cancels, len(deep_ids))):
+        # Swap-remove a random resting order ID
+        i = rng.randrange(len(deep_ids))
+        deep_ids[i], deep_ids[-1] = deep_ids[-1], deep_ids[i]
+        victims.append(deep_ids.pop())
+    start = time.perf_counter()
+    for order_id in victims:
+        cancel_order(order_id, order_book, risk_engine, depth_book)
+    timings["cancel"] = time.perf_counter() - start
+    for _ in victims:
+        order_id = place_deep_order(state, stocks, rng)
+        if order_id is not None:
+            deep_ids.append(order_id)
+
+    start = time.perf_counter()
+    match_orders(order_book, risk_engine, on_fill=state["clearing_house"].on_fill, depth_book=depth_book,
+                 reference_prices=stock_prices)
+    timings["match"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    state["clearing_house"].end_of_step()
+    timings["settlement"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    {t_id: calculate_net_worth(trader, stock_prices) for t_id, trader in traders.items()}
+    timings["net_worth"] = time.perf_counter() - start
+
+    depth_book.drain_deltas()
+    return timings
+
+
+def measure(traders, symbols, steps, depth, seed=0, track_memory=False):
+    """
+    Runs the workload at one size.
+    :return: Dictionary with the median seconds per step of each phase and, with track_memory,
+             the peak traced memory in bytes.
+    """
+    if track_memory:
+        tracemalloc.start()
+    state, deep_ids = build_workload(traders, symbols, depth, seed)
+    rng = random.Random(seed + 1)
+    stocks = list(state["stock_prices"])
+    cancels = max(1, traders // 10)
+    step_timings = [run_step(state, deep_ids, stocks, rng, cancels, step) for step in range(steps)]
+
+    result = {}
+    for phase in PHASES:
+        result[phase] = statistics.median(t[phase] for t in step_timings)
+    if track_memory:
+        result["memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def growth_exponent(sizes, values):
+    """
+    Fits values ~ sizes ** k on a log-log scale and returns k.
+    """
+    values = np.maximum(np.asarray(values, dtype=float), 1e-9)
+    return float(np.polyfit(np.log(sizes), np.log(values), 1)[0])
+
+
+def sweep_dimension(dimension, sizes, seed=0, repeats=3):
+    """
+    Measures every size of one dimension with the other dimensions at BASELINE.
+    Each size is timed `repeats` times and the fastest run kept, which filters out noise from
+    other processes. Memory is measured in a separate short run, since tracing slows every
+    allocation down.
+    :return: List of (size, result) pairs.
+    """
+    results = []
+    for size in sizes:
+        params = dict(BASELINE, **{dimension: size})
+        runs = [measure(params["traders"], params["symbols"], params["steps"], params["depth"], seed)
+                for _ in range(repeats)]
+        result = {phase: min(run[phase] for run in runs) for phase in PHASES}
+        if "memory" in EXPECTED_EXPONENTS[dimension]:
+            memory_params = dict(params, steps=1)
+            result["memory"] = measure(memory_params["traders"], memory_params["symbols"], 1,
+                                       memory_params["depth"], seed, track_memory=True)["memory"]
+        results.append((size, result))
+        print(f"  {dimension}={size}: " + " | ".join(f"{phase} {result[phase] * 1000:.2f}ms" for phase in PHASES)
+              + (f" | peak {result['memory'] / 1e6:.1f}MB" if "memory" in result else ""), flush=True)
+    return results
+
+
+def check_exponents(dimension, results):
+    """
+    Fits each phase's growth exponent and compares it to EXPECTED_EXPONENTS.
+    :return: List of (phase, exponent, limit, passed).
+    """
+    sizes = [size for size, _ in results]
+    checks = []
+    for phase, limit in EXPECTED_EXPONENTS[dimension].items():
+        exponent = growth_exponent(sizes, [result[phase] for _, result in results])
+        checks.append((phase, exponent, limit, exponent <= limit))
+    return checks
+
+
+def display_checks(dimension, checks):
+    """
+    Displays the fitted exponents for one dimension in a readable format.
+    """
+    print(f"Growth exponents over {dimension}:")
+    print(f"{'Phase':<14}{'Exponent':<12}{'Limit':<10}{'Result':<8}")
+    print("-" * 44)
+    for phase, exponent, limit, passed in checks:
+        print(f"{phase:<14}{exponent:<12.2f}{limit:<10.2f}{'ok' if passed else 'FAIL':<8}")
+
+
+def run_stress_test(profile="quick", dimensions=None, seed=0):
+    """
+    Sweeps each dimension, fits growth exponents and reports any phase that grows too fast.
+    :return: List of (dimension, phase, exponent, limit) for every failed check.
+    """
+    failures = []
+    for dimension in dimensions or list(SIZES[profile]):
+        print(f"\nSweeping {dimension}:")
+        checks = check_exponents(dimension, sweep_dimension(dimension, SIZES[profile][dimension], seed))
+        display_checks(dimension, checks)
+        failures.extend((dimension, phase, exponent, limit)
+                        for phase, exponent, limit, passed in checks if not passed)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling stress test with complexity regression checks.")
+    parser.add_argument("--profile", choices=list(SIZES), default="quick")
+    parser.add_argument("--dimension", action="append", choices=list(BASELINE),
+                        help="Only sweep this dimension (may be repeated)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures = run_stress_test(args.profile, args.dimension, args.seed)
+    if failures:
+        print("\nComplexity regressions:")
+        for dimension, phase, exponent, limit in failures:
+            print(f"  {phase} grows as {dimension}^{exponent:.2f} (limit {limit:.2f})")
+        sys.exit(1)
+    print("\nAll phases within their expected complexity.")
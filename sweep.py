@@ -0,0 +1,144 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from main import initialize_market
+from result_cache import ResultCache, CACHE_DIR, run_cached
+from scenario import load_sweep, expand_grid, config_hash, market_hash
+
+RESULTS_DIR = "sweep_results"
+
+# Per-worker state, set once per worker by init_worker
+_worker_markets = {}
+_worker_cache = None
+
+
+def init_worker(markets, cache_dir, cache_max_bytes):
+    """
+    Runs once in each worker process when the pool starts.
+    The starting markets are sent to a worker once, not with every cell, and the
+    simulation modules stay imported between cells.
+    :param markets: Dictionary of market_hash -> (stock_prices, traders).
+    """
+    global _worker_markets, _worker_cache
+    _worker_markets = markets
+    _worker_cache = ResultCache(cache_dir, cache_max_bytes)
+
+
+def run_cell(config):
+    """
+    Runs one grid cell in a worker process, stores its outputs and returns its summary row.
+    """
+    outputs = run_cached(config, _worker_cache, market=_worker_markets.get(market_hash(config)))
+    return summarize_run(outputs)
+
+
+def summarize_run(outputs):
+    """
+    Reduces a run's outputs to one row of the sweep table.
+    """
+    trades = outputs["trades"]
+    net_worth_history = outputs["net_worth_history"]
+    num_traders = max(len(net_worth_history), 1)
+    return {
+        "config_hash": config_hash(outputs["config"]),
+        "trades": len(trades),
+        "volume": sum(t["quantity"] for t in trades),
+        "notional": sum(t["quantity"] * t["price"] for t in trades),
+        "fees": outputs["fees_collected"],
+        "rejected_orders": outputs["rejected_orders"],
+        "mean_net_worth": sum(h[-1] for h in net_worth_history.values()) / num_traders,
+        "mean_net_worth_change": sum(h[-1] - h[0] for h in net_worth_history.values()) / num_traders,
+        "seconds": outputs["seconds"],
+    }
+
+
+def run_sweep(sweep, max_workers=None, cache=None):
+    """
+    Runs every cell of a sweep's grid across a pool of worker processes.
+    Cells already in the result cache are not run again. Unseeded scenarios are random
+    by design, so they always run and are never cached.
+    :param sweep: Sweep loaded with scenario.load_sweep.
+    :param max_workers: Number of worker processes (default: one per CPU).
+    :param cache: ResultCache shared with the workers (default: one in CACHE_DIR).
+    :return: List of rows, one per cell in grid order, each starting with the grid settings.
+    """
+    cache = cache if cache is not None else ResultCache()
+    grid = sweep.get("grid", {})
+    configs = expand_grid(sweep["base"], grid)
+    rows = [None] * len(configs)
+    pending = []
+    for i, config in enumerate(configs):
+        outputs = cache.get(config) if config["seed"] is not None else None
+        if outputs is None:
+            pending.append(i)
+        else:
+            rows[i] = dict(summarize_run(outputs), cached=True)
+
+    # Seeded cells that only differ in trading settings start from the same market;
+    # build each one once here instead of once per cell
+    markets = {}
+    for i in pending:
+        config = configs[i]
+        if config["seed"] is not None and market_hash(config) not in markets:
+            markets[market_hash(config)] = initialize_market(config)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                 initargs=(markets, cache.directory, cache.max_bytes)) as pool:
+            futures = {pool.submit(run_cell, configs[i]): i for i in pending}
+            for future in as_completed(futures):
+                rows[futures[future]] = dict(future.result(), cached=False)
+
+    return [dict({name: config[name] for name in grid}, **row) for config, row in zip(configs, rows)]
+
+
+def write_sweep_results(rows, file_name):
+    """
+    Writes the sweep table to a CSV file.
+    """
+    if not rows:
+        return
+    with open(file_name, mode="w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Sweep results saved as {file_name}")
+
+
+def display_sweep_results(rows):
+    """
+    Displays the sweep table in a readable format.
+    """
+    if not rows:
+        print("Sweep Results: no cells")
+        return
+    columns = [c for c in rows[0] if c != "config_hash"]
+    cells = [[f"{row[c]:.2f}" if isinstance(row[c], float) else str(row[c]) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(cell[i]) for cell in cells)) + 2 for i, c in enumerate(columns)]
+
+    print("Sweep Results:")
+    print("".join(f"{c:<{w}}" for c, w in zip(columns, widths)))
+    print("-" * sum(widths))
+    for cell in cells:
+        print("".join(f"{value:<{w}}" for value, w in zip(cell, widths)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every cell of a scenario sweep.")
+    parser.add_argument("sweep", help="Sweep JSON file, e.g. scenarios/matching_sweep.json")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--results-dir", default=RESULTS_DIR, help="Where the results table is written")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Where run outputs are cached")
+    args = parser.parse_args()
+
+    sweep = load_sweep(args.sweep)
+    start = time.perf_counter()
+    rows = run_sweep(sweep, args.workers, ResultCache(args.cache_dir))
+    display_sweep_results(rows)
+    print(f"\n{len(rows)} cells ({sum(not row['cached'] for row in rows)} run) "
+          f"in {time.perf_counter() - start:.2f}s")
+    os.makedirs(args.results_dir, exist_ok=True)
+    write_sweep_results(rows, os.path.join(args.results_dir, f"{sweep.get('name', 'sweep')}.csv"))
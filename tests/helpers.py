@@ -0,0 +1,24 @@
+"""
+Order and book builders shared by the matching engine and auction tests.
+"""
+from order import Order, add_order_to_book, new_order_book
+
+
+def make_book(*orders):
+    order_book = new_order_book()
+    for order in orders:
+        add_order_to_book(order, order_book)
+    return order_book
+
+
+def limit(order_id, side, quantity, price, trader_id=None, **options):
+    return Order(order_id, trader_id or order_id, side, "AAPL", quantity, price, **options)
+
+
+def market(order_id, side, quantity, protection, **options):
+    return Order(order_id, order_id, side, "AAPL", quantity, protection, order_kind="market",
+                 time_in_force=options.pop("time_in_force", "IOC"), **options)
+
+
+def fills(trades):
+    return [(t["buy_order_id"], t["sell_order_id"], t["quantity"], t["price"]) for t in trades]
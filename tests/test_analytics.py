@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from analytics import compute_risk_report, concentration, historical_var, max_drawdown
+from main import run_simulation
+from reporting import generate_performance_metrics
+from result_cache import run_outputs
+from scenario import make_scenario
+from trader import Trader
+
+
+def naive_ledger(trades, final_balances, initial_prices):
+    """
+    Average-cost ledger replayed one trade at a time.
+    """
+    positions = {(t_id, stock): quantity for t_id, balance in final_balances.items()
+                 for stock, quantity in balance["portfolio"].items()}
+    for trade in trades:
+        positions[trade["buyer"], trade["stock"]] = positions.get((trade["buyer"], trade["stock"]), 0) - trade["quantity"]
+        positions[trade["seller"], trade["stock"]] = positions.get((trade["seller"], trade["stock"]), 0) + trade["quantity"]
+    cost = {key: quantity * initial_prices[key[1]] for key, quantity in positions.items()}
+    realized = {t_id: 0.0 for t_id in final_balances}
+    for trade in trades:
+        buy_key, sell_key = (trade["buyer"], trade["stock"]), (trade["seller"], trade["stock"])
+        positions[buy_key] = positions.get(buy_key, 0) + trade["quantity"]
+        cost[buy_key] = cost.get(buy_key, 0.0) + trade["quantity"] * trade["price"]
+        average = cost[sell_key] / positions[sell_key] if positions[sell_key] > 0 else 0.0
+        realized[trade["seller"]] += trade["quantity"] * (trade["price"] - average)
+        cost[sell_key] -= trade["quantity"] * average
+        positions[sell_key] -= trade["quantity"]
+    return realized
+
+
+@pytest.fixture(scope="module")
+def results():
+    return run_simulation(make_scenario({"seed": 7, "num_traders": 20, "num_steps": 15}), verbose=False)
+
+
+def test_report_from_cached_outputs_matches_the_live_run(results):
+    live = compute_risk_report(results)
+    cached = compute_risk_report(run_outputs(results))
+
+    assert list(cached["trader_ids"]) == list(live["trader_ids"])
+    for key in ("realized_pnl", "unrealized_pnl", "max_drawdown", "var", "hhi", "stock_exposure"):
+        np.testing.assert_allclose(cached[key], live[key])
+
+
+def test_report_without_the_needed_outputs_is_an_error(results):
+    outputs = run_outputs(results)
+    del outputs["final_balances"]
+    with pytest.raises(ValueError, match="final_balances"):
+        compute_risk_report(outputs)
+
+
+def test_realized_pnl_matches_a_trade_by_trade_ledger(results):
+    assert results["trades"]
+    report = compute_risk_report(run_outputs(results))
+    initial_prices = {stock: prices[0] for stock, prices in results["historical_prices"].items()}
+    expected = naive_ledger(results["trades"], results["final_balances"], initial_prices)
+
+    np.testing.assert_allclose(report["realized_pnl"], [expected[t_id] for t_id in report["trader_ids"]],
+                               atol=1e-6)
+
+
+def test_max_drawdown():
+    drawdowns = max_drawdown({1: [100, 120, 90, 130], 2: [100, 100, 100, 100], 3: [50, 40, 60, 45]})
+    np.testing.assert_allclose(drawdowns, [0.25, 0.0, 0.25])
+
+
+def test_historical_var_and_concentration():
+    positions = np.array([[10, 0], [0, 0], [5, 5]])
+    historical_prices = {"A": [100.0, 110.0, 99.0], "B": [50.0, 50.0, 50.0]}
+    var = historical_var(positions, historical_prices, ["A", "B"], confidence=0.5)
+    # The last price is 99, so the returns +10% and -10% become exposure changes of +99 and -99
+    np.testing.assert_allclose(var, [0.0, 0.0, 0.0])
+    var = historical_var(positions, historical_prices, ["A", "B"], confidence=1.0)
+    np.testing.assert_allclose(var, [99.0, 0.0, 49.5])
+
+    holdings = concentration(positions, np.array([99.0, 50.0]))
+    np.testing.assert_allclose(holdings["largest_weight"], [1.0, 0.0, 495 / 745])
+    np.testing.assert_allclose(holdings["top_holder_share"], [990 / 1485, 1.0])
+
+
+def test_performance_metrics_default_to_a_flat_share_price():
+    traders = {1: Trader(1, cash=500, portfolio={"AAPL": 3, "GOOG": 2}), 2: Trader(2, cash=100)}
+    metrics = generate_performance_metrics(traders)
+    assert metrics[1] == {"cash_balance": 500, "portfolio_value": 500, "net_worth": 1000}
+    assert metrics[2]["net_worth"] == 100
+
+    metrics = generate_performance_metrics(traders, {"AAPL": 10.0, "GOOG": 20.0})
+    assert metrics[1]["portfolio_value"] == 70.0
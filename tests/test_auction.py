@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from auction import allocate_volume, find_uncross_price, uncross_orders
+from order import new_order_book
+
+from helpers import fills, limit, make_book
+
+
+def test_everything_trades_at_one_price_that_maximizes_volume():
+    book = make_book(limit("B1", "buy", 10, 102), limit("B2", "buy", 5, 100),
+                     limit("S1", "sell", 8, 99), limit("S2", "sell", 10, 101))
+    trades = uncross_orders(book, reference_prices={"AAPL": 100})
+    assert fills(trades) == [("B1", "S1", 8, 101.0), ("B1", "S2", 2, 101.0)]
+    # What did not trade keeps resting
+    assert book["orders"].keys() == {"B2", "S2"} and book["orders"]["S2"].quantity == 8
+
+
+def test_ties_go_to_the_price_closest_to_the_reference():
+    buy_prices, buy_quantities = np.array([102.0, 100.0]), np.array([10, 5])
+    sell_prices, sell_quantities = np.array([99.0, 101.0]), np.array([8, 10])
+    assert find_uncross_price(buy_prices, buy_quantities, sell_prices, sell_quantities, 100) == (101.0, 10)
+    assert find_uncross_price(buy_prices, buy_quantities, sell_prices, sell_quantities, 110) == (102.0, 10)
+    assert find_uncross_price(np.array([98.0]), np.array([5]), sell_prices, sell_quantities) == (None, 0)
+
+
+@pytest.mark.parametrize("allocation, expected", [("pro_rata", [4, 2, 0]), ("time", [6, 0, 0])])
+def test_marginal_level_allocation(allocation, expected):
+    buys = [limit("B1", "buy", 6, 100), limit("B2", "buy", 3, 100), limit("B3", "buy", 4, 99)]
+    uncross_orders(make_book(*buys, limit("S1", "sell", 6, 100)), allocation=allocation)
+    assert [size - order.quantity for order, size in zip(buys, (6, 3, 4))] == expected
+
+
+def test_better_priced_levels_fill_before_the_marginal_level():
+    quantities, prices = np.array([2, 5, 5, 4]), np.array([105.0, 100.0, 100.0, 100.0])
+    allocations = allocate_volume(quantities, prices, np.zeros(4, dtype=bool), np.ones(4, dtype=bool), 9)
+    # 2 at 105 in full, then 7 over 5/5/4 pro rata with the leftover share to the earliest order
+    assert allocations.tolist() == [2, 3, 2, 2]
+
+
+def test_partly_filled_fok_is_killed_and_the_auction_recomputed():
+    fok = limit("B1", "buy", 10, 101, time_in_force="FOK")
+    book = make_book(fok, limit("B2", "buy", 4, 100), limit("S1", "sell", 6, 100))
+    trades = uncross_orders(book)
+    assert fok.status == "cancelled"
+    assert fills(trades) == [("B2", "S1", 4, 100.0)]
+
+
+def test_unknown_allocation_is_rejected():
+    with pytest.raises(ValueError):
+        uncross_orders(new_order_book(), allocation="random")
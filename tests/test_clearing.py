@@ -0,0 +1,111 @@
+import copy
+
+import pytest
+
+from clearing import ClearingHouse, batch_clearing_and_settlement, net_trades
+from fees import FeeSchedule
+from matching_engine import match_orders
+from order import Order, add_order_to_book, new_order_book
+from trader import Trader
+
+STEPS = [
+    [{"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 10, "price": 100.0, "maker": "sell"},
+     {"buyer": 3, "seller": 1, "stock": "AAPL", "quantity": 4, "price": 101.0, "maker": "buy"}],
+    [{"buyer": 2, "seller": 3, "stock": "GOOG", "quantity": 5, "price": 50.0, "maker": "buy"}],
+    [{"buyer": 1, "seller": 3, "stock": "GOOG", "quantity": 2, "price": 52.0, "maker": "sell"},
+     {"buyer": 3, "seller": 2, "stock": "AAPL", "quantity": 3, "price": 99.0, "maker": "sell"}],
+]
+
+
+def make_traders():
+    return {1: Trader(1, cash=5000, portfolio={}),
+            2: Trader(2, cash=5000, portfolio={"AAPL": 20}),
+            3: Trader(3, cash=5000, portfolio={"GOOG": 10})}
+
+
+def settle(mode, fee_schedule=None):
+    traders = make_traders()
+    clearing_house = ClearingHouse(traders, mode, fee_schedule)
+    for trades in STEPS:
+        for trade in copy.deepcopy(trades):
+            clearing_house.on_fill(trade)
+        clearing_house.end_of_step()
+    return traders, clearing_house
+
+
+@pytest.mark.parametrize("fee_schedule", [None, FeeSchedule(0.05, 0.2, volume_tiers=[(1000, 0.01, 0.02)])])
+def test_immediate_and_deferred_settlement_agree(fee_schedule):
+    immediate, immediate_house = settle("immediate", fee_schedule)
+    deferred, deferred_house = settle("deferred", fee_schedule)
+
+    for trader_id in immediate:
+        assert immediate[trader_id].cash == pytest.approx(deferred[trader_id].cash)
+        assert immediate[trader_id].portfolio == deferred[trader_id].portfolio
+    assert immediate_house.total_fees_collected == pytest.approx(deferred_house.total_fees_collected)
+    assert immediate_house.fee_ledger.by_trader() == pytest.approx(deferred_house.fee_ledger.by_trader())
+
+
+def test_fills_from_matching_are_settled_once():
+    traders = {1: Trader(1, cash=1000), 2: Trader(2, cash=0, portfolio={"AAPL": 5})}
+    clearing_house = ClearingHouse(traders, "deferred", FeeSchedule(0, 0))
+    book = new_order_book()
+    add_order_to_book(Order("S1", 2, "sell", "AAPL", 5, 90), book)
+    add_order_to_book(Order("B1", 1, "buy", "AAPL", 5, 100), book)
+
+    match_orders(book, on_fill=clearing_house.on_fill)
+    clearing_house.end_of_step()
+    clearing_house.end_of_step()
+
+    assert traders[1].cash == 550 and traders[1].portfolio == {"AAPL": 5}
+    assert traders[2].cash == 450 and traders[2].portfolio == {}
+
+
+def test_unknown_settlement_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ClearingHouse(make_traders(), "sometime")
+
+
+def test_net_trades_collapses_deltas_per_trader_and_stock():
+    net_positions, gross_notional = net_trades(STEPS[0] + STEPS[2])
+    assert net_positions[1, "AAPL"] == [-1000 + 404, 6]
+    assert net_positions[3, "AAPL"] == [-404 - 297, 7]
+    assert net_positions[2, "AAPL"] == [1000 + 297, -13]
+    assert gross_notional == {1: 1000 + 404 + 104, 2: 1000 + 297, 3: 404 + 104 + 297}
+
+
+def test_netting_settles_a_sale_of_shares_bought_in_the_same_batch():
+    traders = {1: Trader(1, cash=1000), 2: Trader(2, cash=0, portfolio={"AAPL": 5}), 3: Trader(3, cash=1000)}
+    # Trader 1 sells before the buy that funds it; only the net position has to be covered
+    trades = [{"buyer": 3, "seller": 1, "stock": "AAPL", "quantity": 5, "price": 110.0},
+              {"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 5, "price": 100.0}]
+    fees = batch_clearing_and_settlement(trades, traders, fee_percentage=0)
+
+    assert fees == 0
+    assert traders[1].cash == 1050 and traders[1].portfolio == {}
+    assert traders[2].portfolio == {} and traders[3].portfolio == {"AAPL": 5}
+
+
+def test_batch_settles_all_or_nothing():
+    traders = make_traders()
+    trades = [{"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 10, "price": 100.0},
+              {"buyer": 2, "seller": 3, "stock": "GOOG", "quantity": 11, "price": 50.0}]
+    with pytest.raises(ValueError):
+        batch_clearing_and_settlement(trades, traders)
+
+    untouched = make_traders()
+    for trader_id, trader in traders.items():
+        assert (trader.cash, trader.portfolio) == (untouched[trader_id].cash, untouched[trader_id].portfolio)
+
+
+def test_failed_batch_is_set_aside_and_the_next_one_settles():
+    traders = make_traders()
+    clearing_house = ClearingHouse(traders, "deferred", FeeSchedule(0, 0))
+    clearing_house.on_fill({"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 60, "price": 100.0, "maker": "sell"})
+    with pytest.raises(ValueError):
+        clearing_house.end_of_step()
+    assert clearing_house.pending_trades == [] and len(clearing_house.failed_batches) == 1
+    assert clearing_house.rolling_volume.get(1) == 0
+
+    clearing_house.on_fill({"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 5, "price": 100.0, "maker": "sell"})
+    clearing_house.end_of_step()
+    assert traders[1].portfolio == {"AAPL": 5} and traders[2].cash == 5500
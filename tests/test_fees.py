@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from fees import FeeLedger, FeeSchedule, RollingVolume, compute_fill_fees, compute_single_fill_fees
+
+
+def make_schedule():
+    return FeeSchedule(maker_rate=0.1, taker_rate=0.2, volume_tiers=[(20000, 0.02, 0.06), (5000, 0.05, 0.1)],
+                       symbol_overrides={"TSLA": (0.0, 0.3)})
+
+
+@pytest.mark.parametrize("volume, maker, taker", [
+    (0, 0.1, 0.2),
+    (4999.99, 0.1, 0.2),
+    (5000, 0.05, 0.1),
+    (19999.99, 0.05, 0.1),
+    (20000, 0.02, 0.06),
+    (10 ** 9, 0.02, 0.06),
+])
+def test_tier_boundaries(volume, maker, taker):
+    schedule = make_schedule()
+    assert schedule.rate(volume, "AAPL", True) == maker
+    assert schedule.rate(volume, "AAPL", False) == taker
+    np.testing.assert_array_equal(schedule.rates(np.array([volume, volume]), ["AAPL", "AAPL"],
+                                                 np.array([True, False])), [maker, taker])
+
+
+def test_symbol_overrides_replace_tiered_rates():
+    schedule = make_schedule()
+    assert schedule.rate(50000, "TSLA", True) == 0.0
+    assert schedule.rate(0, "TSLA", False) == 0.3
+    np.testing.assert_array_equal(schedule.rates(np.array([50000, 0, 0]), ["TSLA", "TSLA", "GOOG"],
+                                                 np.array([True, False, True])), [0.0, 0.3, 0.1])
+    assert schedule.max_rate() == 0.3
+
+
+def test_rolling_volume_expires_old_steps():
+    volume = RollingVolume(window=2)
+    volume.add(1, 100)
+    volume.add(1, 50)
+    volume.advance()
+    volume.add(1, 10)
+    assert volume.get(1) == 160
+    volume.advance()
+    assert volume.get(1) == 10
+    volume.advance()
+    assert volume.get(1) == 0 and volume.get(2) == 0
+
+
+def test_bulk_fees_match_per_fill_fees():
+    schedule = make_schedule()
+    volume = RollingVolume()
+    volume.add(1, 6000)
+    volume.add(2, 25000)
+    trades = [{"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 10, "price": 100.0, "maker": "buy"},
+              {"buyer": 2, "seller": 3, "stock": "TSLA", "quantity": 3, "price": 200.0, "maker": "sell"},
+              {"buyer": 3, "seller": 1, "stock": "GOOG", "quantity": 7, "price": 50.0, "maker": "buy"}]
+
+    buyer_fees, seller_fees = compute_fill_fees(trades, schedule, volume)
+    expected = [compute_single_fill_fees(trade, schedule, volume) for trade in trades]
+    np.testing.assert_allclose(buyer_fees, [fees[0] for fees in expected])
+    np.testing.assert_allclose(seller_fees, [fees[1] for fees in expected])
+    # Trader 1 is a tier-1 maker on the first fill, trader 2 a top-tier taker
+    assert expected[0] == pytest.approx((0.5, 0.6))
+
+
+def test_fee_ledger_totals():
+    ledger = FeeLedger()
+    ledger.record(1, "AAPL", 1.5)
+    ledger.record(1, "GOOG", 0.5)
+    ledger.record(2, "AAPL", 2.0)
+    ledger.record(1, "AAPL", 1.0)
+    assert ledger.fees[1, "AAPL"] == 2.5
+    assert ledger.total() == 5.0
+    assert ledger.by_trader() == {1: 3.0, 2: 2.0}
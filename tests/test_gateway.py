@@ -0,0 +1,104 @@
+import pytest
+
+from clearing import ClearingHouse
+from fees import FeeSchedule
+from gateway import ClientSession, MarketGateway
+from order import new_order_book
+from risk import RiskEngine
+from trader import Trader
+
+
+class FakeWriter:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_gateway(traders=None, risk_engine=None, fee_schedule=None):
+    if traders is None:
+        traders = {1: Trader(1, cash=10000, portfolio={"AAPL": 50}), 2: Trader(2, cash=10000, portfolio={"AAPL": 50})}
+    gateway = MarketGateway(traders, new_order_book(), risk_engine or RiskEngine(),
+                            ClearingHouse(traders, fee_schedule=fee_schedule), stocks=["AAPL"])
+    return gateway
+
+
+def connect(gateway, trader_id):
+    session = ClientSession(len(gateway.sessions) + 1, FakeWriter(), 100, 100)
+    gateway.sessions[session.session_id] = session
+    gateway.handle_message(session, f"LOGIN {trader_id}".encode())
+    return session
+
+
+def sent(session):
+    lines = []
+    while not session.outbound.empty():
+        lines.append(session.outbound.get_nowait().decode().split())
+    return lines
+
+
+def test_order_for_unknown_symbol_is_rejected_without_reserving():
+    gateway = make_gateway()
+    session = connect(gateway, 1)
+    gateway.handle_message(session, b"NEW r1 buy NOPE 5 10.0")
+    assert sent(session)[-1] == ["REJ", "r1", "bad_order"]
+    assert gateway.risk_engine.reserved_cash == {}
+    assert gateway.order_book["orders"] == {}
+
+
+def test_closing_a_session_cancels_its_orders_and_releases_reservations():
+    gateway = make_gateway()
+    session = connect(gateway, 1)
+    other = connect(gateway, 2)
+    gateway.handle_message(session, b"NEW r1 buy AAPL 5 10.0")
+    gateway.handle_message(session, b"NEW r2 sell AAPL 5 20.0")
+    gateway.handle_message(other, b"NEW r3 sell AAPL 5 30.0")
+    assert len(gateway.live_orders) == 3
+
+    gateway.close_session(session)
+    assert [order.trader_id for order, _ in gateway.live_orders.values()] == [2]
+    assert 1 not in gateway.risk_engine.reserved_cash
+    assert (1, "AAPL") not in gateway.risk_engine.reserved_shares
+    gateway.process_tick()
+    assert [order.trader_id for order in gateway.order_book["sell"]] == [2]
+
+
+def test_orders_cross_and_fills_are_streamed_to_both_sides():
+    gateway = make_gateway()
+    buyer, seller = connect(gateway, 1), connect(gateway, 2)
+    gateway.handle_message(seller, b"NEW s1 sell AAPL 5 10.0")
+    gateway.handle_message(buyer, b"NEW b1 buy AAPL 5 10.0")
+    gateway.process_tick()
+    assert ["FILL", "2", "AAPL", "buy", "5", "10.0000"] in sent(buyer)
+    assert ["FILL", "1", "AAPL", "sell", "5", "10.0000"] in sent(seller)
+    assert gateway.live_orders == {}
+    assert gateway.traders[1].portfolio["AAPL"] == 55
+
+
+def test_fee_buffer_below_the_fee_schedule_is_rejected():
+    with pytest.raises(ValueError):
+        make_gateway(risk_engine=RiskEngine(fee_buffer=0.1), fee_schedule=FeeSchedule(0.5, 0.5))
+
+
+def test_fills_that_fail_to_settle_are_set_aside_and_later_fills_settle(caplog):
+    traders = {1: Trader(1, cash=1001), 2: Trader(2, cash=0, portfolio={"AAPL": 50}), 3: Trader(3, cash=5000)}
+    gateway = make_gateway(traders, RiskEngine(fee_buffer=0.5), FeeSchedule(0.5, 0.5))
+    # A buffer lowered after startup lets through a buy whose fees cannot be paid
+    gateway.risk_engine.fee_buffer = 0.1
+    short, seller, buyer = connect(gateway, 1), connect(gateway, 2), connect(gateway, 3)
+
+    gateway.handle_message(seller, b"NEW s1 sell AAPL 20 100.0")
+    gateway.handle_message(short, b"NEW b1 buy AAPL 10 100.0")
+    gateway.process_tick()
+    assert ["REJ", "2", "settlement"] in sent(short)
+    assert ["REJ", "1", "settlement"] in sent(seller)
+    assert gateway.failed_fills == 1 and "failed to settle" in caplog.text
+    assert traders[1].cash == 1001 and traders[2].portfolio == {"AAPL": 50}
+
+    gateway.handle_message(buyer, b"NEW b2 buy AAPL 10 100.0")
+    gateway.process_tick()
+    assert ["FILL", "3", "AAPL", "buy", "10", "100.0000"] in sent(buyer)
+    assert traders[3].portfolio == {"AAPL": 10} and traders[2].portfolio == {"AAPL": 40}
+    assert gateway.clearing_house.pending_trades == []
+    assert len(gateway.clearing_house.failed_batches) == 1
@@ -0,0 +1,45 @@
+import utils
+from main import initialize_simulation, place_order, run_simulation
+from order import cancel_order
+from scenario import make_scenario
+
+
+def make_state():
+    return initialize_simulation(make_scenario({"seed": 4, "num_traders": 3, "stocks": ["AAPL"],
+                                                "initial_shares_range": [50, 50]}))
+
+
+def place(state, order_type, price, order_ids=True, **order_options):
+    trader = next(t for t in state["traders"].values() if order_type == "buy" or t.portfolio)
+    return place_order(trader, state["order_book"], state["risk_engine"], order_type, "AAPL", 1, price,
+                       state["depth_book"], state["stop_book"], state["expiry_index"],
+                       state["order_ids"] if order_ids else None, **order_options)
+
+
+def test_order_ids_are_never_reused():
+    state = make_state()
+    stop = place(state, "sell", 10.0, stop_price=5.0)
+    resting = place(state, "buy", 10.0)
+    cancel_order(resting.order_id, state["order_book"], state["risk_engine"], state["depth_book"], state["stop_book"])
+
+    ids = [place(state, "buy", 10.0).order_id for _ in range(20)]
+    assert len(set(ids + [stop.order_id, resting.order_id])) == 22
+    assert state["stop_book"].orders[stop.order_id] is stop
+
+
+def test_random_ids_avoid_pending_stop_orders(monkeypatch):
+    state = make_state()
+    stop = place(state, "sell", 10.0, order_ids=False, stop_price=5.0)
+    draws = iter([list(stop.order_id), list("NEWORDER")])
+    monkeypatch.setattr(utils.random, "choices", lambda *args, **kwargs: next(draws))
+
+    assert place(state, "buy", 10.0, order_ids=False).order_id == "NEWORDER"
+
+
+def test_settlement_mode_does_not_change_the_order_flow():
+    # Immediate settlement adds portfolio entries in a different order than deferred settlement
+    results = [run_simulation(make_scenario({"seed": 6, "num_traders": 20, "num_steps": 30, "sell_probability": 0.6,
+                                             "settlement_mode": mode}), verbose=False)
+               for mode in ("immediate", "deferred")]
+    immediate, deferred = (list(result["trades"]) for result in results)
+    assert immediate and immediate == deferred
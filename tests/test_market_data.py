@@ -0,0 +1,84 @@
+from market_data import HEAP_SLACK, DepthBook
+from matching_engine import match_orders
+from order import Order, add_order_to_book, cancel_order, new_order_book
+
+
+def order(order_id, side, quantity, price, **options):
+    return Order(order_id, 1, side, "AAPL", quantity, price, **options)
+
+
+def test_levels_aggregate_and_track_the_best_prices():
+    depth_book = DepthBook()
+    for o in (order("B1", "buy", 5, 99), order("B2", "buy", 3, 99), order("B3", "buy", 2, 98),
+              order("S1", "sell", 4, 101), order("S2", "sell", 1, 103)):
+        depth_book.add_order(o)
+
+    assert depth_book.top_of_book("AAPL") == (99, 101, 8, 4)
+    depth_book.update_level("AAPL", "buy", 99, -8)
+    depth_book.update_level("AAPL", "sell", 101, -4)
+    assert depth_book.top_of_book("AAPL") == (98, 103, 2, 1)
+    depth_book.update_level("AAPL", "buy", 98, -2)
+    assert depth_book.best_bid("AAPL") is None
+
+
+def test_orders_that_never_rest_are_not_displayed():
+    depth_book = DepthBook()
+    depth_book.add_order(order("B1", "buy", 5, 99, time_in_force="IOC"))
+    depth_book.add_order(order("B2", "buy", 5, 99, order_kind="market", time_in_force="IOC"))
+    assert depth_book.levels["buy"] == {} and depth_book.deltas == []
+
+
+def test_drain_deltas_coalesces_per_level():
+    depth_book = DepthBook()
+    depth_book.update_level("AAPL", "buy", 99, 5)
+    depth_book.update_level("AAPL", "buy", 99, 3)
+    depth_book.update_level("AAPL", "sell", 101, 4)
+    depth_book.update_level("AAPL", "sell", 101, -4)
+    assert depth_book.drain_deltas() == [("add", "AAPL", "buy", 99, 8)]
+
+    depth_book.update_level("AAPL", "buy", 99, -2)
+    depth_book.update_level("AAPL", "buy", 98, 1)
+    depth_book.update_level("AAPL", "buy", 99, -6)
+    assert sorted(depth_book.drain_deltas()) == [("add", "AAPL", "buy", 98, 1), ("remove", "AAPL", "buy", 99, 0)]
+    assert depth_book.drain_deltas() == []
+
+
+def test_snapshots_are_cached_until_the_stock_changes():
+    depth_book = DepthBook(depth=2)
+    for price in (97, 98, 99):
+        depth_book.update_level("AAPL", "buy", price, 1)
+    depth_book.update_level("GOOG", "sell", 50, 1)
+
+    snapshot = depth_book.snapshot("AAPL")
+    assert snapshot == {"bids": [(99, 1), (98, 1)], "asks": []}
+    depth_book.update_level("GOOG", "sell", 51, 1)
+    assert depth_book.snapshot("AAPL") is snapshot
+
+    depth_book.update_level("AAPL", "sell", 100, 2)
+    assert depth_book.snapshot("AAPL") == {"bids": [(99, 1), (98, 1)], "asks": [(100, 2)]}
+
+
+def test_depth_follows_fills_and_cancels():
+    depth_book = DepthBook()
+    book = new_order_book()
+    for o in (order("S1", "sell", 5, 101), order("S2", "sell", 5, 102), order("B1", "buy", 3, 100)):
+        add_order_to_book(o, book, depth_book)
+    add_order_to_book(order("B2", "buy", 7, 101), book, depth_book)
+
+    match_orders(book, depth_book=depth_book)
+    assert depth_book.top_of_book("AAPL") == (101, 102, 2, 5)
+    cancel_order("B2", book, depth_book=depth_book)
+    assert depth_book.top_of_book("AAPL") == (100, 102, 3, 5)
+
+
+def test_heap_stays_bounded_when_a_level_below_the_best_keeps_refilling():
+    depth_book = DepthBook(record_deltas=False)
+    depth_book.update_level("AAPL", "buy", 100, 5)
+    for _ in range(10000):
+        depth_book.update_level("AAPL", "buy", 99, 1)
+        depth_book.update_level("AAPL", "buy", 99, -1)
+
+    assert len(depth_book._heaps["AAPL", "buy"]) <= 2 * 2 + HEAP_SLACK
+    assert depth_book.best_bid("AAPL") == 100
+    depth_book.update_level("AAPL", "buy", 100, -5)
+    assert depth_book.best_bid("AAPL") is None
@@ -0,0 +1,107 @@
+from matching_engine import match_orders, activate_stop_orders
+from order import StopBook, add_order_to_book
+
+from helpers import fills, limit, make_book, market
+
+
+def test_limit_orders_match_at_maker_price():
+    book = make_book(limit("S1", "sell", 5, 49), limit("B1", "buy", 5, 50))
+    assert fills(match_orders(book)) == [("B1", "S1", 5, 49)]
+    assert book["buy"] == [] and book["sell"] == []
+
+
+def test_market_order_trades_at_limit_price_within_protection():
+    book = make_book(limit("S1", "sell", 3, 49), limit("S2", "sell", 3, 52), market("B1", "buy", 5, 51))
+    assert fills(match_orders(book)) == [("B1", "S1", 3, 49)]
+    # What the protection price did not allow is cancelled, not left resting
+    assert book["buy"] == [] and book["orders"].keys() == {"S2"}
+
+
+def test_market_order_outside_protection_does_not_block_limit_orders():
+    stale = market("M1", "sell", 5, 60)
+    book = make_book(stale, limit("S1", "sell", 5, 49), limit("B1", "buy", 5, 50))
+    assert fills(match_orders(book)) == [("B1", "S1", 5, 49)]
+    assert stale.status == "cancelled"
+
+
+def test_market_orders_on_both_sides_that_miss_each_other_trade_with_limits():
+    book = make_book(market("MB", "buy", 2, 40), market("MS", "sell", 2, 60),
+                     limit("S1", "sell", 2, 39), limit("B1", "buy", 2, 61),
+                     limit("S2", "sell", 3, 45), limit("B2", "buy", 3, 46))
+    assert sorted(fills(match_orders(book))) == [("B1", "MS", 2, 61), ("B2", "S2", 3, 45), ("MB", "S1", 2, 39)]
+
+
+def test_ioc_remainder_is_cancelled():
+    resting = limit("S1", "sell", 5, 49)
+    ioc = limit("B1", "buy", 8, 50, time_in_force="IOC")
+    book = make_book(resting, ioc)
+    assert fills(match_orders(book)) == [("B1", "S1", 5, 49)]
+    assert ioc.status == "cancelled" and ioc.quantity == 3 and book["buy"] == []
+
+
+def test_fok_fills_in_full_across_levels():
+    book = make_book(limit("S1", "sell", 5, 49), limit("S2", "sell", 5, 50))
+    fok = limit("B1", "buy", 8, 50, time_in_force="FOK")
+    add_order_to_book(fok, book)
+    assert fills(match_orders(book)) == [("B1", "S1", 5, 49), ("B1", "S2", 3, 50)]
+    assert fok.status == "filled"
+
+
+def test_fok_is_killed_untouched_without_enough_liquidity():
+    book = make_book(limit("S1", "sell", 5, 49))
+    fok = limit("B1", "buy", 10, 50, time_in_force="FOK")
+    add_order_to_book(fok, book)
+    assert match_orders(book) == []
+    assert fok.status == "cancelled" and fok.quantity == 10
+
+
+def test_fok_does_not_count_opposite_fok_that_is_killed():
+    resting = limit("S1", "sell", 5, 49)
+    sell = limit("S2", "sell", 8, 49, time_in_force="FOK")
+    buy = limit("B1", "buy", 10, 50, time_in_force="FOK")
+    book = make_book(resting, sell, buy)
+    assert match_orders(book) == []
+    assert buy.status == "cancelled" and buy.quantity == 10
+    assert sell.status == "cancelled" and sell.quantity == 8
+
+
+def test_fok_against_fok_that_fills_trades_in_full():
+    resting = limit("S1", "sell", 5, 49)
+    sell = limit("S2", "sell", 5, 49, time_in_force="FOK")
+    buy = limit("B1", "buy", 10, 50, time_in_force="FOK")
+    book = make_book(resting, sell, buy)
+    assert fills(match_orders(book)) == [("B1", "S1", 5, 49), ("B1", "S2", 5, 49)]
+    assert buy.status == "filled" and sell.status == "filled"
+
+
+def test_fok_against_exactly_matching_fok():
+    sell = limit("S1", "sell", 5, 50, time_in_force="FOK")
+    buy = limit("B1", "buy", 5, 50, time_in_force="FOK")
+    assert fills(match_orders(make_book(sell, buy))) == [("B1", "S1", 5, 50)]
+
+
+def test_fok_against_partial_liquidity_leaves_book_untouched():
+    resting = limit("S1", "sell", 4, 49)
+    book = make_book(resting, limit("S2", "sell", 4, 51), limit("B1", "buy", 6, 50, time_in_force="FOK"))
+    assert match_orders(book) == []
+    assert resting.quantity == 4 and resting.status == "open"
+
+
+def test_iceberg_shows_one_slice_and_refills_behind_its_level():
+    iceberg = limit("S1", "sell", 6, 49, display_quantity=2)
+    other = limit("S2", "sell", 2, 49)
+    book = make_book(iceberg, other, limit("B1", "buy", 5, 50))
+    # The first slice trades, then the refilled slice queues behind S2 at the same price
+    assert fills(match_orders(book)) == [("B1", "S1", 2, 49), ("B1", "S2", 2, 49), ("B1", "S1", 1, 49)]
+    assert iceberg.quantity == 1 and iceberg.hidden_quantity == 2
+
+
+def test_stop_order_enters_book_when_price_is_reached():
+    stop_book = StopBook()
+    stop = market("ST", "sell", 3, 40, stop_price=45)
+    stop_book.add(stop)
+    book = make_book(limit("B1", "buy", 3, 44))
+    assert activate_stop_orders(stop_book, book, {"AAPL": 46}) == []
+    assert activate_stop_orders(stop_book, book, {"AAPL": 45}) == [stop]
+    assert fills(match_orders(book)) == [("B1", "ST", 3, 44)]
+    assert len(stop_book) == 0
@@ -0,0 +1,72 @@
+import os
+
+import matplotlib.pyplot as plt
+import pytest
+
+from market_data import DepthBook
+from monitor import LiveMonitor, sparkline, write_atomic
+from order import new_order_book
+from trader import Trader
+from visualizations import plot_stock_prices_over_time
+
+
+def make_market(num_traders=200, num_stocks=20):
+    stock_prices = {f"S{i}": 100.0 + i for i in range(num_stocks)}
+    traders = {t_id: Trader(t_id, cash=1000, portfolio={"S0": t_id % 5}) for t_id in range(1, num_traders + 1)}
+    return stock_prices, traders
+
+
+def test_samples_are_kept_in_a_bounded_ring_buffer(tmp_path):
+    stock_prices, traders = make_market()
+    monitor = LiveMonitor("html", interval=3600, html_path=tmp_path / "monitor.html", history=10, watch=3,
+                          sample_size=7, seed=1)
+    depth_book = DepthBook()
+    depth_book.update_level("S0", "buy", 99.0, 5)
+    for step in range(25):
+        stock_prices["S0"] += 1
+        monitor.record(step, [{}] * step, new_order_book(), stock_prices, traders, depth_book)
+
+    assert len(monitor.samples) == 10 and monitor.samples[0]["step"] == 15
+    assert list(monitor.samples[-1]["stocks"]) == ["S0", "S1", "S2"]
+    assert monitor.samples[-1]["stocks"]["S0"] == (125.0, 99.0, None, (1, 0))
+    assert len(monitor.sampled_traders) == 7 and len(monitor.movers) == 5
+    # The interval has not passed since the first step, so only that one was rendered
+    assert monitor.renders == 1
+    assert monitor.rates()[1] > 0
+
+
+def test_html_view_is_written_whole(tmp_path):
+    stock_prices, traders = make_market()
+    path = tmp_path / "monitor.html"
+    monitor = LiveMonitor("html", interval=0, html_path=path, seed=1)
+    for step in range(3):
+        monitor.record(step, [], new_order_book(), stock_prices, traders)
+    monitor.close()
+
+    page = path.read_text(encoding="utf-8")
+    assert "<h2>Step 2</h2>" in page and page.rstrip().endswith("</html>")
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".tmp-")] == []
+
+
+def test_failed_write_leaves_no_temporary_file(tmp_path):
+    with pytest.raises(IsADirectoryError):
+        write_atomic(tmp_path, "page")
+    assert os.listdir(tmp_path) == []
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        LiveMonitor("curses")
+
+
+def test_sparkline_scales_to_the_range():
+    assert sparkline([1, 2, 3, 4, 5, 6, 7, 8]) == "▁▂▃▄▅▆▇█"
+    assert sparkline([5, 5]) == "▁▁"
+    assert sparkline([]) == ""
+
+
+def test_charts_are_saved_instead_of_shown(tmp_path):
+    path = tmp_path / "prices.png"
+    plot_stock_prices_over_time({"AAPL": [100, 101, 99]}, save_path=path)
+    assert path.stat().st_size > 0
+    assert plt.get_fignums() == []
@@ -0,0 +1,59 @@
+import os
+import time
+
+import pytest
+
+from result_cache import ResultCache, run_cached
+from scenario import make_scenario
+
+
+def config(seed):
+    return make_scenario({"seed": seed, "num_traders": 3, "num_steps": 3})
+
+
+def test_miss_then_hit(tmp_path):
+    cache = ResultCache(tmp_path)
+    assert cache.get(config(1)) is None
+
+    cache.put(config(1), {"trades": [1, 2, 3]})
+    assert cache.get(config(1)) == {"trades": [1, 2, 3]}
+    assert cache.get(config(2)) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+@pytest.mark.parametrize("contents", [b"", b"not a pickle", b"\x80\x05\x95\x10\x00"])
+def test_corrupt_entry_is_a_miss_and_removed(tmp_path, contents):
+    cache = ResultCache(tmp_path)
+    path = cache.path(config(1))
+    with open(path, "wb") as file:
+        file.write(contents)
+
+    assert cache.get(config(1)) is None
+    assert cache.misses == 1
+    assert not os.path.exists(path)
+
+
+def test_eviction_removes_least_recently_used_entries(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=10 ** 9)
+    for seed in range(3):
+        cache.put(config(seed), {"payload": bytes(1000)})
+    # Make the entries' ages distinct, then use the oldest so it becomes the newest
+    for age, seed in enumerate(range(3)):
+        os.utime(cache.path(config(seed)), (time.time() - 100 + age, time.time() - 100 + age))
+    cache.get(config(0))
+
+    cache.max_bytes = cache.size() - 1
+    assert cache.evict() == 1
+    assert not os.path.exists(cache.path(config(1)))
+    assert os.path.exists(cache.path(config(0)))
+
+
+def test_run_cached_only_stores_seeded_runs(tmp_path):
+    cache = ResultCache(tmp_path)
+    first = run_cached(config(5), cache)
+    second = run_cached(config(5), cache)
+    assert second == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    run_cached(make_scenario({"num_traders": 3, "num_steps": 3}), cache)
+    assert len(cache.entries()) == 1
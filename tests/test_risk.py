@@ -0,0 +1,72 @@
+import pytest
+
+from matching_engine import match_orders
+from order import add_order_to_book, cancel_order, create_order, new_order_book
+from risk import RiskEngine
+from trader import Trader
+
+
+def place(trader, order_id, side, quantity, price, risk_engine, order_book, **options):
+    order = create_order(trader, order_id, side, "AAPL", quantity, price, risk_engine, **options)
+    add_order_to_book(order, order_book)
+    risk_engine.reserve(order)
+    return order
+
+
+def test_resting_orders_reserve_cash_and_shares():
+    risk_engine = RiskEngine(fee_buffer=0)
+    book = new_order_book()
+    buyer, seller = Trader(1, cash=1000), Trader(2, cash=0, portfolio={"AAPL": 10})
+
+    place(buyer, "B1", "buy", 6, 100, risk_engine, book)
+    place(seller, "S1", "sell", 8, 150, risk_engine, book)
+    assert risk_engine.available_cash(buyer) == 400
+    assert risk_engine.available_shares(seller, "AAPL") == 2
+
+    # The second order would only fit if the first one's reservation were ignored
+    with pytest.raises(ValueError):
+        place(buyer, "B2", "buy", 5, 100, risk_engine, book)
+    with pytest.raises(ValueError):
+        place(seller, "S2", "sell", 3, 150, risk_engine, book)
+    assert risk_engine.rejections_by_reason == {"insufficient_cash": 1, "insufficient_shares": 1}
+
+
+def test_fee_buffer_is_reserved_on_buys():
+    risk_engine = RiskEngine(fee_buffer=10)
+    trader = Trader(1, cash=1000)
+    assert not risk_engine.check_order(trader, "buy", "AAPL", 10, 100)
+    assert risk_engine.check_order(trader, "buy", "AAPL", 9, 100)
+
+
+def test_invalid_orders_are_rejected():
+    risk_engine = RiskEngine()
+    trader = Trader(1, cash=1000, portfolio={"AAPL": 5})
+    assert not risk_engine.check_order(trader, "buy", "AAPL", 0, 10)
+    assert not risk_engine.check_order(trader, "sell", "AAPL", 1, -1)
+    assert not risk_engine.check_order(trader, "hold", "AAPL", 1, 10)
+    assert risk_engine.rejections_by_reason == {"invalid": 3}
+
+
+def test_cancel_and_fills_release_reservations():
+    risk_engine = RiskEngine(fee_buffer=0)
+    book = new_order_book()
+    buyer, seller = Trader(1, cash=1000), Trader(2, cash=0, portfolio={"AAPL": 10})
+
+    place(buyer, "B1", "buy", 4, 100, risk_engine, book)
+    place(seller, "S1", "sell", 10, 90, risk_engine, book)
+    match_orders(book, risk_engine)
+    # The buy filled in full; the sell still reserves what is left of it
+    assert risk_engine.reserved_cash == {}
+    assert risk_engine.reserved_shares == {(2, "AAPL"): 6}
+
+    assert cancel_order("S1", book, risk_engine)
+    assert risk_engine.reserved_shares == {}
+    assert not cancel_order("S1", book, risk_engine)
+
+
+def test_iceberg_reserves_its_hidden_quantity():
+    risk_engine = RiskEngine()
+    book = new_order_book()
+    seller = Trader(2, cash=0, portfolio={"AAPL": 10})
+    place(seller, "S1", "sell", 10, 90, risk_engine, book, display_quantity=2)
+    assert risk_engine.available_shares(seller, "AAPL") == 0
@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+from main import initialize_market, run_simulation
+from result_cache import ResultCache
+from scenario import DEFAULT_SCENARIO, config_hash, expand_grid, load_scenario, load_sweep, make_scenario, market_hash
+from sweep import run_sweep
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scenarios")
+
+
+def test_make_scenario_fills_defaults_and_rejects_unknown_settings():
+    scenario = make_scenario({"num_traders": 3})
+    assert scenario["num_traders"] == 3 and scenario["stocks"] == DEFAULT_SCENARIO["stocks"]
+    scenario["stocks"].append("XYZ")
+    assert "XYZ" not in DEFAULT_SCENARIO["stocks"]
+    with pytest.raises(ValueError, match="num_trader"):
+        make_scenario({"num_trader": 3})
+
+
+def test_shipped_scenario_files_load():
+    for name in os.listdir(SCENARIO_DIR):
+        path = os.path.join(SCENARIO_DIR, name)
+        with open(path) as file:
+            is_sweep = "grid" in json.load(file)
+        loaded = load_sweep(path) if is_sweep else load_scenario(path)
+        assert loaded
+
+
+def test_expand_grid_yields_every_combination_in_order():
+    grid = {"num_traders": [2, 4], "settlement_mode": ["immediate", "deferred"]}
+    scenarios = expand_grid(make_scenario({"seed": 1}), grid)
+    assert [(s["num_traders"], s["settlement_mode"]) for s in scenarios] == [
+        (2, "immediate"), (2, "deferred"), (4, "immediate"), (4, "deferred")]
+    assert all(s["seed"] == 1 for s in scenarios)
+    with pytest.raises(ValueError):
+        expand_grid(make_scenario(), {"bogus": [1]})
+
+
+def test_hashes_ignore_the_name_and_market_hash_ignores_trading_settings():
+    base = make_scenario({"seed": 1})
+    assert config_hash(dict(base, name="other")) == config_hash(base)
+    assert config_hash(dict(base, taker_rate=0.5)) != config_hash(base)
+    assert market_hash(dict(base, taker_rate=0.5)) == market_hash(base)
+    assert market_hash(dict(base, num_traders=6)) != market_hash(base)
+
+
+def test_seeded_runs_are_reproducible_from_a_shared_market():
+    config = make_scenario({"seed": 11, "num_traders": 5, "num_steps": 5})
+    first = run_simulation(config, verbose=False)
+    second = run_simulation(config, market=initialize_market(config), verbose=False)
+    assert first["trades"] == second["trades"]
+    assert first["final_balances"] == second["final_balances"]
+
+
+def test_sweep_runs_each_cell_once_and_then_reads_the_cache(tmp_path):
+    sweep = {"base": make_scenario({"seed": 2, "num_traders": 4, "num_steps": 4}),
+             "grid": {"matching_mode": ["continuous", "auction"]}}
+    cache = ResultCache(tmp_path)
+    rows = run_sweep(sweep, max_workers=2, cache=cache)
+    assert [(row["matching_mode"], row["cached"]) for row in rows] == [("continuous", False), ("auction", False)]
+
+    again = run_sweep(sweep, max_workers=2, cache=cache)
+    assert [row["cached"] for row in again] == [True, True]
+    assert [row["trades"] for row in again] == [row["trades"] for row in rows]
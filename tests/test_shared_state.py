@@ -0,0 +1,24 @@
+import multiprocessing
+
+import pytest
+
+from scenario import make_scenario
+from shared_state import run_with_readers
+
+
+def test_readers_follow_every_step():
+    config = make_scenario({"seed": 3, "num_traders": 20, "num_steps": 10})
+    outcomes = run_with_readers(config, num_readers=2)
+
+    assert len(outcomes) == 2
+    for steps_seen, retries, consistent in outcomes:
+        assert 1 <= steps_seen <= 10
+        assert consistent
+    assert multiprocessing.active_children() == []
+
+
+def test_readers_are_stopped_when_the_run_fails():
+    config = make_scenario({"seed": 3, "num_traders": 20, "num_steps": 10, "matching_mode": "bogus"})
+    with pytest.raises(ValueError):
+        run_with_readers(config, num_readers=2)
+    assert multiprocessing.active_children() == []
@@ -0,0 +1,32 @@
+import pytest
+
+from matching_engine import match_orders
+from stress_test import PHASES, build_workload, check_exponents, growth_exponent, measure
+
+
+def test_growth_exponent_recovers_the_power():
+    sizes = [10, 100, 1000, 10000]
+    assert growth_exponent(sizes, [3 * n for n in sizes]) == pytest.approx(1.0)
+    assert growth_exponent(sizes, [n ** 2 / 7 for n in sizes]) == pytest.approx(2.0)
+    assert growth_exponent(sizes, [0.5] * 4) == pytest.approx(0.0, abs=1e-9)
+
+
+def test_check_exponents_flags_a_phase_that_grows_too_fast():
+    sizes = [100, 1000, 10000]
+    results = [(n, dict({phase: n * 1e-6 for phase in PHASES}, memory=n * 100.0)) for n in sizes]
+    results = [(n, dict(result, match=n ** 2 * 1e-9)) for n, result in results]
+    failed = [phase for phase, _, _, passed in check_exponents("traders", results) if not passed]
+    assert failed == ["match"]
+
+
+def test_deep_orders_rest_without_trading():
+    state, deep_ids = build_workload(traders=50, symbols=3, depth=200)
+    assert len(deep_ids) > 150
+    assert match_orders(state["order_book"], state["risk_engine"]) == []
+    assert all(order_id in state["order_book"]["orders"] for order_id in deep_ids)
+
+
+def test_measure_reports_every_phase():
+    result = measure(traders=50, symbols=2, steps=2, depth=50, track_memory=True)
+    assert set(result) == set(PHASES) | {"memory"}
+    assert all(value >= 0 for value in result.values())
@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+from trade_store import TradeStore
+from utils import calculate_average_price, filter_trades_by_stock
+
+STOCKS = ["AAPL", "GOOG", "MSFT"]
+
+
+def make_steps(num_steps=40, seed=1):
+    rng = random.Random(seed)
+    steps = []
+    for step in range(num_steps):
+        trades = []
+        for i in range(rng.randint(0, 6)):
+            buyer, seller = rng.sample(range(1, 9), 2)
+            trades.append({"buyer": buyer, "seller": seller, "stock": rng.choice(STOCKS),
+                           "quantity": rng.randint(1, 20), "price": round(rng.uniform(90, 110), 2),
+                           "buy_order_id": f"B{step}-{i}", "sell_order_id": f"S{step}-{i}",
+                           "maker": rng.choice(["buy", "sell"])})
+        steps.append((step, trades))
+    return steps
+
+
+def make_store(steps, chunk_size=16):
+    store = TradeStore(chunk_size)
+    for step, trades in steps:
+        store.append(step, trades)
+    return store
+
+
+def flat(steps):
+    return [dict(trade, step=step) for step, trades in steps for trade in trades]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 16, 1000])
+def test_queries_match_a_scan_of_the_log(chunk_size):
+    steps = make_steps()
+    store = make_store(steps, chunk_size)
+    log = flat(steps)
+
+    assert len(store) == len(log)
+    for trader in range(1, 9):
+        expected = [t for t in log if trader in (t["buyer"], t["seller"]) and 10 <= t["step"] <= 25]
+        assert list(store.trades_for_trader(trader, 10, 25)) == expected
+    for stock in STOCKS:
+        assert list(store.trades_for_stock(stock)) == [t for t in log if t["stock"] == stock]
+    assert list(store.trades_for_stock("TSLA")) == []
+
+
+def test_queries_do_not_seal_pending_trades():
+    steps = make_steps()
+    store = make_store(steps, chunk_size=1000)
+    assert store.chunks == []
+
+    list(store.trades_for_stock("AAPL"))
+    list(store.trades_for_trader(1))
+    store.average_price("AAPL")
+    store.trader_volume_history(range(1, 9), len(steps))
+    assert store.chunks == []
+
+    # Trades appended after a query are still seen by the next one
+    store.append(len(steps), [{"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 5, "price": 100.0,
+                               "buy_order_id": "B", "sell_order_id": "S", "maker": "sell"}])
+    assert list(store.trades_for_stock("AAPL"))[-1]["buy_order_id"] == "B"
+    assert store.chunks == []
+
+
+def test_vwap_windows():
+    steps = [(0, [{"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 10, "price": 100.0,
+                   "buy_order_id": "B1", "sell_order_id": "S1", "maker": "buy"}]),
+             (1, [{"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 30, "price": 104.0,
+                   "buy_order_id": "B2", "sell_order_id": "S2", "maker": "buy"}]),
+             (4, [{"buyer": 2, "seller": 1, "stock": "AAPL", "quantity": 5, "price": 90.0,
+                   "buy_order_id": "B3", "sell_order_id": "S3", "maker": "sell"}])]
+    store = make_store(steps, chunk_size=1)
+
+    assert list(store.vwap("AAPL", window=2)) == [(0, 103.0, 40), (4, 90.0, 5)]
+    assert list(store.vwap("AAPL", window=1, start_step=1)) == [(1, 104.0, 30), (4, 90.0, 5)]
+    assert store.average_price("AAPL") == pytest.approx((1000 + 3120 + 450) / 45)
+    with pytest.raises(ValueError):
+        list(store.vwap("AAPL", window=0))
+
+
+def test_steps_must_be_appended_in_order():
+    store = TradeStore()
+    store.append(3, [])
+    with pytest.raises(ValueError):
+        store.append(2, [])
+
+
+def test_trader_volume_history_counts_both_sides():
+    steps = make_steps(num_steps=10)
+    store = make_store(steps, chunk_size=5)
+    history = store.trader_volume_history(range(1, 9), 10)
+
+    for trader in range(1, 9):
+        expected = [0] * 11
+        for trade in flat(steps):
+            if trader in (trade["buyer"], trade["seller"]):
+                expected[trade["step"]] += trade["quantity"]
+        assert history[trader] == expected
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_and_load_round_trip(tmp_path, mmap):
+    steps = make_steps()
+    store = make_store(steps, chunk_size=16)
+    store.save(tmp_path)
+    loaded = TradeStore.load(tmp_path, mmap=mmap)
+
+    assert len(loaded) == len(store)
+    for stock in STOCKS:
+        assert list(loaded.trades_for_stock(stock)) == list(store.trades_for_stock(stock))
+    assert list(loaded.trades_for_trader(3, 5, 30)) == list(store.trades_for_trader(3, 5, 30))
+
+
+def test_filter_returns_the_same_records_for_a_store_and_a_list():
+    steps = make_steps()
+    store = make_store(steps)
+    trades = [trade for _, step_trades in steps for trade in step_trades]
+
+    for stock in STOCKS:
+        assert filter_trades_by_stock(store, stock) == filter_trades_by_stock(trades, stock)
+        assert calculate_average_price(store, stock) == pytest.approx(calculate_average_price(trades, stock))
+
+
+def test_trader_volume_history_leaves_out_traders_not_asked_for():
+    steps = make_steps(num_steps=10)
+    store = make_store(steps, chunk_size=5)
+    full = store.trader_volume_history(range(1, 9), 10)
+
+    assert store.trader_volume_history([3, 6], 10) == {3: full[3], 6: full[6]}
+    # Every trader in the log sorts between these IDs, or past the last one
+    assert store.trader_volume_history([0, 100], 10) == {0: [0] * 11, 100: [0] * 11}
+    assert store.trader_volume_history([0], 10) == {0: [0] * 11}
+    assert store.trader_volume_history([], 10) == {}
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_integer_order_ids_keep_their_type(tmp_path, mmap):
+    trades = [{"buyer": 1, "seller": 2, "stock": "AAPL", "quantity": 5, "price": 100.0,
+               "buy_order_id": 7, "sell_order_id": 3, "maker": "sell"}]
+    store = make_store([(0, trades)])
+    assert list(store.trades_for_stock("AAPL", include_step=False)) == trades
+    assert type(next(store.trades_for_trader(1))["buy_order_id"]) is int
+
+    store.save(tmp_path)
+    assert list(TradeStore.load(tmp_path, mmap=mmap).trades_for_stock("AAPL", include_step=False)) == trades
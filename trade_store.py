@@ -0,0 +1,355 @@
+import bisect
+import json
+import os
+
+import numpy as np
+
+# Columns kept for every trade. Stocks are stored as codes into TradeStore.symbols and the maker
+# side as True when the buy order was resting first. Order IDs (dtype None) keep the type numpy
+# infers per chunk: integer IDs stay int64, string IDs become fixed-width strings
+COLUMNS = {"step": np.int64, "stock": np.int32, "buyer": np.int64, "seller": np.int64,
+           "quantity": np.int64, "price": np.float64, "buy_order_id": None, "sell_order_id": None,
+           "buyer_is_maker": np.bool_}
+
+# Columns with a secondary index: the row offsets ordered by the column, and the sorted keys
+INDEXED_COLUMNS = ("stock", "buyer", "seller")
+
+MANIFEST = "manifest.json"
+
+
+class TradeChunk:
+    """
+    A block of trades stored column by column, with its secondary indexes.
+    Rows are in execution order, so the step column is sorted and a step range is found by
+    binary search. For the stock, buyer and seller columns the chunk also keeps the row
+    offsets ordered by that column next to the sorted keys, so every row of one stock or
+    trader is found by binary search too. The arrays live in memory, or in .npy files that
+    are memory-mapped on first use, so a query only reads the pages it needs.
+    """
+
+    def __init__(self, rows, arrays=None, directory=None, mmap=True):
+        """
+        Initializes a TradeChunk object.
+        :param rows: Number of trades in the chunk.
+        :param arrays: Dictionary of array name -> array, for a chunk held in memory.
+        :param directory: Where the chunk's .npy files are, for a chunk loaded from disk.
+        :param mmap: Whether arrays loaded from disk are memory-mapped rather than read whole.
+        """
+        self.rows = rows
+        self.arrays = arrays if arrays is not None else {}
+        self.directory = directory
+        self.mmap_mode = "r" if mmap else None
+
+    def __repr__(self):
+        return f"TradeChunk | Rows: {self.rows} | Loaded arrays: {len(self.arrays)}"
+
+    def __len__(self):
+        return self.rows
+
+    @classmethod
+    def build(cls, columns):
+        """
+        Creates a chunk from its columns and builds its indexes.
+        :param columns: Dictionary of column name -> array, one entry per COLUMNS.
+        """
+        arrays = dict(columns)
+        for name in INDEXED_COLUMNS:
+            # A stable sort keeps each key's offsets in execution order
+            order = np.argsort(columns[name], kind="stable")
+            arrays[f"{name}_order"] = order
+            arrays[f"{name}_sorted"] = columns[name][order]
+        return cls(len(columns["step"]), arrays)
+
+    def __getitem__(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode=self.mmap_mode)
+        return self.arrays[name]
+
+    def offsets(self, column, key):
+        """
+        Returns the row offsets whose `column` equals `key`, in execution order.
+        """
+        sorted_keys = self[f"{column}_sorted"]
+        low = np.searchsorted(sorted_keys, key, side="left")
+        high = np.searchsorted(sorted_keys, key, side="right")
+        return self[f"{column}_order"][low:high]
+
+    def step_bounds(self, start_step=None, end_step=None):
+        """
+        Returns the (first, past-the-end) row offsets of the trades in steps start_step to end_step.
+        """
+        steps = self["step"]
+        low = 0 if start_step is None else int(np.searchsorted(steps, start_step, side="left"))
+        high = self.rows if end_step is None else int(np.searchsorted(steps, end_step, side="right"))
+        return low, high
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        names = list(COLUMNS) + [f"{name}_{kind}" for name in INDEXED_COLUMNS for kind in ("order", "sorted")]
+        for name in names:
+            np.save(os.path.join(directory, f"{name}.npy"), self[name])
+
+
+class TradeStore:
+    """
+    Append-only columnar trade log, split into chunks of at most `chunk_size` trades.
+    Trades are appended a step at a time; once enough are pending they are sealed into a
+    chunk and indexed. Each chunk covers a contiguous step range, so a query skips every
+    chunk outside its steps and uses the chunk indexes inside them. Queries are generators
+    that yield one chunk's results at a time.
+    """
+
+    def __init__(self, chunk_size=65536):
+        """
+        Initializes a TradeStore object.
+        :param chunk_size: Number of trades per sealed chunk.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+        self.symbols = []
+        self.symbol_codes = {}
+        self.chunks = []
+        self.first_steps = []  # first step of each chunk
+        self.last_steps = []   # last step of each chunk
+        self.pending = {name: [] for name in COLUMNS}
+        self._pending_chunk = None  # indexed view of the pending trades, rebuilt after appends
+        self.last_step = None
+        self.num_trades = 0
+
+    def __repr__(self):
+        return f"TradeStore | Trades: {self.num_trades} | Chunks: {len(self.chunks)} | Symbols: {len(self.symbols)}"
+
+    def __len__(self):
+        return self.num_trades
+
+    def append(self, step, trades):
+        """
+        Adds the trades executed in one step. Steps must be appended in order.
+        :param trades: List of fills, as produced by the matching engine.
+        """
+        if self.last_step is not None and step < self.last_step:
+            raise ValueError(f"Step {step} appended after step {self.last_step}")
+        self.last_step = step
+        if trades:
+            self._pending_chunk = None
+        pending = self.pending
+        for trade in trades:
+            code = self.symbol_codes.get(trade["stock"])
+            if code is None:
+                code = self.symbol_codes[trade["stock"]] = len(self.symbols)
+                self.symbols.append(trade["stock"])
+            pending["step"].append(step)
+            pending["stock"].append(code)
+            pending["buyer"].append(trade["buyer"])
+            pending["seller"].append(trade["seller"])
+            pending["quantity"].append(trade["quantity"])
+            pending["price"].append(trade["price"])
+            pending["buy_order_id"].append(trade["buy_order_id"])
+            pending["sell_order_id"].append(trade["sell_order_id"])
+            pending["buyer_is_maker"].append(trade["maker"] == "buy")
+            if len(pending["step"]) >= self.chunk_size:
+                self.flush()
+                pending = self.pending
+        self.num_trades += len(trades)
+
+    def pending_columns(self):
+        return {name: np.array(values, dtype=dtype) for (name, dtype), values
+                in zip(COLUMNS.items(), self.pending.values())}
+
+    def flush(self):
+        """
+        Seals the pending trades into a chunk, however few there are.
+        Only the write path (a full chunk) and save() call this, so reads never fragment the log.
+        """
+        if not self.pending["step"]:
+            return
+        chunk = self.pending_chunk()
+        self.chunks.append(chunk)
+        self.first_steps.append(int(chunk["step"][0]))
+        self.last_steps.append(int(chunk["step"][-1]))
+        self.pending = {name: [] for name in COLUMNS}
+        self._pending_chunk = None
+
+    def pending_chunk(self):
+        """
+        Returns the pending trades as an indexed chunk that is not sealed, or None if there are none.
+        It is only rebuilt after new trades arrive, so polling readers do not rebuild it every time.
+        """
+        if not self.pending["step"]:
+            return None
+        if self._pending_chunk is None:
+            self._pending_chunk = TradeChunk.build(self.pending_columns())
+        return self._pending_chunk
+
+    def chunks_for_steps(self, start_step=None, end_step=None):
+        """
+        Returns the chunks that hold trades from steps start_step to end_step (inclusive),
+        including a view of the pending trades.
+        """
+        low = 0 if start_step is None else bisect.bisect_left(self.last_steps, start_step)
+        high = len(self.chunks) if end_step is None else bisect.bisect_right(self.first_steps, end_step)
+        chunks = self.chunks[low:high]
+        pending = self.pending_chunk()
+        if pending is not None and (end_step is None or self.pending["step"][0] <= end_step) \
+                and (start_step is None or self.pending["step"][-1] >= start_step):
+            chunks.append(pending)
+        return chunks
+
+    def select(self, chunk, column, key, start_step=None, end_step=None):
+        """
+        Returns a chunk's row offsets where `column` equals `key`, limited to a step range.
+        """
+        offsets = chunk.offsets(column, key)
+        low, high = chunk.step_bounds(start_step, end_step)
+        if low > 0 or high < chunk.rows:
+            offsets = offsets[(offsets >= low) & (offsets < high)]
+        return offsets
+
+    def rows(self, chunk, offsets, include_step=True):
+        """
+        Yields the trades at the given row offsets of a chunk, as the matching engine's fill
+        dictionaries, plus the step they executed in if include_step.
+        """
+        columns = [chunk[name][offsets].tolist() for name in COLUMNS]
+        for step, stock, buyer, seller, quantity, price, buy_order_id, sell_order_id, buyer_is_maker in zip(*columns):
+            trade = {"buyer": buyer, "seller": seller, "stock": self.symbols[stock], "quantity": quantity,
+                     "price": price, "buy_order_id": buy_order_id, "sell_order_id": sell_order_id,
+                     "maker": "buy" if buyer_is_maker else "sell"}
+            if include_step:
+                trade["step"] = step
+            yield trade
+
+    def column(self, name):
+        """
+        Returns one column of the whole log as a single array, in execution order.
+        """
+        chunks = self.chunks_for_steps()
+        if not chunks:
+            return np.zeros(0, dtype=COLUMNS[name])
+        return np.concatenate([chunk[name] for chunk in chunks])
+
+    def trades_for_trader(self, trader_id, start_step=None, end_step=None, include_step=True):
+        """
+        Yields every trade a trader bought or sold in, optionally limited to a step range.
+        """
+        for chunk in self.chunks_for_steps(start_step, end_step):
+            offsets = np.union1d(self.select(chunk, "buyer", trader_id, start_step, end_step),
+                                 self.select(chunk, "seller", trader_id, start_step, end_step))
+            yield from self.rows(chunk, offsets, include_step)
+
+    def trades_for_stock(self, stock, start_step=None, end_step=None, include_step=True):
+        """
+        Yields every trade in a stock, optionally limited to a step range.
+        """
+        code = self.symbol_codes.get(stock)
+        if code is None:
+            return
+        for chunk in self.chunks_for_steps(start_step, end_step):
+            yield from self.rows(chunk, self.select(chunk, "stock", code, start_step, end_step), include_step)
+
+    def vwap(self, stock, window=1, start_step=None, end_step=None):
+        """
+        Yields the volume-weighted average price of a stock over windows of `window` steps.
+        Windows start at start_step (or step 0); windows without trades are skipped.
+        :return: Generator of (first step of the window, VWAP, volume) tuples.
+        """
+        if window < 1:
+            raise ValueError("window must be at least one step")
+        code = self.symbol_codes.get(stock)
+        if code is None:
+            return
+        origin = start_step if start_step is not None else 0
+        current, notional, volume = None, 0.0, 0
+        for chunk in self.chunks_for_steps(start_step, end_step):
+            offsets = self.select(chunk, "stock", code, start_step, end_step)
+            if not len(offsets):
+                continue
+            quantity = chunk["quantity"][offsets]
+            windows = (chunk["step"][offsets] - origin) // window
+            # Offsets are in execution order, so window numbers are sorted and each window is one run
+            ids, starts = np.unique(windows, return_index=True)
+            window_volume = np.add.reduceat(quantity, starts)
+            window_notional = np.add.reduceat(quantity * chunk["price"][offsets], starts)
+            # A window can continue in the next chunk, so it is only yielded once a later one starts
+            for window_id, shares, value in zip(ids.tolist(), window_volume.tolist(), window_notional.tolist()):
+                if window_id != current:
+                    if current is not None:
+                        yield origin + current * window, notional / volume, volume
+                    current, notional, volume = window_id, 0.0, 0
+                notional += value
+                volume += shares
+        if current is not None:
+            yield origin + current * window, notional / volume, volume
+
+    def average_price(self, stock):
+        """
+        Returns the volume-weighted average price of all trades in a stock, or 0 if there are none.
+        """
+        code = self.symbol_codes.get(stock)
+        if code is None:
+            return 0
+        notional, volume = 0.0, 0
+        for chunk in self.chunks_for_steps():
+            offsets = chunk.offsets("stock", code)
+            quantity = chunk["quantity"][offsets]
+            notional += float(quantity @ chunk["price"][offsets])
+            volume += int(quantity.sum())
+        return notional / volume if volume else 0
+
+    def trader_volume_history(self, trader_ids, num_steps):
+        """
+        Returns the shares each trader traded per step, as buyer plus as seller.
+        :param trader_ids: IDs of the traders to report; trades of other traders are left out.
+        :return: Dictionary of trader_id -> list of shares traded at steps 0 to num_steps.
+        """
+        ids = np.asarray(list(trader_ids), dtype=np.int64)
+        if not len(ids):
+            return {}
+        sorter = np.argsort(ids)
+        volumes = np.zeros((len(ids), num_steps + 1), dtype=np.int64)
+        for chunk in self.chunks_for_steps():
+            for side in ("buyer", "seller"):
+                traders = chunk[side]
+                rows = sorter[np.minimum(np.searchsorted(ids, traders, sorter=sorter), len(ids) - 1)]
+                known = ids[rows] == traders
+                np.add.at(volumes, (rows[known], chunk["step"][known]), chunk["quantity"][known])
+        return dict(zip(ids.tolist(), volumes.tolist()))
+
+    def save(self, directory):
+        """
+        Writes every chunk as .npy files plus a manifest, so the log can be memory-mapped later.
+        """
+        self.flush()
+        os.makedirs(directory, exist_ok=True)
+        for i, chunk in enumerate(self.chunks):
+            chunk.save(os.path.join(directory, f"chunk_{i:05d}"))
+        manifest = {
+            "chunk_size": self.chunk_size,
+            "symbols": self.symbols,
+            "last_step": self.last_step,
+            "chunks": [{"rows": len(chunk), "first_step": first, "last_step": last}
+                       for chunk, first, last in zip(self.chunks, self.first_steps, self.last_steps)],
+        }
+        with open(os.path.join(directory, MANIFEST), "w") as file:
+            json.dump(manifest, file, indent=2)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Opens a saved trade log. Chunk arrays are only read when a query first needs them.
+        :param mmap: Whether to memory-map the arrays rather than read them whole.
+        """
+        with open(os.path.join(directory, MANIFEST)) as file:
+            manifest = json.load(file)
+        store = cls(manifest["chunk_size"])
+        store.symbols = manifest["symbols"]
+        store.symbol_codes = {symbol: code for code, symbol in enumerate(store.symbols)}
+        store.last_step = manifest["last_step"]
+        for i, entry in enumerate(manifest["chunks"]):
+            store.chunks.append(TradeChunk(entry["rows"], directory=os.path.join(directory, f"chunk_{i:05d}"),
+                                           mmap=mmap))
+            store.first_steps.append(entry["first_step"])
+            store.last_steps.append(entry["last_step"])
+            store.num_trades += entry["rows"]
+        return store
@@ -1,6 +1,8 @@
 import random
 import string
 
+from trade_store import TradeStore
+
 
 def generate_unique_order_id(existing_ids):
     """
@@ -27,7 +29,11 @@ def calculate_net_worth(trader, stock_prices):
 def calculate_average_price(trades, stock):
     """
     Calculates the average trade price for a specific stock.
+    :param trades: List of trades, or a TradeStore, which only reads the stock's indexed rows.
     """
+    if isinstance(trades, TradeStore):
+        return trades.average_price(stock)
+
     total_quantity = 0
     total_value = 0
 
@@ -51,7 +57,11 @@ def calculate_total_trade_volume(trades):
 def filter_trades_by_stock(trades, stock):
     """
     Filters trades for a specific stock.
+    :param trades: List of trades, or a TradeStore, which only reads the stock's indexed rows.
     """
+    if isinstance(trades, TradeStore):
+        # Same records as the list path, without the step the store also keeps
+        return list(trades.trades_for_stock(stock, include_step=False))
     return [trade for trade in trades if trade["stock"] == stock]
 
 
@@ -2,11 +2,23 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 
-def plot_stock_prices_over_time(historical_prices):
+def show_or_save(save_path=None):
+    """
+    Shows the current figure, or saves it to `save_path` and closes it so a run is never blocked.
+    """
+    if save_path is None:
+        plt.show()
+    else:
+        plt.savefig(save_path)
+        plt.close()
+
+
+def plot_stock_prices_over_time(historical_prices, save_path=None):
     """
     Plots each stock's price over time on one chart.
     :param historical_prices: dict of stock -> list of prices.
                              E.g. { 'AAPL': [100, 102, 101, ...], 'GOOG': [...], ... }
+    :param save_path: Optional file to save the chart to instead of showing it.
     """
     plt.figure(figsize=(10, 6))
 
@@ -20,14 +32,15 @@ def plot_stock_prices_over_time(historical_prices):
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
-    plt.show()
+    show_or_save(save_path)
 
 
-def plot_trader_volume_over_time(trader_volume_history):
+def plot_trader_volume_over_time(trader_volume_history, save_path=None):
     """
     Plots each trader's total traded volume at each time step on one chart.
     :param trader_volume_history: dict of trader_id -> list of volumes per step
                                   E.g. {1: [3, 2, 0, 5], 2: [...], ...}
+    :param save_path: Optional file to save the chart to instead of showing it.
     """
     plt.figure(figsize=(10, 6))
 
@@ -41,14 +54,15 @@ def plot_trader_volume_over_time(trader_volume_history):
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
-    plt.show()
+    show_or_save(save_path)
 
 
-def plot_trader_net_worth_over_time(net_worth_history):
+def plot_trader_net_worth_over_time(net_worth_history, save_path=None):
     """
     Plots each trader's net worth (cash + portfolio value) at each step, overlaid on one chart.
     :param net_worth_history: dict of trader_id -> list of net worth per step
                               E.g. {1: [10500, 10400, 11000, ...], 2: [...], ...}
+    :param save_path: Optional file to save the chart to instead of showing it.
     """
     plt.figure(figsize=(10, 6))
 
@@ -61,15 +75,16 @@ def plot_trader_net_worth_over_time(net_worth_history):
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
-    plt.show()
+    show_or_save(save_path)
 
 
-def plot_final_portfolio_composition(traders, stock_prices):
+def plot_final_portfolio_composition(traders, stock_prices, save_path=None):
     """
     Creates a grouped bar chart: for each stock on the X-axis, plot a bar for each trader,
     color-coded to show how much of that stock they hold (in total value).
     :param traders: dict of trader_id -> Trader object (with .portfolio and .cash)
     :param stock_prices: dict of stock -> float (final stock price)
+    :param save_path: Optional file to save the chart to instead of showing it.
     """
     # Gather a set of all stocks that exist in the simulation
     all_stocks = set(stock_prices.keys())
@@ -109,4 +124,34 @@ def plot_final_portfolio_composition(traders, stock_prices):
     plt.legend()
     plt.grid(axis="y", alpha=0.3)
     plt.tight_layout()
-    plt.show()
+    show_or_save(save_path)
+
+
+def plot_order_book_depth(depth_book, stocks, save_path=None):
+    """
+    Plots a cumulative depth chart (bids and asks) for each stock, one subplot per stock.
+    Reads the depth book's cached top-N snapshots rather than rescanning the order book.
+    :param depth_book: DepthBook object (from market_data.py)
+    :param stocks: list of stock symbols to plot
+    :param save_path: Optional file to save the chart to instead of showing it.
+    """
+    n_stocks = len(stocks)
+    fig, axes = plt.subplots(1, n_stocks, figsize=(4 * n_stocks, 4), squeeze=False)
+
+    for ax, stock in zip(axes[0], stocks):
+        snapshot = depth_book.snapshot(stock)
+        if snapshot["bids"]:
+            prices, quantities = zip(*snapshot["bids"])
+            ax.step(prices, np.cumsum(quantities), where="post", color="green", label="Bids")
+        if snapshot["asks"]:
+            prices, quantities = zip(*snapshot["asks"])
+            ax.step(prices, np.cumsum(quantities), where="post", color="red", label="Asks")
+        ax.set_title(stock)
+        ax.set_xlabel("Price ($)")
+        ax.grid(True, alpha=0.3)
+
+    axes[0][0].set_ylabel("Cumulative Quantity")
+    fig.suptitle("5) Order Book Depth")
+    axes[0][0].legend()
+    plt.tight_layout()
+    show_or_save(save_path)